@@ -11,3 +11,16 @@ from COGtools.consensus import get_features
 from COGtools.track_manager import get_legend
 from COGtools.track_manager import get_track_template
 from COGtools.plots import categories_barplot
+from COGtools.fasta_index import FastaIndex
+from COGtools.fasta_index import fasta_ids
+from COGtools.instrumentation import RunReport
+from COGtools.checkpoint import Journal
+from COGtools.plots import read_category_stats
+from COGtools.file_manager import decode_attributes
+from COGtools.file_manager import encode_attributes
+from COGtools.feature_index import FeatureIndex
+from COGtools.cohort import Cohort
+from COGtools.cohort import build_cohort
+from COGtools.score_cache import ScoreCache
+from COGtools.consensus import create_consensus
+from COGtools.consensus import categories_choice
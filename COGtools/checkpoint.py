@@ -0,0 +1,88 @@
+import os
+import json
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+try:
+    from COGtools.file_manager import atomic_open
+except ImportError:
+    from file_manager import atomic_open
+
+
+def signature(paths):
+    """
+    size and modification time of the files used to recognize changed inputs of a stage
+    """
+    return {path: [os.path.getsize(path), os.path.getmtime(path)] for path in paths
+            if path is not None and os.path.exists(path)}
+
+
+def write_atomic(path, text):
+    """
+    Write the file through a temporary file renamed on success, the file is never left truncated
+    """
+    with atomic_open(path) as handle:
+        handle.write(text)
+
+
+class Journal:
+    """
+    Journal of the stages of one organism completed in the output directory (<organism>_journal.json). Every stage
+    writes its outputs into a temporary directory and they are moved into the output directory only when the stage
+    succeeds, so partial files of an interrupted run are never used by the following stages.
+    """
+    def __init__(self, organism_name, output_dir, resume=False):
+        self.organism_name = organism_name
+        self.output_dir = output_dir
+        self.path = output_dir + "/" + organism_name + "_journal.json"
+        self.stages = {}
+        self.resume = resume
+        if resume and os.path.exists(self.path):
+            with open(self.path) as handle:
+                self.stages = json.load(handle)["stages"]
+
+    def completed(self, name, inputs=(), options=()):
+        """
+        The stage was completed in the previous run with the same inputs and options and its outputs are still
+        present
+        :param name: the name of the stage
+        :param inputs: the paths to input files of the stage
+        :param options: the options of the stage
+        :return: the stage can be skipped
+        """
+        if not self.resume or name not in self.stages:
+            return False
+        # outputs of a stage run again are changed inputs of the following stages
+        record = self.stages[name]
+        return record["inputs"] == json.loads(json.dumps(signature(inputs))) and \
+            record["options"] == json.loads(json.dumps(list(options))) and \
+            all(os.path.exists(self.output_dir + "/" + output) for output in record["outputs"])
+
+    @contextmanager
+    def stage(self, name, inputs=(), options=()):
+        """
+        Run the stage inside the with block
+        :param name: the name of the stage
+        :param inputs: the paths to input files of the stage
+        :param options: the options of the stage
+        :return: the temporary directory for the outputs of the stage
+        """
+        stage_dir = self.output_dir + "/." + self.organism_name + "_" + name + ".partial"
+        # outputs left by an interrupted run
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        os.makedirs(stage_dir)
+        self.stages.pop(name, None)
+        try:
+            yield stage_dir
+            outputs = sorted(os.listdir(stage_dir))
+            for output in outputs:
+                os.replace(stage_dir + "/" + output, self.output_dir + "/" + output)
+        finally:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+
+        self.stages[name] = {"completed": datetime.now().isoformat(timespec="seconds"), "inputs": signature(inputs),
+                             "options": list(options), "outputs": outputs}
+        self.save()
+
+    def save(self):
+        write_atomic(self.path, json.dumps({"organism": self.organism_name, "stages": self.stages}, indent=2))
@@ -2,11 +2,55 @@ import sys
 import program_processor
 import track_manager
 import consensus
+from instrumentation import RunReport
+from checkpoint import Journal
+import worker
+import prefetch
 import os
 import argparse
 
 
-def cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manager, cog_colors, draft, gff_included):
+def find_file(files, input_dir, file_name):
+    """
+    return the path to the input file, its gzip-compressed version (.gz) is accepted as well
+    """
+    for name in (file_name, file_name + ".gz"):
+        if name in files:
+            return input_dir + "/" + name
+    return None
+
+
+def run_cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manager, cog_colors, draft,
+                 gff_included, min_overlap=0.9, n_jobs=1, memory_budget=None, report=False, profile=False,
+                 resume=False, incremental=False, indexed=False, hit_rule="best"):
+    """
+    Run the whole annotation of one genome, errors are raised. The completed stages are written into the journal
+    in the output directory, the stages completed by the previous run are skipped if resume is True. If incremental
+    is True, the votes of the consensus are kept in the output directory and the next consensus votes again only
+    the features changed by one of the tools. If indexed is True, the features of complete genome are written also
+    into block-compressed file with index for region queries. The hit of Batch CD-Search assigned to every protein
+    is chosen by hit_rule ("best" or "first"). The processors of complete genome run the fast engine with
+    replicon_seqnames=True (the seqname of CDSs is their replicon) and all_accessions=True (the header lists all
+    replicons), em_processor with full_desc=True (the whole descriptions of eggNOG-mapper) and the consensus matches
+    the features by their location (matching="location"). The alignment scores of draft proteins are cached in the
+    output directory, so the next run aligns only the protein pairs not scored yet.
+    """
+    run_report = RunReport(organism_name, output_dir, enabled=report, profile=profile)
+    journal = Journal(organism_name, output_dir, resume=resume)
+    state_dir = output_dir + "/" + organism_name + "_consensus_state" if incremental else None
+    score_cache = output_dir + "/" + organism_name + "_alignment_scores.sqlite"
+
+    def run_stage(name, function, inputs=(), options=(), report_inputs=(), report_outputs=()):
+        """
+        run the stage writing into the temporary directory unless it was completed by the previous run
+        """
+        if journal.completed(name, inputs, options):
+            run_report.skip(name)
+            return
+        with run_report.stage(name, inputs=report_inputs, outputs=report_outputs), \
+                journal.stage(name, inputs, options) as stage_dir:
+            function(stage_dir)
+
     try:
         # complete genome
         em_file = None
@@ -14,25 +58,43 @@ def cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manage
         batch_file = None
         if draft is False:
             files = [f for f in os.listdir(input_dir)]
-            fasta_file = input_dir + "/" + organism_name + ".fasta" if organism_name + ".fasta" in files else None
-            gff_file = input_dir + "/" + organism_name + ".gff3" if organism_name + ".gff3" in files else None
+            fasta_file = find_file(files, input_dir, organism_name + ".fasta")
+            gff_file = find_file(files, input_dir, organism_name + ".gff3")
+            cds_file = find_file(files, input_dir, organism_name + "_cds.txt")
 
             # Program processor
-            if organism_name + "_eggnog.gff" in files:
-                program_processor.em_processor(organism_name, input_dir + "/" + organism_name + "_eggnog.gff",
-                                               input_dir + "/" +
-                                               organism_name + "_cds.txt", cogs_only, output_dir)
+            eggnog_file = find_file(files, input_dir, organism_name + "_eggnog.gff")
+            if eggnog_file is not None:
                 em_file = output_dir + "/em_" + organism_name + ".gff"
-
-            if organism_name + "_orf_operon.txt" in files:
-                program_processor.om_processor(organism_name, input_dir + "/" + organism_name + "_orf_operon.txt",
-                                               input_dir +
-                                               "/" + organism_name + "_cogs_operon.txt", output_dir)
+                run_stage("em_processor",
+                          lambda stage_dir: program_processor.em_processor(organism_name, eggnog_file, cds_file,
+                                                                           cogs_only, stage_dir, engine="fast",
+                                                                           replicon_seqnames=True,
+                                                                           all_accessions=True, full_desc=True),
+                          inputs=[eggnog_file, cds_file], options=[cogs_only],
+                          report_inputs=[(eggnog_file, False)], report_outputs=[(em_file, True)])
+
+            orf_file = find_file(files, input_dir, organism_name + "_orf_operon.txt")
+            if orf_file is not None:
                 om_file = output_dir + "/om_" + organism_name + ".gff"
-
-            if organism_name + "_batch.txt" in files:
-                program_processor.batch_processor(organism_name, input_dir + "/" + organism_name + "_batch.txt", output_dir)
+                cog_file = find_file(files, input_dir, organism_name + "_cogs_operon.txt")
+                run_stage("om_processor",
+                          lambda stage_dir: program_processor.om_processor(organism_name, orf_file, cog_file,
+                                                                           stage_dir, engine="fast",
+                                                                           all_accessions=True),
+                          inputs=[orf_file, cog_file],
+                          report_inputs=[(orf_file, False)], report_outputs=[(om_file, True)])
+
+            hitdata_file = find_file(files, input_dir, organism_name + "_batch.txt")
+            if hitdata_file is not None:
                 batch_file = output_dir + "/batch_" + organism_name + ".gff"
+                run_stage("batch_processor",
+                          lambda stage_dir: program_processor.batch_processor(organism_name, hitdata_file, cds_file,
+                                                                              stage_dir, hit_rule, engine="fast",
+                                                                              replicon_seqnames=True,
+                                                                              all_accessions=True),
+                          inputs=[hitdata_file, cds_file], options=[hit_rule],
+                          report_inputs=[(hitdata_file, True)], report_outputs=[(batch_file, True)])
 
             # Consensus
             if gff_file is None:
@@ -42,47 +104,88 @@ def cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manage
                 get_pseudo = True
                 get_ncrna = True
 
-            consensus.consensus(organism_name, em_file=em_file,
-                                om_file=om_file,
-                                batch_file=batch_file, fasta_file=fasta_file,
-                                get_pseudo=get_pseudo, get_ncrna=get_ncrna,
-                                gff_file=gff_file, output_dir=output_dir, cat_choice=cat_choice)
+            run_stage("consensus",
+                      lambda stage_dir: consensus.consensus(organism_name, em_file=em_file,
+                                                            om_file=om_file,
+                                                            batch_file=batch_file, fasta_file=fasta_file,
+                                                            get_pseudo=get_pseudo, get_ncrna=get_ncrna,
+                                                            gff_file=gff_file, output_dir=stage_dir,
+                                                            cat_choice=cat_choice, min_overlap=min_overlap,
+                                                            n_jobs=n_jobs, report=run_report,
+                                                            state_dir=state_dir, indexed=indexed, engine="fast",
+                                                            matching="location", all_accessions=True),
+                      inputs=[em_file, om_file, batch_file, fasta_file, gff_file],
+                      options=[cat_choice, min_overlap, indexed],
+                      report_inputs=[(em_file, True), (om_file, True), (batch_file, True)],
+                      report_outputs=[(output_dir + "/" + organism_name + "_file_to_plot.txt", False)])
 
             # Track manager
             if manager:
-                track_manager.get_track_template(cog_palette=cog_colors, output_dir=output_dir)
-                track_manager.get_legend(output_dir=output_dir, cog_palette=cog_colors)
+                def track(stage_dir):
+                    track_manager.get_track_template(cog_palette=cog_colors, output_dir=stage_dir)
+                    track_manager.get_legend(output_dir=stage_dir, cog_palette=cog_colors)
+                run_stage("track_manager", track, options=[cog_colors])
 
         # draft genome
         else:
             files = [f for f in os.listdir(input_dir)]
-            proteins_file = input_dir + "/" + organism_name + "_proteins.fsa_aa" \
-                if organism_name + "_proteins.fsa_aa" in files else None
+            proteins_file = find_file(files, input_dir, organism_name + "_proteins.fsa_aa")
             # Program processor
-            if organism_name + "_eggnog.gff" in files:
-                program_processor.em_processor_draft(organism_name, input_dir + "/" + organism_name + "_eggnog.gff",
-                                                     output_dir=output_dir, cogs_only=cogs_only)
+            eggnog_file = find_file(files, input_dir, organism_name + "_eggnog.gff")
+            if eggnog_file is not None:
                 em_file = output_dir + "/em_" + organism_name + ".txt"
-
-            if organism_name + "_proteins_operon.txt" in files:
-                program_processor.om_processor_draft(organism_name, input_dir + "/" + organism_name + "_proteins.fsa_aa",
-                                                     input_dir + "/" + organism_name + "_proteins_operon.txt",
-                                                     input_dir + "/" + organism_name + "_cogs_operon.txt",
-                                                     output_dir=output_dir,gff_included=gff_included)
+                run_stage("em_processor_draft",
+                          lambda stage_dir: program_processor.em_processor_draft(
+                              organism_name, eggnog_file, output_dir=stage_dir, cogs_only=cogs_only,
+                              chunksize=None if memory_budget is None else 100000),
+                          inputs=[eggnog_file], options=[cogs_only],
+                          report_inputs=[(eggnog_file, False)], report_outputs=[(em_file, True)])
+
+            operon_proteins_file = find_file(files, input_dir, organism_name + "_proteins_operon.txt")
+            if operon_proteins_file is not None:
                 om_file = output_dir + "/om_" + organism_name + ".txt"
-
-            if organism_name + "_batch.txt" in files:
-                program_processor.batch_processor_draft(organism_name, input_dir + "/" + organism_name + "_batch.txt",
-                                                        output_dir=output_dir)
+                operon_cogs_file = find_file(files, input_dir, organism_name + "_cogs_operon.txt")
+                run_stage("om_processor_draft",
+                          lambda stage_dir: program_processor.om_processor_draft(
+                              organism_name, proteins_file, operon_proteins_file, operon_cogs_file,
+                              output_dir=stage_dir, gff_included=gff_included, score_cache=score_cache),
+                          inputs=[proteins_file, operon_proteins_file, operon_cogs_file], options=[gff_included],
+                          report_outputs=[(om_file, True)])
+
+            hitdata_file = find_file(files, input_dir, organism_name + "_batch.txt")
+            if hitdata_file is not None:
                 batch_file = output_dir + "/batch_" + organism_name + ".txt"
+                run_stage("batch_processor_draft",
+                          lambda stage_dir: program_processor.batch_processor_draft(organism_name, hitdata_file,
+                                                                                    output_dir=stage_dir,
+                                                                                    hit_rule=hit_rule),
+                          inputs=[hitdata_file], options=[hit_rule],
+                          report_inputs=[(hitdata_file, True)], report_outputs=[(batch_file, True)])
 
             # Consensus
-            consensus.consensus_draft(organism_name,
-                                      proteins=proteins_file,
-                                      em_file=em_file,om_file=om_file, batch_file=batch_file,
-                                      cat_choice=cat_choice,
-                                      output_dir=output_dir)
-
+            run_stage("consensus_draft",
+                      lambda stage_dir: consensus.consensus_draft(organism_name,
+                                                                  proteins=proteins_file,
+                                                                  em_file=em_file, om_file=om_file,
+                                                                  batch_file=batch_file,
+                                                                  cat_choice=cat_choice,
+                                                                  memory_budget=memory_budget,
+                                                                  report=run_report, state_dir=state_dir,
+                                                                  output_dir=stage_dir),
+                      inputs=[proteins_file, em_file, om_file, batch_file], options=[cat_choice],
+                      report_inputs=[(em_file, True), (om_file, True), (batch_file, True)],
+                      report_outputs=[(output_dir + "/consensus_" + organism_name + ".txt", True)])
+    finally:
+        run_report.save()
+
+
+def cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manager, cog_colors, draft, gff_included,
+             min_overlap=0.9, n_jobs=1, memory_budget=None, report=False, profile=False, resume=False,
+             incremental=False, indexed=False, hit_rule="best"):
+    try:
+        run_cogtools(organism_name, input_dir, output_dir, cogs_only, cat_choice, manager, cog_colors, draft,
+                     gff_included, min_overlap, n_jobs, memory_budget, report, profile, resume, incremental,
+                     indexed, hit_rule)
     except Exception as e:
         print(e)
         sys.exit(2)
@@ -99,8 +202,38 @@ if __name__ == '__main__':
     parser.add_argument("-p", action="store_true", dest="cogs_palette")
     parser.add_argument("-d", "--draft", action="store_true", dest="draft")
     parser.add_argument("-g", "--gff", action="store_true", dest="gff_included")
+    parser.add_argument("-m", "--overlap", action="store", dest="min_overlap", default=0.9, type=float)
+    parser.add_argument("-j", "--jobs", action="store", dest="n_jobs", default=1, type=int)
+    parser.add_argument("-M", "--memory", action="store", dest="memory_budget", default=None, type=float)
+    parser.add_argument("--report", action="store_true", dest="report")
+    parser.add_argument("--profile", action="store_true", dest="profile")
+    parser.add_argument("--resume", action="store_true", dest="resume")
+    parser.add_argument("--incremental", action="store_true", dest="incremental")
+    parser.add_argument("--indexed", action="store_true", dest="indexed")
+    parser.add_argument("--hit", action="store", dest="hit_rule", default="best", choices=["best", "first"])
+    parser.add_argument("--worker", action="store_true", dest="worker")
+    parser.add_argument("--socket", action="store", dest="socket", default=None)
+    parser.add_argument("--pool", action="store", dest="pool_size", default=1, type=int)
+    parser.add_argument("--prefetch", action="store", dest="prefetch", default=0, type=int)
+    parser.add_argument("--prefetch-memory", action="store", dest="prefetch_memory", default=prefetch.PREFETCH_MEMORY,
+                        type=float)
+    parser.add_argument("--staging", action="store", dest="staging_dir", default=None)
     arguments = parser.parse_args()
 
+    # worker mode: jobs are read as JSON lines from stdin or from the socket
+    if arguments.worker:
+        if arguments.prefetch > 0:
+            # input files of the next genomes are read while the current ones are annotated
+            prefetch.serve_prefetch(run_cogtools, arguments.pool_size, arguments.prefetch, arguments.prefetch_memory,
+                                    arguments.staging_dir)
+        elif arguments.socket is None:
+            worker.serve_stdin(run_cogtools, arguments.pool_size)
+        else:
+            worker.serve_socket(run_cogtools, arguments.socket, arguments.pool_size)
+        sys.exit(0)
+
     cogtools(arguments.organism_name, arguments.input_dir, arguments.output_dir,arguments.cogs_only,
              arguments.cat_choice, arguments.track_manager,arguments.cogs_palette, arguments.draft,
-             arguments.gff_included)
\ No newline at end of file
+             arguments.gff_included, arguments.min_overlap, arguments.n_jobs, arguments.memory_budget,
+             arguments.report, arguments.profile, arguments.resume, arguments.incremental, arguments.indexed,
+             arguments.hit_rule)
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+try:
+    from COGtools.file_manager import read_cogs, read_annotation
+    from COGtools.consensus import CATEGORIES
+    from COGtools.plots import plot_categories
+except ImportError:
+    from file_manager import read_cogs, read_annotation
+    from consensus import CATEGORIES
+    from plots import plot_categories
+
+
+def load_sparse():
+    """
+    scipy is needed only for the cohort matrix, so it is imported when the matrix is created
+    """
+    try:
+        from scipy import sparse
+    except ImportError:
+        raise ImportError("The cohort matrix requires scipy, install it by: pip install scipy")
+    return sparse
+
+
+@lru_cache(maxsize=None)
+def cog_index():
+    """
+    COGs of the COG database (cogs.txt) in the order of the columns of the cohort matrix
+    :return: index of COGs and their categories
+    """
+    cogs = read_cogs()
+    return pd.Index(list(cogs.keys())), list(cogs.values())
+
+
+def count_cogs(file):
+    """
+    Count the COGs in the annotation of one genome
+    :return: columns of the COGs in the cohort matrix, their counts and the number of COGs unknown
+    """
+    cogs = read_annotation(file)["COG"]
+    columns = cog_index()[0].get_indexer(cogs.to_numpy())
+    # orthologous groups of eggNOG are not columns of the matrix
+    columns, counts = np.unique(columns[columns >= 0], return_counts=True)
+    return columns.astype(np.int32), counts.astype(np.int32), int((cogs == "-").sum())
+
+
+class Cohort:
+    """
+    Genome x COG count matrix (scipy.sparse CSR) of the cohort of genomes, the columns are the COGs of the COG
+    database in the order of cogs.txt. Features without COG assigned are counted separately as unknown.
+    """
+    def __init__(self, matrix, genomes, unknown=None, columns=None):
+        cogs, categories = cog_index()
+        self.matrix = matrix.tocsr()
+        self.genomes = list(genomes)
+        # positions of the COGs in cogs.txt, all of them unless the cohort is restricted to some categories
+        self.columns = np.arange(len(cogs)) if columns is None else np.asarray(columns)
+        self.cogs = cogs[self.columns]
+        self.categories = [categories[column] for column in self.columns]
+        self.unknown = np.zeros(len(self.genomes), dtype=np.int64) if unknown is None else np.asarray(unknown)
+
+    def select(self, columns):
+        """
+        Get the cohort restricted to the given columns of the matrix
+        """
+        return Cohort(self.matrix[:, columns], self.genomes, self.unknown, self.columns[columns])
+
+    def category(self, categories):
+        """
+        Get the cohort restricted to COGs of the given categories
+        :param categories: one or more categories, e.g. "J" or "JKL"
+        :return: the cohort with COGs assigned to at least one of the categories
+        """
+        return self.select([column for column, cats in enumerate(self.categories)
+                            if any(cat in cats for cat in categories)])
+
+    def presence(self):
+        """
+        presence (1) and absence (0) of COGs in the genomes
+        """
+        presence = self.matrix.copy()
+        presence.data = np.ones_like(presence.data)
+        return presence
+
+    def category_counts(self, include_unknown=True):
+        """
+        Count the categories of COGs in the genomes by the COG database (not the category chosen by consensus),
+        COGs of more categories are counted in each of them
+        :return: table genomes x categories, "-" stands for COGs unknown
+        """
+        sparse = load_sparse()
+        rows, columns = [], []
+        for column, cats in enumerate(self.categories):
+            for cat in cats:
+                if cat in CATEGORIES:
+                    rows.append(column)
+                    columns.append(CATEGORIES.index(cat))
+        membership = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, columns)),
+                                       shape=(len(self.categories), len(CATEGORIES)))
+        counts = pd.DataFrame((self.matrix @ membership).toarray(), index=self.genomes, columns=CATEGORIES)
+        counts["-"] = self.unknown if include_unknown else 0
+        return counts
+
+    def to_frame(self):
+        """
+        The dense table genomes x COGs
+        """
+        return pd.DataFrame(self.matrix.toarray(), index=self.genomes, columns=self.cogs)
+
+    def to_barplot(self, path_to_data, cog_palette=True, include_unknown=True):
+        """
+        Plot the relative abundance of categories in the genomes as categories_barplot does
+        :param path_to_data: the directory where categories_barplot.csv is saved
+        """
+        counts = self.category_counts(include_unknown)
+        plot_categories([row.to_dict() for _, row in counts.iterrows()], self.genomes, path_to_data,
+                        cog_palette=cog_palette)
+
+    def save(self, path):
+        """
+        Save the matrix with the genomes and positions of COGs into NPZ file (readable by scipy.sparse.load_npz)
+        """
+        np.savez_compressed(path, format="csr", shape=np.array(self.matrix.shape), data=self.matrix.data,
+                            indices=self.matrix.indices, indptr=self.matrix.indptr,
+                            genomes=np.array(self.genomes, dtype=str), columns=self.columns, unknown=self.unknown)
+
+    @staticmethod
+    def load(path):
+        """
+        Load the cohort saved by Cohort.save
+        """
+        sparse = load_sparse()
+        with np.load(path, allow_pickle=False) as loaded:
+            matrix = sparse.csr_matrix((loaded["data"], loaded["indices"], loaded["indptr"]),
+                                       shape=tuple(loaded["shape"]))
+            return Cohort(matrix, loaded["genomes"].tolist(), loaded["unknown"], loaded["columns"])
+
+
+def build_cohort(files, names=None, n_jobs=1):
+    """
+    Build the genome x COG count matrix of the cohort from the annotations created by COGtools
+    :param files: the paths to the annotations of genomes (file to plot or consensus of draft genome), or the
+    directory with them (all .txt files)
+    :param names: names of the genomes, the file names are used if not given
+    :param n_jobs: the number of processes reading the annotations
+    :return: Cohort
+    """
+    sparse = load_sparse()
+    if isinstance(files, str) and os.path.isdir(files):
+        files = [os.path.join(files, file) for file in sorted(os.listdir(files)) if file.endswith(".txt")]
+    files = list(files)
+    names = [os.path.basename(file) for file in files] if names is None else list(names)
+
+    if n_jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            genomes = list(executor.map(count_cogs, files, chunksize=max(1, len(files) // (4 * n_jobs))))
+    else:
+        genomes = [count_cogs(file) for file in files]
+
+    indptr = np.cumsum([0] + [len(columns) for columns, counts, unknown in genomes])
+    indices = np.concatenate([columns for columns, counts, unknown in genomes]) if genomes else np.array([], int)
+    data = np.concatenate([counts for columns, counts, unknown in genomes]) if genomes else np.array([], int)
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(files), len(cog_index()[0])))
+    return Cohort(matrix, names, [unknown for columns, counts, unknown in genomes])
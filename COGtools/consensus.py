@@ -1,25 +1,117 @@
 import pandas as pd
-from re import split, search
+import numpy as np
 import os
-from Bio import SeqIO
+import json
+import shutil
+import filecmp
+from hashlib import sha1
+from re import search
+from functools import lru_cache
+from itertools import islice
+from collections import Counter
 from random import randint
-import pkg_resources
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
+import math
+try:
+    from COGtools.file_manager import copy_fasta, read_gff, read_processed, compact, concat_tables, fill_missing, \
+        read_cogs, read_data, decode_attributes, encode_attributes, atomic_open, write_table, DRAFT_DTYPES, \
+        GFF_COLUMNS, ATTRIBUTE_FIELDS
+    from COGtools.fasta_index import fasta_ids, iter_fasta_ids
+    from COGtools.instrumentation import stage
+    from COGtools.feature_index import write_indexed
+    from COGtools import reference
+    from COGtools.reference import check_engine
+except ImportError:
+    from file_manager import copy_fasta, read_gff, read_processed, compact, concat_tables, fill_missing, read_cogs, \
+        read_data, decode_attributes, encode_attributes, atomic_open, write_table, DRAFT_DTYPES, GFF_COLUMNS, \
+        ATTRIBUTE_FIELDS
+    from fasta_index import fasta_ids, iter_fasta_ids
+    from instrumentation import stage
+    from feature_index import write_indexed
+    import reference
+    from reference import check_engine
+
+
+# columns that identify a feature in the processed files
+KEYS = ["seqname", "start", "end", "strand"]
+# estimated memory needed per byte of processed draft files and ids of downloaded proteins during the consensus of
+# one shard, the peak measured by tracemalloc is 6-8 bytes (object columns, the merged table and the assignments),
+# the rest is left for the interpreter and the allocator
+SHARD_MEMORY_FACTOR = 20
+# copies of the processed files kept with the votes of the previous consensus
+STATE_FILES = ["em.txt", "om.txt", "batch.txt"]
+# the matched features voted in one process, more processes are started only for larger genomes
+MIN_PARALLEL_FEATURES = 100000
+# matching of the features predicted by the three tools: by replicon, strand and stop, or by start
+MATCHING = ("location", "start")
+# minimal overlap of matched features
+MIN_OVERLAP = 0.9
+# COG categories, "-" stands for COG unknown
+CATEGORIES = ["J", "A", "K", "L", "B", "D", "Y", "V", "T", "M", "N", "Z", "W", "U", "O", "X", "C", "G", "E", "F", "H",
+              "I", "P", "Q", "R", "S", "-"]
 
 
 def read_file(file):
     """
-    read processed file and get only location of feature and assigned COG
+    read processed file and get only location of feature and assigned COG, the attributes are split into typed
+    columns (ID, COG, CAT, desc) once and used by the following steps
     """
-    data = pd.read_csv(file, sep='\t', comment='#')
-    new_data = data[["start", "end"]]
-    new_data.insert(2, "COG", [search('COG=(.*);CAT', og).group(1) for og in data["attribute"]], True)
-    new_data['start'] = new_data['start'].apply(str)
-    new_data['end'] = new_data['end'].apply(str) 
+    data = read_processed(file)
+    data = data.join(decode_attributes(data["attribute"]))
+    new_data = data[KEYS + ["COG"]].copy()
     return [data, new_data]
 
 
+def match_features(tables, min_overlap=MIN_OVERLAP):
+    """
+    group the features predicted by individual tools that share the strand and the stop coordinate and overlap
+    at least by min_overlap of the longer feature, features are sorted and swept in O(n log n)
+    :param tables: location and COG of features predicted by eggNOG-mapper, Operon-mapper and Batch CD-Search
+    :param min_overlap: minimal overlap of matched features, 1 matches only features with identical location
+    :return: one row per group of matched features with the COG and the row index assigned by every tool
+    """
+    features = concat_tables([table.assign(tool=tool, row=table.index) for tool, table in enumerate(tables)])
+    features["stop"] = features["end"].where(features["strand"] != "-", features["start"])
+    features["length"] = features["end"] - features["start"] + 1
+    features = features.sort_values(["seqname", "strand", "stop", "length", "tool"],
+                                    ascending=[True, True, True, False, True], kind="mergesort", ignore_index=True)
+
+    # sweep through the sorted features, the longest feature with the given stop is the anchor of the group
+    groups = []
+    group = -1
+    anchor = None
+    tools = set()
+    for seqname, strand, stop, start, end, tool in zip(features["seqname"].tolist(), features["strand"].tolist(),
+                                                       features["stop"].tolist(), features["start"].tolist(),
+                                                       features["end"].tolist(), features["tool"].tolist()):
+        if anchor is not None and anchor[:3] == (seqname, strand, stop) and tool not in tools:
+            overlap = min(end, anchor[4]) - max(start, anchor[3]) + 1
+            if overlap / max(end - start + 1, anchor[4] - anchor[3] + 1) >= min_overlap:
+                groups.append(group)
+                tools.add(tool)
+                continue
+        group += 1
+        anchor = (seqname, strand, stop, start, end)
+        tools = {tool}
+        groups.append(group)
+    features["group"] = groups
+
+    # location of the group is given by its anchor
+    new_df = features.drop_duplicates("group").set_index("group")[KEYS]
+    for tool, suffix in enumerate(["_x", "_y", ""]):
+        assigned = features.loc[features.tool == tool].set_index("group")
+        new_df["COG" + suffix] = assigned["COG"]
+        new_df["row" + suffix] = assigned["row"]
+    new_df = fill_missing(new_df, ["COG_x", "COG_y", "COG"])
+    new_df[["row_x", "row_y", "row"]] = new_df[["row_x", "row_y", "row"]].fillna(-1).astype(int)
+    return new_df.sort_values(["seqname", "start", "end"], ignore_index=True)
+
+
 def consensus(organism_name, em_file=None, om_file=None, batch_file=None, fasta_file=None, get_pseudo=False,
-              get_ncrna=False, gff_file=None, cat_choice=1, output_dir=os.getcwd()):
+              get_ncrna=False, gff_file=None, cat_choice=1, min_overlap=MIN_OVERLAP, n_jobs=1, report=None,
+              state_dir=None, indexed=False, engine="fast", matching="location", all_accessions=True,
+              output_dir=os.getcwd()):
     """
     Improves the functional annotation of the bacterial genome using a consensus of three programs:
     eggNOG-mapper, Operon-mapper and Batch CD-Search. Function saves all predicted features and COG assignments
@@ -36,66 +128,98 @@ def consensus(organism_name, em_file=None, om_file=None, batch_file=None, fasta_
     :type get_pseudo: bool
     :type get_ncrna: bool
     :param gff_file: the path to gff file where all features are stored
+    :param min_overlap: minimal overlap of features with the same stop coordinate predicted by different tools
+    :param n_jobs: the number of processes used to create the consensus of individual replicons
+    :param report: RunReport recording the individual steps, nothing is recorded if not given
+    :param state_dir: directory keeping the votes of the previous consensus, if only one of the three files has
+    changed since then, only the affected features are voted again
+    :param indexed: write also the features sorted by location into block-compressed file with index for region
+    queries (<organism>_file_to_plot.gff.gz, see FeatureIndex)
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0) of the consensus
+    :param matching: "location" - the features are matched by their replicon and location (see create_consensus)
+    and pseudogenes are found by their replicon and start, "start" - both are found by their start
+    :param all_accessions: the header lists all replicons, otherwise the seqname of the first feature
     :return:  file with functional annotation of the bacterial genome
     """
+    check_matching(matching, engine, min_overlap, n_jobs, state_dir)
     # how many files are given
     nones = [em_file, om_file, batch_file]
     if nones.count(None) == 2:
         for tool in nones:
             if tool is not None:
-                df = pd.read_csv(tool, sep='\t', comment='#')
+                df = read_file(tool)[0]
                 if cat_choice != 0:
-                    df = categories_choice(df, cat_choice=cat_choice)
+                    with stage(report, "categories_choice") as record:
+                        df = categories_choice(df, cat_choice=cat_choice, engine=engine)
+                        record["rows_in"] = record["rows_out"] = len(df)
 
     elif nones.count(None) == 0:
-        df = create_consensus(em_file, om_file, batch_file)
+        with stage(report, "create_consensus", inputs=[(em_file, True), (om_file, True), (batch_file, True)]) \
+                as record:
+            df = create_consensus(em_file, om_file, batch_file, min_overlap=min_overlap, n_jobs=n_jobs,
+                                  state_dir=state_dir, engine=engine, matching=matching)
+            record["rows_out"] = len(df)
         if cat_choice != 0:
-            df = categories_choice(df, cat_choice=cat_choice)
+            with stage(report, "categories_choice") as record:
+                df = categories_choice(df, cat_choice=cat_choice, engine=engine)
+                record["rows_in"] = record["rows_out"] = len(df)
 
     else:
         print("Three files are needed to create consensus.")
 
     # add pseudogenes and/or ncRNA
     if get_pseudo or get_ncrna:
-        df = get_features(gff_file, df, get_pseudo, get_ncrna)
+        with stage(report, "get_features", inputs=[(gff_file, False)]) as record:
+            df = get_features(gff_file, df, get_pseudo, get_ncrna, matching)
+            record["rows_out"] = len(df)
 
     # save the created dataframe into new file and add genomic sequence
-    f = open(output_dir + '/' + organism_name + '_file_to_plot.txt', 'w')
-    f.write('# created with COGtools 1.0.0\n'
-            '# AC number: ' + df["seqname"][0] + '\n'
-                                                 '# COG annotation\n')
-    f.close()
-    df.to_csv(output_dir + '/' + organism_name + '_file_to_plot.txt', sep='\t', index=False, header=False, mode='a')
-
-    if fasta_file is not None:
-        fasta_data = (open(fasta_file, "r")).read()
-        with open(output_dir + '/' + organism_name + '_file_to_plot.txt', 'a') as my_file:
-            my_file.write('\n' + fasta_data)
-        my_file.close()
-
-
-def get_features(gff_file, df, get_pseudo, get_ncrna):
+    output_file = output_dir + '/' + organism_name + '_file_to_plot.txt'
+    with stage(report, "write_output", outputs=[(output_file, False)]) as record:
+        record["rows_in"] = len(df)
+        with atomic_open(output_file) as my_file:
+            my_file.write('# created with COGtools 1.0.0\n'
+                          '# AC number: ' + (", ".join(df["seqname"].unique()) if all_accessions else
+                                             str(df["seqname"].iloc[0])) + '\n'
+                          '# COG annotation\n')
+            df[list(GFF_COLUMNS)].to_csv(my_file, sep='\t', index=False, header=False)
+
+            if fasta_file is not None:
+                my_file.write('\n')
+                copy_fasta(fasta_file, my_file)
+        write_stats(category_stats(df), organism_name, output_file)
+
+    if indexed:
+        indexed_file = output_dir + '/' + organism_name + '_file_to_plot.gff.gz'
+        with stage(report, "write_index", outputs=[(indexed_file, False)]) as record:
+            record["rows_in"] = len(df)
+            write_indexed(df, indexed_file)
+
+
+def get_features(gff_file, df, get_pseudo, get_ncrna, matching="location"):
     """
     change the feature type to a pseudogene according to information in gff_file
-    and add ncRNA feature to the dataframe
+    and add ncRNA feature to the dataframe, pseudogenes are found by their replicon and start if matching is
+    "location", otherwise by their start
     """
-    gff_file = pd.read_csv(gff_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
-                                                                                "end", "score", "strand", "frame",
-                                                                                "attribute"))
+    gff_file = read_gff(gff_file)
     if get_pseudo:
         pseudogenes = gff_file.loc[gff_file['type'] == 'pseudogene']
-        for row in pseudogenes.index:
-            start = pseudogenes.start[row]
-            df.loc[df['start'] == start, 'type'] = 'pseudogene'
+        if matching == "location":
+            pseudogenes = set(zip(pseudogenes.seqname, pseudogenes.start))
+            is_pseudo = [feature in pseudogenes for feature in zip(df.seqname, df.start)]
+        else:
+            is_pseudo = df["start"].isin(pseudogenes.start).tolist()
+        df['type'] = df['type'].astype(str).where([not pseudo for pseudo in is_pseudo], 'pseudogene')
     if get_ncrna:
         ncrnas = gff_file.loc[gff_file['type'] == 'ncRNA']
-        df = pd.concat([df, ncrnas], ignore_index=True)
+        df = concat_tables([compact(df), ncrnas])
 
-    return df
+    return compact(df)
 
 
 def consensus_draft(organism_name, proteins=None, em_file=None, om_file=None, batch_file=None, cat_choice=1,
-                    output_dir=os.getcwd()):
+                    memory_budget=None, chunksize=100000, report=None, state_dir=None, output_dir=os.getcwd()):
     """
         Improves the functional annotation of the draft bacterial genome using a consensus of three programs:
         eggNOG-mapper, Operon-mapper and Batch CD-Search.
@@ -107,100 +231,176 @@ def consensus_draft(organism_name, proteins=None, em_file=None, om_file=None, ba
         :param em_file: the path to Eggnog-mapper processed file
         :param om_file: the path to Operon-mapper processed file
         :param batch_file: the path to Batch CD-Search processed file
+        :param memory_budget: the memory (MB) available for the consensus, if given, the processed files are split
+        into shards by protein_id and the consensus is created one shard at a time
+        :param chunksize: the number of lines read at once when the processed files are split into shards
+        :param report: RunReport recording the individual steps, nothing is recorded if not given
+        :param state_dir: directory keeping the votes of the previous consensus, if only one of the three files
+        has changed since then, only the affected proteins are voted again (not used by the out-of-core consensus)
         :param output_dir: output file
         :return:  file with COG assignments
         """
     nones = [em_file, om_file, batch_file]
+    output_file = output_dir + '/consensus_' + organism_name + '.txt'
+    if nones.count(None) == 0 and memory_budget is not None:
+        with stage(report, "create_consensus_draft_sharded",
+                   inputs=[(em_file, True), (om_file, True), (batch_file, True)],
+                   outputs=[(output_file, True)]):
+            return create_consensus_draft_sharded(organism_name, proteins, em_file, om_file, batch_file,
+                                                  cat_choice=cat_choice, memory_budget=memory_budget,
+                                                  chunksize=chunksize, output_dir=output_dir)
+
     if nones.count(None) == 2:
         for tool in nones:
             if tool is not None:
-                df = pd.read_csv(tool, sep='\t', comment='#')
+                df = read_processed(tool, draft=True)
                 if cat_choice != 0:
-                    df = categories_choice_draft(df, cat_choice=cat_choice)
+                    with stage(report, "categories_choice") as record:
+                        df = categories_choice_draft(df, cat_choice=cat_choice)
+                        record["rows_in"] = record["rows_out"] = len(df)
 
     elif nones.count(None) == 0:
-        df = create_consensus_draft(proteins, em_file, om_file, batch_file)
+        with stage(report, "create_consensus_draft", inputs=[(em_file, True), (om_file, True), (batch_file, True)]) \
+                as record:
+            df = create_consensus_draft(proteins, em_file, om_file, batch_file, state_dir=state_dir)
+            record["rows_out"] = len(df)
         if cat_choice != 0:
-            df = categories_choice_draft(df, cat_choice=cat_choice)
+            with stage(report, "categories_choice") as record:
+                df = categories_choice_draft(df, cat_choice=cat_choice)
+                record["rows_in"] = record["rows_out"] = len(df)
 
     else:
         print("Three files are needed to create consensus.")
 
     # save the created dataframe into new file and add genomic sequence
-    f = open(output_dir + '/consensus_' + organism_name + '.txt', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# COG annotation\n')
-    f.close()
-    return df.to_csv(output_dir + '/consensus_' + organism_name + '.txt', sep='\t', index=False, mode='a')
+    with stage(report, "write_output", outputs=[(output_file, True)]) as record:
+        record["rows_in"] = len(df)
+        write_stats(category_stats(df, draft=True), organism_name, output_file)
+        return write_table(output_file, df, ['created with COGtools 1.0.0', 'AC number: unknown', 'COG annotation'])
 
 
-def categories_choice(df, cat_choice=1):
-    # categories choice
+def categories_choice(df, cat_choice=1, engine="fast"):
+    """
+    choose one category of features assigned to more categories
+    :param df: features with attributes of COGtools, their typed columns (ID, COG, CAT, desc) are used if present
+    :param cat_choice: 1 - the first category, 2 - random category, 3 - the most frequent category of CDSs,
+    4 - the least frequent category of CDSs
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0, its random category is drawn from
+    the characters of "CAT=...;" instead of the categories)
+    :return: the features with one category
+    """
+    check_engine(engine)
+    if engine == "reference":
+        return reference.categories_choice(df, cat_choice)
+    fields = df[ATTRIBUTE_FIELDS] if "CAT" in df.columns else decode_attributes(df["attribute"])
+    cats = fields["CAT"].astype(object).to_numpy()
+    multiple = np.array([isinstance(cat, str) and len(cat) > 1 for cat in cats], dtype=bool)
     if cat_choice == 1:
-        df['attribute'] = df['attribute'].apply(
-            lambda x: x.replace(search('CAT=(.*);', x).group(0), "CAT=" + search('CAT=(.*);', x).group(0)[4] + ";")
-            if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+        choose = lambda cat: cat[0]
     elif cat_choice == 2:
-        df['attribute'] = df['attribute'].apply(
-            lambda x: x.replace(search('CAT=(.*);', x).group(0), "CAT=" + search('CAT=(.*);', x).group(0)
-                                [randint(0, len(search('CAT=(.*);', x).group(1)) - 1)] + ";")
-            if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+        choose = lambda cat: cat[randint(0, len(cat) - 1)]
+    elif cat_choice == 3 or cat_choice == 4:
+        # count the categories of CDSs
+        cat_dic = count_categories(pd.Series(cats[(df["type"] == "CDS").to_numpy()]).dropna().tolist())
+        # ties are resolved by the order of categories in the attribute
+        function = max if cat_choice == 3 else min
+        choose = lambda cat: function(dict.fromkeys(cat), key=lambda x: cat_dic.get(x, 0))
     else:
-        cat_dic = {"-": 0, "J": 0, "A": 0, "K": 0, "L": 0, "B": 0, "D": 0, "Y": 0, "V": 0, "T": 0, "M": 0, "N": 0,
-                   "Z": 0, "W": 0, "U": 0, "O": 0, "X": 0, "C": 0, "G": 0, "E": 0, "F": 0, "H": 0, "I": 0, "P": 0,
-                   "Q": 0, "R": 0, "S": 0}
-
-        for row in df.index:
-            # get only useful information about each CDS: feature_id, name, COG, COG category
-            type = df["type"][row]
-            if type == "CDS":
-                attribute = split(r"[=,;]", df["attribute"][row])
-                if len(attribute[5]) == 1:
-                    cat_dic[attribute[5]] = cat_dic[attribute[5]] + 1
-                else:
-                    for i in range(len(attribute[5])):
-                        cat_dic[attribute[5][i]] = cat_dic[attribute[5][i]] + 1
-
-        if cat_choice == 3:
-            df['attribute'] = df['attribute'].apply(
-                lambda x: x.replace(
-                    search('CAT=(.*);', x).group(0), "CAT=" + max(
-                        {search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
-                         for i in range(len(search('CAT=(.*);', x).group(1)))},
-                        key={search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
-                             for i in range(len(search('CAT=(.*);', x).group(1)))}.get) + ";")
-                if len(search('CAT=(.*);', x).group(1)) > 1 else x)
-
-        elif cat_choice == 4:
-            df['attribute'] = df['attribute'].apply(
-                lambda x: x.replace(
-                    search('CAT=(.*);', x).group(0), "CAT=" + min(
-                        {search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
-                         for i in range(len(search('CAT=(.*);', x).group(1)))},
-                        key={search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
-                             for i in range(len(search('CAT=(.*);', x).group(1)))}.get) + ";")
-                if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+        return df
+
+    if multiple.any():
+        cats = cats.copy()
+        cats[multiple] = [choose(cat) for cat in cats[multiple]]
+        fields = fields.loc[multiple].assign(CAT=cats[multiple])
+        df.loc[multiple, "attribute"] = encode_attributes(fields).to_numpy()
+        if "CAT" in df.columns:
+            df["CAT"] = pd.Categorical(cats)
     return df
 
 
-def categories_choice_draft(df, cat_choice=1):
+def count_categories(cats, cat_dic=None):
+    """
+    count the features in individual categories, multiple categories of one feature are counted separately
+    :param cats: categories of features
+    :param cat_dic: counts to be updated, new counts are created if not given
+    :return: category counts
+    """
+    if cat_dic is None:
+        cat_dic = dict.fromkeys(CATEGORIES, 0)
+    for cat, count in Counter("".join(cats)).items():
+        cat_dic[cat] = cat_dic.get(cat, 0) + count
+    return cat_dic
+
+
+def count_categories_draft(df, cat_dic=None):
+    """
+    count the proteins in individual categories, multiple categories of one protein are counted separately
+    :param df: COG assignments of proteins
+    :param cat_dic: counts to be updated, new counts are created if not given
+    :return: category counts
+    """
+    return count_categories(df["cat"].astype(str).tolist(), cat_dic)
+
+
+def category_stats(df, draft=False):
+    """
+    summarize the annotation: categories of CDSs and pseudogenes (proteins of draft genome), COGs unknown,
+    pseudogenes, ncRNAs and features taken from individual tools
+    :param df: the annotation written into the output file
+    :param draft: COG assignments of proteins of draft genome
+    :return: the statistics
+    """
+    if draft:
+        cats = df["cat"].astype(str)
+        types = pd.Series([], dtype="object")
+    else:
+        types = df["type"].astype(str)
+        cats = df["CAT"] if "CAT" in df.columns else decode_attributes(df["attribute"])["CAT"]
+        cats = cats[types.isin(["CDS", "pseudogene"]).to_numpy()].astype(object).dropna()
+    return {"draft": draft,
+            "features": len(df),
+            "categories": count_categories(cats.tolist()),
+            "unknown": int((cats == "-").sum()),
+            "pseudogenes": int((types == "pseudogene").sum()),
+            "ncRNA": int((types == "ncRNA").sum()),
+            "sources": {str(source): int(count) for source, count in df["source"].astype(str).value_counts().items()}}
+
+
+def add_stats(stats, other):
+    """
+    sum the statistics of two parts of the annotation
+    """
+    if stats is None:
+        return other
+    total = dict(stats)
+    for key in ["features", "unknown", "pseudogenes", "ncRNA"]:
+        total[key] = stats[key] + other[key]
+    for key in ["categories", "sources"]:
+        total[key] = dict(Counter(stats[key]) + Counter(other[key]))
+    total["categories"] = dict(dict.fromkeys(CATEGORIES, 0), **total["categories"])
+    return total
+
+
+def write_stats(stats, organism_name, output_file):
+    """
+    write the statistics next to the output file (the extension is replaced by .json), so that the categories do
+    not have to be counted again when plotting
+    """
+    with atomic_open(os.path.splitext(output_file)[0] + ".json") as handle:
+        json.dump(dict({"organism": organism_name, "file": os.path.basename(output_file)}, **stats), handle, indent=2)
+
+
+def categories_choice_draft(df, cat_choice=1, cat_dic=None):
     # categories choice
     if cat_choice == 1:
         df['cat'] = df['cat'].apply(lambda x: x[0])  # the first category
     elif cat_choice == 2:
-        df['cat'] = df['cat'].apply(lambda x: x[randint(0, len(x) - 1)] if len(x) > 1 else x)  # random category
+        # random category, drawn for every protein, not once per categorical value
+        df['cat'] = df['cat'].astype(str).apply(lambda x: x[randint(0, len(x) - 1)] if len(x) > 1 else x)
     else:
-        # category count
-        cat_dic = {"-": 0, "J": 0, "A": 0, "K": 0, "L": 0, "B": 0, "D": 0, "Y": 0, "V": 0, "T": 0, "M": 0, "N": 0,
-                   "Z": 0, "W": 0, "U": 0, "O": 0, "X": 0, "C": 0, "G": 0, "E": 0, "F": 0, "H": 0, "I": 0, "P": 0,
-                   "Q": 0, "R": 0, "S": 0}
-
-        for row in df.index:
-            cat = df["cat"][row]
-            if len(cat) == 1:
-                cat_dic[cat] = cat_dic[cat] + 1
-            else:
-                for i in range(len(cat)):
-                    cat_dic[cat[i]] = cat_dic[cat[i]] + 1
+        # category count, counts of the whole genome can be given when df is only its part
+        if cat_dic is None:
+            cat_dic = count_categories_draft(df)
 
         if cat_choice == 3:  # the most numerous category
             df['cat'] = df['cat'].apply(lambda x: max({x[i]: cat_dic[x[i]] for i in range(len(x))},
@@ -215,209 +415,539 @@ def categories_choice_draft(df, cat_choice=1):
     return df
 
 
-def create_consensus(em_file, om_file, batch_file):
-    # read eggnog_mapper file
-    [em_data, new_em_data] = read_file(em_file)
-    # read operon_mapper file
-    [om_data, new_om_data] = read_file(om_file)
-    # read batch cd search file
-    [batch_data, new_batch_data] = read_file(batch_file)
-
-    # merge the three dataframes to save all predicted features into one dataframe
-    # cog_x = eggnog-mapper #cog_y = operon-operon-mapper #cog = batch cd-search
-    new_df = pd.merge(new_em_data, new_om_data, on="start", how="outer")
-    #new_df = pd.concat([new_em_data, new_om_data], join="outer")
-    new_df = (pd.merge(new_df, new_batch_data, on="start", how="outer")).fillna("-")
-    #new_df = pd.concat([new_df, new_batch_data], join="outer").fillna("-")
-    new_df['start'] = new_df['start'].apply(int)
-    # create new DataFrame to store the necessary information
-    df = pd.DataFrame(columns=["seqname", "source", "type", "start", "end", "score", "strand", "frame", "attribute"])
-    
-    # data from COG database
-    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
-    cogs_data = (open(cogs_file, "r")).readlines()
-
-    # iterate through features
-    for row in new_df.index:
-        # get assigned COGs, number of NaN and start of the feature
-        cogs = [new_df["COG_x"][row], new_df["COG_y"][row], new_df["COG"][row]]
-        nan = cogs.count("-")
-        start = new_df["start"][row]
-        # find out which tools match in the COG assignment
-        idxs = [[cogs[:idx].index(item), idx] for idx, item in enumerate(cogs) if
-                item in cogs[:idx]]
-
-        # if all three tools have assigned the COG
-        if nan == 0:
-            # if all three tools match in assignment, add Batch CD-Search
-            if len(idxs) != 1:
-                df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
-
-            # two tools match in assignment
-            else:
-                #  if batch and eggnog or operon -> add batch, if operon and eggnog -> add eggnog
-                if idxs[0] == [1, 2] or idxs[0] == [0, 2]:
-                    df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
-                else:
-                    df = pd.concat([df, em_data.loc[em_data.start == start, :]], ignore_index=True)
-                    cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
-                    # if cog is from COG database
-                    try:
-                        index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                        cat = cogs_data[index][8:-1]
-                        df["attribute"][row] = df["attribute"][row].replace(
-                            search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
-
-                    # else - it is from eggNOG
-                    except IndexError:
-                        continue
-
-        # if only one tool has assigned the COG
-        elif nan == 2:
-            # find out which one was it and add it
-            which = [number for number in [0, 1, 2] if number not in idxs[0]][0]
-            programs = ['em_data', 'om_data', 'batch_data']
-            df = pd.concat([df, (locals()[programs[which]]).loc[(locals()[programs[which]]).start == start, :]],
-                           ignore_index=True)
-            if which == 0 or which == 1:
-                cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
-                # if cog is from COG database
-                try:
-                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                    cat = cogs_data[index][8:-1]
-                    df["attribute"][row] = df["attribute"][row].replace(
-                        search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
-
-                # else - it is from eggNOG or ROG
-                except IndexError:
-                    continue
-
-        # if two tools have assigned the COG
-        elif nan == 1:
-            nan_position = cogs.index("-")
-            # add batch
-            if nan_position == 0 or nan_position == 1:
-                df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
-            # add eggnog
-            else:
-                df = pd.concat([df, em_data.loc[em_data.start == start, :]], ignore_index=True)
-                cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
-                # if cog is from COG database
-                try:
-                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                    cat = cogs_data[index][8:-1]
-                    df["attribute"][row] = df["attribute"][row].replace(
-                        search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
-
-                # else - it is from eggNOG or ROG
-                except IndexError:
-                    continue
-
-        # no tool has assigned the COG, either it is not assigned or it is not a CDS -> add operon-mapper
-        else:
-            df = pd.concat([df, om_data.loc[om_data.start == start, :]], ignore_index=True)
+def vote(cogs):
+    """
+    choose the tool whose assignment is used for the feature
+    :param cogs: COGs assigned by eggNOG-mapper, Operon-mapper and Batch CD-Search, "-" if not assigned
+    :return: index of the chosen tool (0 - eggNOG-mapper, 1 - Operon-mapper, 2 - Batch CD-Search),
+    None if no tool has assigned the COG
+    """
+    nan = cogs.count("-")
+    # find out which tools match in the COG assignment
+    idxs = [[cogs[:idx].index(item), idx] for idx, item in enumerate(cogs) if
+            item in cogs[:idx]]
 
-    return df
+    # if all three tools have assigned the COG
+    if nan == 0:
+        # if all three tools match in assignment, add Batch CD-Search
+        if len(idxs) != 1:
+            return 2
+        #  if batch and eggnog or operon -> add batch, if operon and eggnog -> add eggnog
+        return 2 if idxs[0] == [1, 2] or idxs[0] == [0, 2] else 0
+
+    # if only one tool has assigned the COG, find out which one was it
+    elif nan == 2:
+        return [number for number in [0, 1, 2] if number not in idxs[0]][0]
+
+    # if two tools have assigned the COG, add batch or eggnog
+    elif nan == 1:
+        return 2 if cogs.index("-") in (0, 1) else 0
+
+    return None
+
+
+def vote_features(new_df):
+    """
+    choose the tool whose assignment is used for every matched feature
+    :param new_df: matched features with COG assignments of the three tools
+    :return: matched features with the chosen tool (column tool), Operon-mapper is chosen if no tool has assigned
+    the COG, the feature is either not assigned or it is not a CDS
+    """
+    choices = [vote(list(cogs)) for cogs in zip(new_df["COG_x"].astype(str).tolist(),
+                                                 new_df["COG_y"].astype(str).tolist(),
+                                                 new_df["COG"].astype(str).tolist())]
+    return new_df.assign(tool=[1 if which is None else which for which in choices])
+
+
+def vote_replicons(new_df, n_jobs=1):
+    """
+    vote the matched features, the replicons (chromosomes, plasmids) are split into one part per process if more
+    processes are used and the genome is large enough, the features are never split from their replicon
+    :param new_df: matched features sorted by replicon
+    :param n_jobs: the number of processes
+    :return: matched features with the chosen tool
+    """
+    replicons = pd.factorize(new_df["seqname"].astype(str), sort=False)[0]
+    n_replicons = replicons.max() + 1 if len(replicons) > 0 else 0
+    if n_jobs <= 1 or n_replicons < 2 or len(new_df) < MIN_PARALLEL_FEATURES:
+        return vote_features(new_df)
+    parts = [part for _, part in new_df.groupby(replicons * min(n_jobs, n_replicons) // n_replicons, sort=False)]
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(parts))) as executor:
+        return pd.concat(list(executor.map(vote_features, parts)))
+
+
+def assemble_features(votes, programs, cogs_data):
+    """
+    get the features chosen by the vote from the processed data
+    :param votes: matched features with the chosen tool
+    :param programs: eggNOG-mapper, Operon-mapper and Batch CD-Search processed data
+    :param cogs_data: categories of COGs from the COG database
+    :return: features with the chosen COG assignment in the order of votes
+    """
+    tools = votes["tool"].to_numpy()
+    features = []
+    order = []
+    for tool, (data, row, cog) in enumerate(zip(programs, ["row_x", "row_y", "row"], ["COG_x", "COG_y", "COG"])):
+        rows = votes[row].to_numpy()
+        chosen = (tools == tool) & (rows >= 0)
+        feature = data.loc[rows[chosen]]
+        if tool == 0 or tool == 1:
+            # if cog is from COG database, use its category
+            cats = np.array([cogs_data.get(x) for x in votes[cog].astype(str).to_numpy()[chosen]], dtype=object)
+            changed = pd.notna(cats) & feature["ID"].notna().to_numpy()
+            cats = np.where(changed, cats, feature["CAT"].astype(object).to_numpy())
+            attributes = encode_attributes(feature[ATTRIBUTE_FIELDS].assign(CAT=cats)).to_numpy()
+            feature = feature.assign(CAT=pd.Categorical(cats),
+                                     attribute=np.where(changed, attributes, feature["attribute"].to_numpy()))
+        features.append(feature)
+        order.append(np.flatnonzero(chosen))
+
+    df = concat_tables(features)
+    return df.iloc[np.argsort(np.concatenate(order), kind="stable")].reset_index(drop=True)
+
+
+def consensus_replicon(new_df, em_data, om_data, batch_data, cogs_data):
+    """
+    create consensus of the features located on one replicon
+    :param new_df: matched features with COG assignments of the three tools
+    :param em_data: eggNOG-mapper processed data
+    :param om_data: Operon-mapper processed data
+    :param batch_data: Batch CD-Search processed data
+    :param cogs_data: categories of COGs from the COG database
+    :return: features with the chosen COG assignment
+    """
+    return assemble_features(vote_features(new_df), [em_data, om_data, batch_data], cogs_data)
+
+
+def match_starts(tables):
+    """
+    match the features predicted by individual tools by their start as COGtools 1.0.0 does, the starts are compared
+    as text and the features sharing the start are paired with each other
+    :param tables: location and COG of features predicted by eggNOG-mapper, Operon-mapper and Batch CD-Search
+    :return: one row per pair of features in the lexicographic order of starts with the COG assigned by every tool
+    """
+    tables = [pd.DataFrame({"start": table["start"].astype(str), "COG": table["COG"].astype(object)})
+              for table in tables]
+    new_df = pd.merge(tables[0], tables[1], on="start", how="outer")
+    return pd.merge(new_df, tables[2], on="start", how="outer").fillna("-")
+
+
+@lru_cache(maxsize=None)
+def database_category(cog):
+    """
+    the categories of the COG as COGtools 1.0.0 reads them: the first line of cogs.txt containing the COG without
+    the COG and the end of line, None if no line contains it (orthologous groups of eggNOG)
+    """
+    text = read_data("cogs.txt")
+    where = text.find(cog)
+    if where < 0:
+        return None
+    end = text.find("\n", where)
+    line = text[text.rfind("\n", 0, where) + 1:] if end < 0 else text[text.rfind("\n", 0, where) + 1:end + 1]
+    return line[8:-1]
+
+
+def assemble_starts(votes, programs):
+    """
+    get the features chosen by the vote as COGtools 1.0.0 does: all features of the chosen tool with the start of the
+    pair are added, and if eggNOG-mapper or Operon-mapper was chosen, the category of the feature added at the
+    position of the pair (not necessarily a feature of this pair) is replaced by the category from the COG database
+    :param votes: pairs of features with the chosen tool
+    :param programs: eggNOG-mapper, Operon-mapper and Batch CD-Search processed data
+    :return: features with the chosen COG assignment in the order of pairs
+    """
+    tools = votes["tool"].to_numpy()
+    starts = votes["start"].astype(np.int64).to_numpy()
+    features = []
+    keys = []
+    for tool, data in enumerate(programs):
+        pairs = np.flatnonzero(tools == tool)
+        chosen = pd.DataFrame({"pair": pairs, "start": starts[pairs]}).merge(
+            pd.DataFrame({"start": data["start"].to_numpy(np.int64), "row": np.arange(len(data))}), on="start")
+        features.append(data.iloc[chosen["row"].to_numpy()])
+        keys.append(chosen[["pair", "row"]].to_numpy())
+    keys = np.concatenate(keys)
+    df = concat_tables(features).iloc[np.lexsort((keys[:, 1], keys[:, 0]))].reset_index(drop=True)
+
+    # operon-mapper is chosen also when no tool has assigned the COG, its category is kept then
+    unknown = (votes[["COG_x", "COG_y", "COG"]].to_numpy() == "-").all(axis=1)
+    positions = np.flatnonzero((tools != 2) & ~unknown)
+    # the features added until the pair, the positions not added yet are skipped (COGtools 1.0.0 fails on them)
+    added = np.cumsum(np.bincount(keys[:, 0], minlength=len(votes)))
+    positions = positions[positions < added[positions]]
+    attributes = df["attribute"].to_numpy(dtype=object).copy()
+    for position in positions:
+        attribute = attributes[position]
+        cat = database_category(search('COG=(.*);CAT', attribute).group(1))
+        if cat is not None:
+            attributes[position] = attribute.replace(search('CAT=(.*);', attribute).group(0), "CAT=" + cat + ";")
+    df["attribute"] = attributes
+    return df.drop(columns=ATTRIBUTE_FIELDS).join(decode_attributes(df["attribute"]))
+
+
+def check_matching(matching, engine="fast", min_overlap=MIN_OVERLAP, n_jobs=1, state_dir=None):
+    """
+    check the matching of features and the options used only by the fast engine matching the features by location
+    """
+    if matching not in MATCHING:
+        raise ValueError("Unknown matching of features: " + str(matching))
+    if (engine == "reference" or matching == "start") and \
+            (min_overlap != MIN_OVERLAP or n_jobs != 1 or state_dir is not None):
+        raise ValueError("min_overlap, n_jobs and state_dir are used only by the fast engine matching the features by "
+                         "their location")
+
+
+def create_consensus(em_file, om_file, batch_file, min_overlap=MIN_OVERLAP, n_jobs=1, state_dir=None,
+                     engine="fast", matching="location"):
+    """
+    create consensus of the processed files of complete genome
+    :param min_overlap: minimal overlap of matched features
+    :param n_jobs: the number of processes voting on individual replicons
+    :param state_dir: directory keeping the votes of the previous run, if given and only one processed file has
+    changed since the previous run, only the features affected by the change are voted again
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0)
+    :param matching: "location" - match the features by their replicon, strand and stop (see match_features),
+    "start" - match them by their start; min_overlap, n_jobs and state_dir are used only by the fast engine matching
+    by location, ValueError is raised if they are given otherwise
+    :return: features with the chosen COG assignment
+    """
+    check_engine(engine)
+    check_matching(matching, engine, min_overlap, n_jobs, state_dir)
+    if engine == "reference":
+        return reference.create_consensus(em_file, om_file, batch_file)
+    files = [em_file, om_file, batch_file]
+    # read eggnog_mapper, operon_mapper and batch cd search files
+    [em_data, new_em_data], [om_data, new_om_data], [batch_data, new_batch_data] = [read_file(file) for file in files]
+    if matching == "start":
+        votes = vote_features(match_starts([new_em_data, new_om_data, new_batch_data]))
+        return assemble_starts(votes, [em_data, om_data, batch_data])
+
+    votes = None
+    if state_dir is not None:
+        votes = update_votes(state_dir, files, [em_data, om_data, batch_data],
+                             [new_em_data, new_om_data, new_batch_data], min_overlap)
 
+    if votes is None:
+        # match the features of the three dataframes to save all predicted features into one dataframe
+        # cog_x = eggnog-mapper #cog_y = operon-operon-mapper #cog = batch cd-search
+        new_df = match_features([new_em_data, new_om_data, new_batch_data], min_overlap=min_overlap)
 
-def create_consensus_draft(proteins, em_file, om_file, batch_file):
+        votes = vote_replicons(new_df, n_jobs)
+
+    if state_dir is not None:
+        save_state(state_dir, files, votes, {"min_overlap": min_overlap})
+
+    return assemble_features(votes, [em_data, om_data, batch_data], read_cogs())
+
+
+def create_consensus_draft(proteins, em_file, om_file, batch_file, state_dir=None):
+    """
+    create consensus of the processed files of draft genome
+    :param state_dir: directory keeping the votes of the previous run, if given and only one processed file has
+    changed since the previous run, only the proteins affected by the change are voted again
+    :return: proteins with the chosen COG assignment
+    """
+    files = [em_file, om_file, batch_file]
     # get id of downloaded proteins
-    proteins = list(SeqIO.parse(proteins, "fasta"))
-    id_downloaded = [i.id for i in proteins]
+    id_downloaded = fasta_ids(proteins)
 
     # processed files
-    em_data = pd.read_csv(em_file, sep='\t', comment='#')
-    om_data = pd.read_csv(om_file, sep='\t', comment='#')
-    batch_data = pd.read_csv(batch_file, sep='\t', comment='#')
+    programs = [read_processed(file, draft=True) for file in files]
+
+    proteins_digest = sha1("\n".join(id_downloaded).encode()).hexdigest()
+    votes = None
+    if state_dir is not None:
+        votes = update_votes_draft(state_dir, files, programs, id_downloaded, proteins_digest)
+    if votes is None:
+        votes = vote_proteins(merge_proteins(id_downloaded, *programs))
+
+    if state_dir is not None:
+        save_state(state_dir, files, votes, {"proteins": proteins_digest})
 
+    return assemble_proteins(votes, programs, read_cogs())
+
+
+def merge_proteins(id_downloaded, em_data, om_data, batch_data):
+    """
+    merge the COG assignments of the proteins by the three tools
+    :return: one row per protein with the COGs assigned by eggNOG-mapper (cog_x), Operon-mapper (cog_y)
+    and Batch CD-Search (cog)
+    """
     # get only tables with protein_id and cog from processed files and merged them
     new_em_data = em_data[["protein_id", "cog"]]
     new_om_data = om_data[["protein_id", "cog"]]
     new_batch_data = batch_data[["protein_id", "cog"]]
-    new_downloaded_data = pd.DataFrame(id_downloaded, columns=['protein_id'])
+    new_downloaded_data = pd.DataFrame(id_downloaded, columns=['protein_id'], dtype="object")
 
     new_df = pd.merge(new_em_data, new_om_data, on="protein_id", how="outer")
-    new_df = (pd.merge(new_df, new_batch_data, on="protein_id", how="outer")).fillna("-")
-    new_df = (pd.merge(new_df, new_downloaded_data, on="protein_id", how="outer")).fillna("-")
-
-    # table for final data
-    df = pd.DataFrame(columns=["protein_id", "source", "cog", "cat"])
-
-    # data from COG database
-    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
-    cogs_data = (open(cogs_file, "r")).readlines()
-
-    for row in new_df.index:
-        # get assigned COGs, number of NaN and start of the feature
-        cogs = [new_df["cog_x"][row], new_df["cog_y"][row], new_df["cog"][row]]
-        nan = cogs.count("-")
-        protein_id = new_df["protein_id"][row]
-        # find out which tools match in the COG assignment
-        idxs = [[cogs[:idx].index(item), idx] for idx, item in enumerate(cogs) if
-                item in cogs[:idx]]
-
-        # if all three tools have assigned the COG
-        if nan == 0:
-            # if all three tools match in assignment, add eggnog-mapper
-            if len(idxs) != 1:
-                df = pd.concat([df, batch_data.loc[batch_data.protein_id == protein_id, :]], ignore_index=True)
-            # two tools match in assignment
-            else:
-                #  if batch and eggnog or operon -> add batch, if operon and eggnog -> add eggnog
-                if idxs[0] == [1, 2] or idxs[0] == [0, 2]:
-                    df = pd.concat([df, batch_data.loc[batch_data.protein_id == protein_id, :]], ignore_index=True)
-                else:
-                    df = pd.concat([df, em_data.loc[em_data.protein_id == protein_id, :]], ignore_index=True)
-                    cog = df["cog"][row]
-                    # if cog is from COG database
-                    try:
-                        index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                        df["cat"][row] = cogs_data[index][8:-1]
-
-                    # else - it is from eggNOG
-                    except IndexError:
-                        continue
-
-        # if only one tool has assigned the COG
-        elif nan == 2:
-            # find out which one was it and add it
-            which = [number for number in [0, 1, 2] if number not in idxs[0]][0]
-            programs = ['em_data', 'om_data', 'batch_data']
-            df = pd.concat([df, (locals()[programs[which]]).loc[(locals()[programs[which]]).protein_id == protein_id, :]
-                            ], ignore_index=True)
-
-            if which == 0 or which == 1:
-                cog = df["cog"][row]
-                # if cog is from COG database
-                try:
-                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                    df["cat"][row] = cogs_data[index][8:-1]
-
-                # else - it is from eggNOG or ROG
-                except IndexError:
-                    continue
-
-        # if two tools have assigned the COG
-        elif nan == 1:
-            nan_position = cogs.index("-")
-            # add batch cd search of eggnog_mapper
-            if nan_position == 0 or nan_position == 1:
-                df = pd.concat([df, batch_data.loc[batch_data.protein_id == protein_id, :]], ignore_index=True)
-            else:
-                df = pd.concat([df, em_data.loc[em_data.protein_id == protein_id, :]], ignore_index=True)
-                cog = df["cog"][row]
-                # if cog is from COG database
-                try:
-                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
-                    df["cat"][row] = cogs_data[index][8:-1]
-
-                # else - it is from eggNOG or ROG
-                except IndexError:
-                    continue
-
-        # no tool has assigned the COG, either it is not assigned or it is not a CDS -> add operon-mapper
-        else:
-            new_row = pd.DataFrame({"protein_id": [protein_id], "source": ["-"], "cog": ["-"], "cat": ["-"]})
-            df = pd.concat([df, new_row], ignore_index=True)
+    new_df = pd.merge(new_df, new_batch_data, on="protein_id", how="outer")
+    return fill_missing(pd.merge(new_df, new_downloaded_data, on="protein_id", how="outer"),
+                        ["cog_x", "cog_y", "cog"])
 
-    return df
+
+def vote_proteins(new_df):
+    """
+    choose the tool whose assignment is used for every protein
+    :param new_df: proteins with COG assignments of the three tools
+    :return: proteins with the chosen tool (column tool), -1 if no tool has assigned the COG
+    """
+    choices = [vote(list(cogs)) for cogs in zip(new_df["cog_x"].astype(str).tolist(),
+                                                 new_df["cog_y"].astype(str).tolist(),
+                                                 new_df["cog"].astype(str).tolist())]
+    return new_df.assign(tool=[-1 if which is None else which for which in choices])
+
+
+def assemble_proteins(votes, programs, cogs_data):
+    """
+    get the assignments chosen by the vote from the processed data
+    :param votes: proteins with the chosen tool
+    :param programs: eggNOG-mapper, Operon-mapper and Batch CD-Search processed data
+    :param cogs_data: categories of COGs from the COG database
+    :return: proteins with the chosen COG assignment in the order of votes
+    """
+    tools = votes["tool"].to_numpy()
+    votes = votes.assign(order=np.arange(len(votes)))
+    # no tool has assigned the COG
+    proteins = [votes.loc[tools == -1, ["protein_id", "order"]].assign(source="-", cog="-", cat="-")]
+    for tool, (data, cog) in enumerate(zip(programs, ["cog_x", "cog_y", "cog"])):
+        protein = votes.loc[tools == tool, ["protein_id", "order", cog]].rename(columns={cog: "chosen_cog"})
+        protein = protein.merge(data, on="protein_id", how="left")
+        if tool == 0 or tool == 1:
+            # if cog is from COG database, use its category
+            cats = [cogs_data.get(x) for x in protein["chosen_cog"].astype(str).tolist()]
+            protein["cat"] = [old if cat is None else cat for old, cat in zip(protein["cat"].tolist(), cats)]
+        proteins.append(protein.drop(columns="chosen_cog"))
+
+    df = concat_tables([compact(protein, draft=True) for protein in proteins])
+    df = df.iloc[np.argsort(df["order"].to_numpy(), kind="stable")]
+    return df[["protein_id", "source", "cog", "cat"]].reset_index(drop=True)
+
+
+def consensus_proteins(id_downloaded, em_data, om_data, batch_data, cogs_data):
+    """
+    create consensus of COG assignments of the proteins
+    :param id_downloaded: ids of downloaded proteins
+    :param em_data: eggNOG-mapper processed data
+    :param om_data: Operon-mapper processed data
+    :param batch_data: Batch CD-Search processed data
+    :param cogs_data: categories of COGs from the COG database
+    :return: proteins with the chosen COG assignment
+    """
+    return assemble_proteins(vote_proteins(merge_proteins(id_downloaded, em_data, om_data, batch_data)),
+                             [em_data, om_data, batch_data], cogs_data)
+
+
+def read_state(state_dir, files):
+    """
+    read the state of the previous consensus
+    :param state_dir: the directory with the state
+    :param files: the processed files of the current run
+    :return: the metadata of the previous run and the list of tools whose processed file has changed,
+    None if there is no previous state
+    """
+    if not os.path.exists(state_dir + "/meta.json"):
+        return None
+    with open(state_dir + "/meta.json") as handle:
+        meta = json.load(handle)
+    changed = [tool for tool, file in enumerate(files)
+               if not filecmp.cmp(file, state_dir + "/" + STATE_FILES[tool], shallow=False)]
+    return meta, changed
+
+
+def save_state(state_dir, files, votes, meta):
+    """
+    save the processed files and the votes of the consensus for the next run, the previous state is replaced
+    only when the new state is complete
+    """
+    partial_dir = state_dir + ".partial"
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    for tool, file in enumerate(files):
+        shutil.copyfile(file, partial_dir + "/" + STATE_FILES[tool])
+    votes.to_csv(partial_dir + "/votes.txt", sep="\t", index=False)
+    with open(partial_dir + "/meta.json", "w") as handle:
+        json.dump(meta, handle)
+    shutil.rmtree(state_dir, ignore_errors=True)
+    os.replace(partial_dir, state_dir)
+
+
+def changed_rows(old, new):
+    """
+    compare two versions of the table row by row
+    :return: pairs of row indexes of unchanged rows (old_row, new_row), -1 in place of removed and added rows
+    """
+    columns = list(old.columns)
+    old = old.astype(str)
+    new = new.astype(str)
+    old = old.assign(occurrence=old.groupby(columns).cumcount(), old_row=old.index)
+    new = new.assign(occurrence=new.groupby(columns).cumcount(), new_row=new.index)
+    rows = pd.merge(old, new, on=columns + ["occurrence"], how="outer")
+    return rows[["old_row", "new_row"]].fillna(-1).astype(int)
+
+
+def stops(data):
+    """
+    the replicon, strand and stop coordinate of features, features with different stops are never matched
+    """
+    strand = data["strand"].astype(str)
+    stop = data["end"].where(strand != "-", data["start"])
+    return pd.MultiIndex.from_arrays([data["seqname"].astype(str), strand, stop.astype(int)])
+
+
+def update_votes(state_dir, files, programs, tables, min_overlap=MIN_OVERLAP):
+    """
+    update the votes of the previous consensus of complete genome if only one processed file has changed, the
+    features with the same stop coordinate as the removed and added features of the changed file are matched and
+    voted again
+    :param programs: eggNOG-mapper, Operon-mapper and Batch CD-Search processed data
+    :param tables: location and COG of features predicted by the three tools
+    :return: the updated votes, None if the consensus has to be created from scratch
+    """
+    state = read_state(state_dir, files)
+    if state is None or state[0].get("min_overlap") != min_overlap or len(state[1]) > 1:
+        return None
+    votes = pd.read_csv(state_dir + "/votes.txt", sep="\t", dtype={"seqname": "object", "strand": "object"},
+                        keep_default_na=False)
+    if len(state[1]) == 0:
+        return votes
+
+    tool = state[1][0]
+    row = ["row_x", "row_y", "row"][tool]
+    old_data = read_processed(state_dir + "/" + STATE_FILES[tool])
+    rows = changed_rows(old_data, programs[tool][old_data.columns])
+    affected = stops(old_data.loc[rows.loc[rows.new_row < 0, "old_row"]]).union(
+        stops(programs[tool].loc[rows.loc[rows.old_row < 0, "new_row"]]))
+
+    # unchanged features keep their votes, only their rows in the changed file are renumbered
+    kept = votes.loc[~stops(votes).isin(affected)].copy()
+    renumber = dict(zip(rows["old_row"], rows["new_row"]))
+    renumber[-1] = -1
+    kept[row] = kept[row].map(renumber)
+
+    # features sharing the stop with changed features are matched and voted again
+    subsets = [table.loc[stops(table).isin(affected)] for table in tables]
+    new_votes = vote_features(match_features(subsets, min_overlap=min_overlap))
+    for column in ["seqname", "strand", "COG_x", "COG_y", "COG"]:
+        new_votes[column] = new_votes[column].astype(str)
+    votes = pd.concat([kept, new_votes], ignore_index=True)
+    return votes.sort_values(["seqname", "start", "end", "strand"], kind="mergesort", ignore_index=True)
+
+
+def update_votes_draft(state_dir, files, programs, id_downloaded, proteins_digest):
+    """
+    update the votes of the previous consensus of draft genome if only one processed file has changed, only the
+    proteins with changed assignment are voted again
+    :param programs: eggNOG-mapper, Operon-mapper and Batch CD-Search processed data
+    :param id_downloaded: ids of downloaded proteins
+    :param proteins_digest: the digest of the ids of downloaded proteins
+    :return: the updated votes, None if the consensus has to be created from scratch
+    """
+    state = read_state(state_dir, files)
+    if state is None or state[0].get("proteins") != proteins_digest or len(state[1]) > 1:
+        return None
+    votes = pd.read_csv(state_dir + "/votes.txt", sep="\t", dtype="object", keep_default_na=False)
+    votes["tool"] = votes["tool"].astype(int)
+    if len(state[1]) == 0:
+        return votes
+
+    tool = state[1][0]
+    old_data = read_processed(state_dir + "/" + STATE_FILES[tool], draft=True)
+    rows = changed_rows(old_data, programs[tool])
+    affected = set(old_data.loc[rows.loc[rows.new_row < 0, "old_row"], "protein_id"]) | \
+        set(programs[tool].loc[rows.loc[rows.old_row < 0, "new_row"], "protein_id"])
+
+    # proteins with changed assignment are voted again, the others keep their previous votes
+    new_df = merge_proteins(id_downloaded, *programs)
+    columns = ["protein_id", "cog_x", "cog_y", "cog"]
+    previous = votes.drop_duplicates(columns)
+    tools = new_df[columns].astype(str).merge(previous, on=columns, how="left")["tool"]
+    again = (new_df["protein_id"].isin(affected) | tools.isna()).to_numpy()
+    tools[again] = vote_proteins(new_df.loc[again])["tool"].to_numpy()
+    return new_df.assign(tool=tools.astype(int).to_numpy())
+
+
+def write_shards(data, column, n_shards, shard_file):
+    """
+    hash-partition the table by the given column and append the parts to shard files
+    :param data: the table to be split
+    :param column: the column used for partitioning
+    :param n_shards: the number of shards
+    :param shard_file: the path to shard file with {} in place of shard number
+    """
+    shards = pd.util.hash_pandas_object(data[column], index=False) % n_shards
+    for shard, part in data.groupby(shards.values):
+        path = shard_file.format(shard)
+        part.to_csv(path, sep='\t', index=False, header=not os.path.exists(path), mode='a')
+
+
+def read_shard(path, columns):
+    """
+    read one shard, a table without rows is returned if the shard does not exist
+    """
+    if os.path.exists(path):
+        return read_processed(path, draft=True)
+    return compact(pd.DataFrame(columns=columns), draft=True)
+
+
+def create_consensus_draft_sharded(organism_name, proteins, em_file, om_file, batch_file, cat_choice=1,
+                                   memory_budget=1024, chunksize=100000, output_dir=os.getcwd()):
+    """
+    Create consensus of the draft genome out-of-core. The processed files and ids of downloaded proteins are read
+    in chunks, split by protein_id into temporary shards and the consensus is created one shard at a time and
+    streamed into the output file.
+    :param memory_budget: the memory (MB) available for the consensus
+    :param chunksize: the number of lines read at once
+    :return: file with COG assignments
+    """
+    columns = ["protein_id", "source", "cog", "cat"]
+    files = [em_file, om_file, batch_file]
+
+    cogs_data = read_cogs()
+    cat_dic = None
+    with tempfile.TemporaryDirectory(dir=output_dir) as shard_dir:
+        # ids of downloaded proteins are streamed from the fasta file in chunks into one column, the sequences
+        # are not counted in the size of the inputs
+        ids_file = shard_dir + "/ids.txt"
+        ids = iter_fasta_ids(proteins)
+        for chunk in iter(lambda: list(islice(ids, chunksize)), []):
+            pd.DataFrame({"protein_id": chunk}).to_csv(ids_file, sep='\t', index=False,
+                                                       header=not os.path.exists(ids_file), mode='a')
+
+        # the number of shards is estimated from the size of processed files and ids, one shard of all files
+        # has to fit into the memory budget including the merged table and the chosen assignments
+        size = sum(os.path.getsize(file) for file in files + [ids_file] if os.path.exists(file))
+        n_shards = max(1, math.ceil(size * SHARD_MEMORY_FACTOR / (memory_budget * 1024 * 1024)))
+
+        # split the processed files and ids of downloaded proteins into shards
+        for tool, file in enumerate(files):
+            for chunk in pd.read_csv(file, sep='\t', comment='#', dtype=DRAFT_DTYPES, chunksize=chunksize):
+                write_shards(chunk, "protein_id", n_shards, shard_dir + "/" + str(tool) + "_{}.txt")
+        if os.path.exists(ids_file):
+            for chunk in pd.read_csv(ids_file, sep='\t', dtype="object", chunksize=chunksize):
+                write_shards(chunk, "protein_id", n_shards, shard_dir + "/ids_{}.txt")
+
+        # create consensus of every shard, the categories are counted for the choice of category
+        for shard in range(n_shards):
+            ids_file = shard_dir + "/ids_" + str(shard) + ".txt"
+            id_downloaded = list(pd.read_csv(ids_file, sep='\t', dtype="object")["protein_id"]) \
+                if os.path.exists(ids_file) else []
+            df = consensus_proteins(id_downloaded,
+                                    *[read_shard(shard_dir + "/" + str(tool) + "_" + str(shard) + ".txt", columns)
+                                      for tool in range(3)], cogs_data)
+            if cat_choice in (3, 4):
+                cat_dic = count_categories_draft(df, cat_dic)
+            df.to_csv(shard_dir + "/consensus_" + str(shard) + ".txt", sep='\t', index=False)
+
+        # stream the assignments into the output file
+        output_file = output_dir + '/consensus_' + organism_name + '.txt'
+        stats = None
+        with atomic_open(output_file) as f:
+            f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# COG annotation\n')
+            f.write("\t".join(columns) + "\n")
+            for shard in range(n_shards):
+                df = read_processed(shard_dir + "/consensus_" + str(shard) + ".txt", draft=True)
+                if cat_choice != 0:
+                    df = categories_choice_draft(df, cat_choice=cat_choice, cat_dic=cat_dic)
+                stats = add_stats(stats, category_stats(df, draft=True))
+                df.to_csv(f, sep='\t', index=False, header=False)
+        write_stats(stats, organism_name, output_file)
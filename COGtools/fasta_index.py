@@ -0,0 +1,164 @@
+import os
+import mmap
+from Bio import SeqIO
+try:
+    from COGtools.file_manager import open_file, atomic_open
+except ImportError:
+    from file_manager import open_file, atomic_open
+
+
+def header_id(header):
+    """
+    the id of the sequence: the first word of its header line without ">"
+    """
+    return header[1:].split()[0] if header[1:].strip() else header[:0]
+
+
+def build_index(fasta_file):
+    """
+    Scan the fasta file and get the byte offsets of its sequences without parsing them (samtools faidx format),
+    the sequences with lines of different length (only the last line may be shorter) get 0 bases and bytes per line
+    :param fasta_file: the path to the fasta file
+    :return: list of records [id, sequence length, offset of sequence, bases per line, bytes per line]
+    """
+    index = []
+    record = None
+    last_line = False
+    with open(fasta_file, "rb") as fasta:
+        offset = 0
+        for line in fasta:
+            if line.startswith(b">"):
+                if record is not None:
+                    index.append(record)
+                record = [header_id(line).decode(), 0, offset + len(line), 0, 0]
+                last_line = False
+                ragged = False
+            elif record is not None and not line.strip():
+                # a blank line ends the lines of the sequence
+                last_line = last_line or record[1] > 0
+            elif record is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if last_line:
+                    ragged = True
+                if record[1] == 0:
+                    record[3] = bases
+                    record[4] = len(line)
+                elif bases != record[3] or len(line) != record[4]:
+                    # only the last line of the sequence can be shorter
+                    last_line = True
+                record[1] += bases
+                if ragged:
+                    record[3] = record[4] = 0
+            offset += len(line)
+    if record is not None:
+        index.append(record)
+    return index
+
+
+def read_index(fasta_file):
+    """
+    Read the index stored next to the fasta file (<fasta>.fai), the index is created if it is missing or older
+    than the fasta file. The index is kept only in memory if it cannot be written next to the fasta file or if
+    some sequence has lines of different length (samtools faidx format cannot describe it).
+    :param fasta_file: the path to the fasta file
+    :return: list of records [id, sequence length, offset of sequence, bases per line, bytes per line]
+    """
+    index_file = fasta_file + ".fai"
+    try:
+        if os.path.getmtime(index_file) >= os.path.getmtime(fasta_file):
+            with open(index_file) as handle:
+                return [[fields[0]] + [int(field) for field in fields[1:5]]
+                        for fields in (line.rstrip("\n").split("\t") for line in handle) if len(fields) >= 5]
+    except (OSError, ValueError):
+        # the index is missing, not readable or broken
+        pass
+
+    index = build_index(fasta_file)
+    if all(record[3] > 0 or record[1] == 0 for record in index):
+        try:
+            with atomic_open(index_file) as handle:
+                for record in index:
+                    handle.write("\t".join(str(field) for field in record) + "\n")
+        except OSError:
+            # the directory is not writable
+            pass
+    return index
+
+
+def iter_fasta_ids(fasta_file):
+    """
+    Iterate over ids of the sequences in the fasta file by scanning their headers without parsing the sequences
+    :param fasta_file: the path to the fasta file (optionally gzip-compressed)
+    :return: generator of ids
+    """
+    with open_file(fasta_file) as handle:
+        for line in handle:
+            if line.startswith(">"):
+                yield header_id(line)
+
+
+def fasta_ids(fasta_file):
+    """
+    Get ids of the sequences in the fasta file by scanning their headers without parsing the sequences
+    :param fasta_file: the path to the fasta file (optionally gzip-compressed)
+    :return: list of ids
+    """
+    return list(iter_fasta_ids(fasta_file))
+
+
+class FastaIndex:
+    """
+    Random access to the sequences of the fasta file, the sequences are read lazily through mmap using the index
+    stored next to the fasta file. The sequences with lines of different length are read up to the next header.
+    Gzip-compressed files are parsed into memory.
+    """
+    def __init__(self, fasta_file):
+        self.fasta_file = fasta_file
+        self.map = None
+        self.file = None
+        if str(fasta_file).endswith(".gz"):
+            with open_file(fasta_file) as handle:
+                records = [(record.id, str(record.seq)) for record in SeqIO.parse(handle, "fasta")]
+            self.ids = [record[0] for record in records]
+            self.sequences = [record[1] for record in records]
+            self.index = None
+        else:
+            self.index = read_index(fasta_file)
+            self.ids = [record[0] for record in self.index]
+            self.sequences = None
+            if os.path.getsize(fasta_file) > 0:
+                self.file = open(fasta_file, "rb")
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.positions = {seq_id: position for position, seq_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        """
+        Get the sequence by its position in the file or by its id
+        """
+        position = self.positions[key] if isinstance(key, str) else key
+        if self.sequences is not None:
+            return self.sequences[position]
+
+        seq_id, length, offset, line_bases, line_width = self.index[position]
+        if length == 0:
+            return ""
+        if line_bases == 0:
+            end = self.map.find(b"\n>", offset)
+            return b"".join(self.map[offset:len(self.map) if end < 0 else end].split()).decode()
+        end = offset + length + (length - 1) // line_bases * (line_width - line_bases)
+        return self.map[offset:end].decode().replace("\n", "").replace("\r", "")
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,117 @@
+import io
+from bisect import bisect_left
+import pandas as pd
+from Bio import bgzf
+try:
+    from COGtools.file_manager import GFF_COLUMNS, GFF_DTYPES
+    from COGtools.checkpoint import write_atomic
+except ImportError:
+    from file_manager import GFF_COLUMNS, GFF_DTYPES
+    from checkpoint import write_atomic
+
+# size of the windows of the index in bases
+WINDOW = 16384
+
+
+def write_indexed(df, output_file, window=WINDOW):
+    """
+    Write the features sorted by their location into block-compressed gff file (BGZF, readable by gzip and tabix)
+    and index it (<output_file>.idx): for every window of every replicon, the virtual offset of the first feature
+    overlapping the window
+    :param df: features in the internal schema
+    :param output_file: the path to the output file (.gff.gz)
+    :param window: the size of the windows in bases
+    :return: the index {seqname: [(window, virtual offset)]}
+    """
+    location = pd.DataFrame({"seqname": df["seqname"].astype(str).to_numpy(), "start": df["start"].to_numpy(),
+                             "end": df["end"].to_numpy()})
+    df = df[list(GFF_COLUMNS)].iloc[location.sort_values(["seqname", "start", "end"], kind="mergesort").index]
+    lines = df.to_csv(sep="\t", index=False, header=False).splitlines(keepends=True)
+
+    index = {}
+    with bgzf.BgzfWriter(output_file, "wb") as handle:
+        handle.write(('# created with COGtools 1.0.0\n'
+                      '# AC number: ' + ", ".join(df["seqname"].astype(str).unique()) + '\n'
+                      '# COG annotation\n').encode())
+        for line, seqname, start, end in zip(lines, df["seqname"].astype(str).tolist(), df["start"].tolist(),
+                                             df["end"].tolist()):
+            offset = handle.tell()
+            windows = index.setdefault(seqname, {})
+            # features are sorted by start, the first feature touching the window has the smallest offset
+            for position in range((start - 1) // window, (end - 1) // window + 1):
+                windows.setdefault(position, offset)
+            handle.write(line.encode())
+
+    write_atomic(output_file + ".idx", "#window\t" + str(window) + "\n" + "".join(
+        seqname + "\t" + str(position) + "\t" + str(offset) + "\n"
+        for seqname, windows in index.items() for position, offset in sorted(windows.items())))
+    return {seqname: sorted(windows.items()) for seqname, windows in index.items()}
+
+
+def read_feature_index(indexed_file):
+    """
+    Read the index stored next to the indexed gff file
+    :return: the size of windows and the index {seqname: ([windows], [virtual offsets])}
+    """
+    index = {}
+    window = WINDOW
+    with open(indexed_file + ".idx") as handle:
+        for line in handle:
+            fields = line.rstrip("\n").split("\t")
+            if fields[0] == "#window":
+                window = int(fields[1])
+            elif len(fields) == 3:
+                windows = index.setdefault(fields[0], ([], []))
+                windows[0].append(int(fields[1]))
+                windows[1].append(int(fields[2]))
+    return window, index
+
+
+class FeatureIndex:
+    """
+    Region queries on the indexed output of the consensus (<organism>_file_to_plot.gff.gz), only the blocks
+    with features overlapping the region are decompressed
+    """
+    def __init__(self, indexed_file):
+        self.indexed_file = indexed_file
+        self.window, self.index = read_feature_index(indexed_file)
+        self.handle = bgzf.BgzfReader(indexed_file, "rb")
+
+    def features_in(self, seqname, start, end):
+        """
+        Get the features overlapping the region
+        :param seqname: the replicon
+        :param start: the first position of the region (1-based)
+        :param end: the last position of the region
+        :return: table of features in the internal schema sorted by their location
+        """
+        lines = []
+        windows, offsets = self.index.get(seqname, ([], []))
+        # the first indexed window from the start of the region, empty windows are skipped
+        position = bisect_left(windows, (start - 1) // self.window)
+        if position < len(windows):
+            self.handle.seek(offsets[position])
+            seqname = seqname.encode()
+            for line in iter(self.handle.readline, b""):
+                fields = line.split(b"\t", 5)
+                if fields[0] != seqname or int(fields[3]) > end:
+                    break
+                if int(fields[4]) >= start:
+                    lines.append(line)
+        return pd.read_csv(io.BytesIO(b"".join(lines)), sep="\t", header=None, names=GFF_COLUMNS, dtype=GFF_DTYPES) \
+            if lines else pd.DataFrame(columns=GFF_COLUMNS).astype(GFF_DTYPES)
+
+    def seqnames(self):
+        return list(self.index.keys())
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
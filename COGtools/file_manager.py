@@ -0,0 +1,259 @@
+import io
+import os
+import re
+import gzip
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import reduce, lru_cache
+from itertools import takewhile
+import pandas as pd
+import pkg_resources
+
+# internal schema of feature tables: coordinates as int32, repeated strings as categoricals
+GFF_COLUMNS = ("seqname", "source", "type", "start", "end", "score", "strand", "frame", "attribute")
+GFF_DTYPES = {"seqname": "category", "source": "category", "type": "category", "start": "int32", "end": "int32",
+              "score": "category", "strand": "category", "frame": "category", "attribute": "object"}
+DRAFT_DTYPES = {"protein_id": "object", "source": "category", "cog": "category", "cat": "category"}
+OPERON_COG_DTYPES = {"ID": "object", "COG": "category", "category": "category"}
+# attribute of features processed by COGtools: ID=<id>;COG=<COG>;CAT=<categories>;desc=<description>
+ATTRIBUTE_FIELDS = ["ID", "COG", "CAT", "desc"]
+ATTRIBUTE_DTYPES = {"ID": "object", "COG": "category", "CAT": "category", "desc": "object"}
+ATTRIBUTE_PATTERN = re.compile(r"^ID=(?P<ID>[^;]*);COG=(?P<COG>[^;]*);CAT=(?P<CAT>[^;]*);(?:desc=(?P<desc>.*))?$")
+# permissions of the written files, the temporary files are created readable only by the owner
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+@lru_cache(maxsize=None)
+def read_data(file_name):
+    """
+    Read the file from COGtools-data (cogs.txt, fun-20.tab.txt), the content is cached so that the reference files
+    are read only once per process
+    :param file_name: the name of the file in COGtools-data
+    :return: content of the file
+    """
+    with open(pkg_resources.resource_filename(__name__, 'COGtools-data/' + file_name), "r") as handle:
+        return handle.read()
+
+
+def read_cogs():
+    """
+    Read the categories of COGs from the COG database (cogs.txt)
+    :return: dictionary {COG: categories}
+    """
+    return dict(line.split("\t") for line in read_data("cogs.txt").split("\n") if line.strip())
+
+
+def open_file(path, mode="r"):
+    """
+    Open the file, gzip-compressed files (.gz) are decompressed transparently
+    :param path: the path to the file
+    :param mode: the mode in which the file is opened
+    :return: file object
+    """
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode if "b" in mode else mode + "t")
+    return open(path, mode)
+
+
+@contextmanager
+def atomic_open(path, buffer_size=1024 * 1024):
+    """
+    Open the output file for writing through one buffered handle, the content is written into temporary file
+    with unique name in the same directory renamed to the path when the writing succeeds, so the output is never
+    left truncated and concurrent writers of the same output do not overwrite each other's temporary file
+    :param path: the path to the output file
+    :param buffer_size: the size of the buffer in bytes
+    :return: file object
+    """
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                             prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        handle = os.fdopen(descriptor, "w", buffering=buffer_size)
+    except BaseException:
+        os.close(descriptor)
+        os.remove(temporary)
+        raise
+    try:
+        yield handle
+        handle.flush()
+        os.fsync(handle.fileno())
+        handle.close()
+        os.chmod(temporary, 0o666 & ~UMASK)
+        os.replace(temporary, path)
+    except BaseException:
+        handle.close()
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def write_table(path, table, comments=(), header=True):
+    """
+    Write the table with the comment lines (e.g. created with COGtools) at once
+    :param path: the path to the output file
+    :param table: the table (DataFrame or ColumnBuffer)
+    :param comments: the lines written before the table, "# " is prepended to them
+    :param header: write the names of columns
+    """
+    if isinstance(table, ColumnBuffer):
+        table = table.to_frame()
+    with atomic_open(path) as handle:
+        handle.write("".join("# " + line + "\n" for line in comments))
+        table.to_csv(handle, sep="\t", index=False, header=header)
+
+
+class ColumnBuffer:
+    """
+    Rows of the output table collected column by column, the table is created at once when it is written instead
+    of concatenating the rows one by one
+    """
+    def __init__(self, columns):
+        self.columns = {column: [] for column in columns}
+
+    def append(self, *values):
+        """
+        Add one row, the values are given in the order of columns
+        """
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+
+    def extend(self, **columns):
+        """
+        Add more rows given by the values of individual columns
+        """
+        for name, values in columns.items():
+            self.columns[name].extend(values)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns)
+
+
+def copy_fasta(fasta_file, handle, chunk_size=1024 * 1024):
+    """
+    Copy the genomic sequence into an already opened output file in chunks
+    :param fasta_file: the path to genomic sequence (fasta, optionally gzip-compressed)
+    :param handle: the opened output file
+    :param chunk_size: the size of copied chunks in bytes
+    """
+    with open_file(fasta_file) as fasta:
+        shutil.copyfileobj(fasta, handle, chunk_size)
+
+
+def read_gff(file, dtype=None, chunksize=None):
+    """
+    Read the file in gff format (without header) into the internal schema
+    :param file: the path to the file
+    :param dtype: dtypes overriding the internal schema
+    :param chunksize: if given, the file is read in chunks of given number of lines
+    :return: table of features (iterator of tables if chunksize is given)
+    """
+    return pd.read_csv(file, sep="\t", header=None, comment="#", names=GFF_COLUMNS,
+                       dtype=dict(GFF_DTYPES, **(dtype or {})), chunksize=chunksize)
+
+
+def read_processed(file, draft=False):
+    """
+    Read the file processed by COGtools into the internal schema
+    :type draft: bool
+    :param file: the path to the processed file
+    :param draft: the file contains COG assignments of a draft genome
+    :return: table of features or proteins
+    """
+    return pd.read_csv(file, sep="\t", comment="#", dtype=DRAFT_DTYPES if draft else GFF_DTYPES)
+
+
+def read_annotation(file):
+    """
+    Read the COG assignments from the annotation written by consensus: the file to plot of complete genome (the
+    genomic sequence after the features is skipped, the indexed .gff.gz is read as well) or the consensus of draft
+    genome (with or without the header of columns)
+    :param file: the path to the annotation
+    :return: table with columns COG and CAT of CDSs and pseudogenes (proteins of draft genome)
+    """
+    with open_file(file) as handle:
+        lines = [line for line in takewhile(lambda line: line.strip(), handle) if not line.startswith("#")]
+    if len(lines) == 0:
+        return pd.DataFrame({"COG": [], "CAT": []}, dtype="object")
+    if lines[0].startswith("protein_id\t") or lines[0].count("\t") == 3:
+        header = 0 if lines[0].startswith("protein_id\t") else None
+        data = pd.read_csv(io.StringIO("".join(lines)), sep="\t", header=header, names=list(DRAFT_DTYPES),
+                           dtype="object")
+        return pd.DataFrame({"COG": data["cog"], "CAT": data["cat"]})
+    data = pd.read_csv(io.StringIO("".join(lines)), sep="\t", header=None, names=GFF_COLUMNS,
+                       usecols=["type", "attribute"], dtype="object")
+    fields = decode_attributes(data.loc[data["type"].isin(["CDS", "pseudogene"]), "attribute"])
+    return fields[["COG", "CAT"]].astype(object).dropna().reset_index(drop=True)
+
+
+def compact(data, draft=False):
+    """
+    Convert the columns of the table into the internal schema
+    """
+    dtypes = DRAFT_DTYPES if draft else GFF_DTYPES
+    return data.astype({column: dtype for column, dtype in dtypes.items() if column in data.columns})
+
+
+def decode_attributes(attributes):
+    """
+    Split the attributes of features processed by COGtools into typed columns
+    :param attributes: the attribute column
+    :return: table with columns ID, COG, CAT and desc, the values are missing if the attribute has other format
+    (e.g. ncRNA) and desc is missing if it is not given (Batch CD-Search)
+    """
+    return pd.Series(attributes, dtype="object").str.extract(ATTRIBUTE_PATTERN).astype(ATTRIBUTE_DTYPES)
+
+
+def encode_attributes(fields):
+    """
+    Join the typed columns into the attributes of features processed by COGtools
+    :param fields: table with columns ID, COG, CAT and optionally desc, desc is left out where it is missing
+    :return: the attribute column
+    """
+    attributes = "ID=" + fields["ID"].astype(str) + ";COG=" + fields["COG"].astype(str) + ";CAT=" + \
+        fields["CAT"].astype(str) + ";"
+    if "desc" in fields.columns:
+        attributes = attributes.where(fields["desc"].isna(), attributes + "desc=" + fields["desc"].astype(str))
+    return attributes
+
+
+@lru_cache(maxsize=None)
+def field_pattern(key):
+    return re.compile("(?:^|;)" + re.escape(key) + "=([^;]*)")
+
+
+def attribute_field(attributes, key):
+    """
+    Get the value of one key from the attributes in gff format (key=value pairs separated by semicolons)
+    :param attributes: the attribute column
+    :param key: the key
+    :return: the values, missing if the attribute does not contain the key
+    """
+    return pd.Series(attributes, dtype="object").str.extract(field_pattern(key), expand=False)
+
+
+def concat_tables(tables):
+    """
+    Concatenate the tables, categorical columns keep the union of their categories
+    """
+    tables = list(tables)
+    for column in tables[0].columns:
+        if all(column in table.columns and isinstance(table[column].dtype, pd.CategoricalDtype) for table in tables):
+            categories = reduce(lambda x, y: x.union(y), [table[column].cat.categories for table in tables])
+            tables = [table.assign(**{column: table[column].cat.set_categories(categories)}) for table in tables]
+    return pd.concat(tables, ignore_index=True)
+
+
+def fill_missing(data, columns, value="-"):
+    """
+    Fill the missing values of given columns, the value is added to the categories of categorical columns
+    """
+    for column in columns:
+        if isinstance(data[column].dtype, pd.CategoricalDtype) and value not in data[column].cat.categories:
+            data[column] = data[column].cat.add_categories([value])
+        data[column] = data[column].fillna(value)
+    return data
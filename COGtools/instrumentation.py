@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import cProfile
+import threading
+import traceback
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+try:
+    import resource
+except ImportError:
+    # peak RSS is not available on Windows
+    resource = None
+try:
+    from COGtools.file_manager import open_file
+except ImportError:
+    from file_manager import open_file
+
+# the interval (seconds) of sampling the resident set size during a stage
+RSS_INTERVAL = 0.01
+
+
+def count_rows(file, header=False):
+    """
+    count the data lines of the file, comments and empty lines are skipped and the counting stops
+    at the genomic sequence appended to the file
+    :param file: the path to the file
+    :param header: the first data line is a header
+    :return: the number of rows
+    """
+    rows = 0
+    with open_file(file) as handle:
+        for line in handle:
+            if line.startswith(">"):
+                break
+            if line.strip() and not line.startswith("#"):
+                rows += 1
+    return max(rows - 1, 0) if header and rows > 0 else rows
+
+
+def max_rss():
+    """
+    the highest resident set size (MB) of this process and its finished child processes since they started, it
+    includes all earlier stages (and earlier jobs of the worker)
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def current_rss():
+    """
+    the current resident set size (MB) of this process, None if /proc is not available (other systems than Linux)
+    """
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    Sample the resident set size of this process in a background thread, the peak of one stage is measured
+    regardless of the memory used by the stages before it
+    """
+    def __init__(self, interval=RSS_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss()
+        self.finished = threading.Event()
+        self.thread = None
+        if self.peak is not None:
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+
+    def sample(self):
+        while not self.finished.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def stop(self):
+        """
+        Stop the sampling
+        :return: the peak resident set size (MB) since the start, None if it cannot be measured
+        """
+        if self.thread is None:
+            return None
+        self.finished.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss() or 0)
+        return self.peak
+
+
+class RunReport:
+    """
+    Record wall time, rows in/out, rows per second and peak RSS of the pipeline stages and save them
+    into a JSON report (<organism>_run_report.json), optionally with a cProfile dump of every stage
+    (<organism>_<stage>.prof). peak_rss_mb is the peak of the stage (of the run in the report) sampled while it runs,
+    max_rss_so_far_mb is the high-water mark of the process and its child processes up to the end of the stage.
+    """
+    def __init__(self, organism_name, output_dir, enabled=True, profile=False):
+        self.organism_name = organism_name
+        self.output_dir = output_dir
+        self.enabled = enabled or profile
+        self.profile = profile
+        self.started = datetime.now()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, inputs=(), outputs=()):
+        """
+        Measure the stage run inside the with block
+        :param name: the name of the stage
+        :param inputs: the paths to input files as (path, has header) pairs
+        :param outputs: the paths to output files as (path, has header) pairs
+        :return: the record of the stage, rows_in and rows_out can be set inside the with block
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {"stage": name, "started": datetime.now().isoformat(timespec="seconds")}
+        profiler = cProfile.Profile() if self.profile else None
+        sampler = RssSampler()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "failed"
+            record["error"] = repr(e)
+            record["traceback"] = traceback.format_exc()
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.output_dir + "/" + self.organism_name + "_" + name + ".prof")
+            record["wall_time"] = time.perf_counter() - start
+            if "rows_in" not in record:
+                record["rows_in"] = sum(count_rows(path, header) for path, header in inputs
+                                        if path is not None and os.path.exists(path))
+            if "rows_out" not in record and record["status"] == "ok":
+                record["rows_out"] = sum(count_rows(path, header) for path, header in outputs
+                                         if path is not None and os.path.exists(path))
+            record["rows_per_second"] = record["rows_in"] / record["wall_time"] if record["wall_time"] > 0 else None
+            record["peak_rss_mb"] = sampler.stop()
+            record["max_rss_so_far_mb"] = max_rss()
+            self.stages.append(record)
+
+    def skip(self, name):
+        """
+        Record the stage skipped because it was completed by the previous run
+        """
+        if self.enabled:
+            self.stages.append({"stage": name, "status": "skipped"})
+
+    def save(self):
+        """
+        Save the report into the output directory
+        :return: the path to the report
+        """
+        if not self.enabled:
+            return None
+        report = {"organism": self.organism_name,
+                  "cogtools_version": "1.0.0",
+                  "started": self.started.isoformat(timespec="seconds"),
+                  "wall_time": (datetime.now() - self.started).total_seconds(),
+                  "status": "failed" if any(stage["status"] == "failed" for stage in self.stages) else "ok",
+                  "peak_rss_mb": max([stage["peak_rss_mb"] for stage in self.stages
+                                      if stage.get("peak_rss_mb") is not None], default=None),
+                  "max_rss_so_far_mb": max_rss(),
+                  "stages": self.stages}
+        path = self.output_dir + "/" + self.organism_name + "_run_report.json"
+        with open(path, "w") as handle:
+            json.dump(report, handle, indent=2)
+        return path
+
+
+def stage(report, name, inputs=(), outputs=()):
+    """
+    Measure the stage if the report is given, see RunReport.stage
+    """
+    return report.stage(name, inputs, outputs) if report is not None else nullcontext({})
@@ -1,65 +1,106 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import pkg_resources
+import json
+import warnings
 from os import listdir
-from os.path import isfile, join
-import re
+from os.path import isfile, join, splitext
+try:
+    from COGtools.file_manager import read_data, read_annotation
+    from COGtools.consensus import CATEGORIES
+except ImportError:
+    from file_manager import read_data, read_annotation
+    from consensus import CATEGORIES
 
+# counting of features with more categories
+MULTI_CATEGORY = ("all", "split", "first")
 
-def categories_barplot(path_to_data, names=None, draft=False, cog_palette=True, include_unknown=True):
+
+def tally_categories(cats, multi="all"):
+    """
+    Count the features in individual categories, the distinct values of categories are counted at once
+    :param cats: categories of features, e.g. "K", "KL" or "-" for COGs unknown
+    :param multi: features with more categories are counted in "all" their categories, "split" equally among them
+    (1/n to each) or only in the "first" one
+    :return: dictionary {category: count}
+    """
+    if multi not in MULTI_CATEGORY:
+        raise ValueError("Unknown policy for multiple categories: " + str(multi))
+    cat_dic = dict.fromkeys(CATEGORIES, 0)
+    counts = pd.Series(cats, dtype="object").dropna().value_counts()
+    for cat, count in zip(counts.index, counts.to_numpy()):
+        letters = [letter for letter in cat if letter in cat_dic]
+        if len(letters) == 0:
+            continue
+        if multi == "first":
+            letters = letters[:1]
+        weight = count / len(letters) if multi == "split" else int(count)
+        for letter in letters:
+            cat_dic[letter] += weight
+    return cat_dic
+
+
+def categories_barplot(path_to_data, names=None, draft=None, cog_palette=True, include_unknown=True, multi="all"):
     """
     Visualizes the relative abundance of cog categories in the given genomes using barplots.
     :param path_to_data: the path to directory with genomes to be plotted
     :param names: names of the genomes, if not given, the file names in the folder will be used
     :type draft: bool
     :type cog_palette: bool
-    :param draft: plotting draft genomes
+    :param draft: deprecated, the format of the files of draft genomes is recognized, the value is not used
     :param cog_palette: use palette from COG database
     :param include_unknown: include COGs unknown
+    :param multi: features with more categories are counted in "all" their categories, "split" equally among them
+    or only in the "first" one
     :return: relative abundance of cog categories in the given genomes in csv file
     :return: barplots of relative abundance of cog categories in the given genomes
     """
-    header = "bacterium;J;A;K;L;B;D;Y;V;T;M;N;Z;W;U;O;X;C;G;E;F;H;I;P;Q;R;S;unknown\n"
+    if draft is not None:
+        warnings.warn("The draft parameter of categories_barplot is deprecated and not used, the format of the files "
+                      "is recognized", DeprecationWarning, stacklevel=2)
     organisms = [f for f in listdir(path_to_data) if isfile(join(path_to_data, f)) and f.endswith(".txt")]
     if names is None:
         names = organisms
 
-    my_string = header
+    counts = []
     for index in range(len(organisms)):
-        cat_dic = {"J": 0, "A": 0, "K": 0, "L": 0, "B": 0, "D": 0, "Y": 0, "V": 0, "T": 0, "M": 0, "N": 0,
-                   "Z": 0, "W": 0, "U": 0, "O": 0, "X": 0, "C": 0, "G": 0, "E": 0, "F": 0, "H": 0, "I": 0, "P": 0,
-                   "Q": 0, "R": 0, "S": 0, "-": 0}
-        organism = organisms[index]
-        organism_data = path_to_data + "/" + organism
-
-        if draft:
-            CogTools_data = pd.read_csv(organism_data, sep="\t", header=None, comment="#",
-                                        names=("protein_id", "source", "cog", "cat"))
-
-            for row in CogTools_data.index:
-                cat = CogTools_data["cat"][row]
-                cat_dic[cat] = cat_dic[cat] + 1
-
+        organism_data = path_to_data + "/" + organisms[index]
+        stats_file = splitext(organism_data)[0] + ".json"
+
+        if isfile(stats_file) and multi == "all":
+            # categories counted by consensus
+            with open(stats_file) as handle:
+                categories = json.load(handle)["categories"]
+            cat_dic = {category: categories.get(category, 0) for category in CATEGORIES}
         else:
-            CogTools_data = pd.read_csv(organism_data, sep="\t", header=None, comment="#",
-                                        names=("seqname", "source", "type", "start",
-                                               "end", "score", "strand", "frame",
-                                               "attribute"), dtype=str)
-
-            for row in CogTools_data.index:
-                # get only useful information about each CDS: feature_id, name, COG, COG category
-                type = CogTools_data["type"][row]
-                if type == "CDS" or type == "pseudogene":
-                    attribute = re.split(r"[=,;]", CogTools_data["attribute"][row])
-                    cat_dic[attribute[5]] = cat_dic[attribute[5]] + 1
+            # categories of CDSs and pseudogenes, proteins of draft genome
+            cat_dic = tally_categories(read_annotation(organism_data)["CAT"], multi)
 
         if include_unknown is False:
             cat_dic["-"] = 0
+        counts.append(cat_dic)
+
+    plot_categories(counts, names, path_to_data, cog_palette)
 
+
+def plot_categories(counts, names, path_to_data, cog_palette=True):
+    """
+    Visualizes the relative abundance of cog categories counted in the given genomes using barplots.
+    :param counts: counts of categories in the genomes, dictionaries {category: count}, "-" for COGs unknown
+    :param names: names of the genomes
+    :param path_to_data: the path to directory where the relative abundance is saved
+    :param cog_palette: use palette from COG database
+    :return: relative abundance of cog categories in the given genomes in csv file
+    :return: barplots of relative abundance of cog categories in the given genomes
+    """
+    header = "bacterium;J;A;K;L;B;D;Y;V;T;M;N;Z;W;U;O;X;C;G;E;F;H;I;P;Q;R;S;unknown\n"
+    my_string = header
+    for index in range(len(counts)):
+        cat_dic = {category: counts[index].get(category, 0) for category in CATEGORIES}
         my_string = my_string + names[index].replace('\n','')
         number = sum(cat_dic.values())
         for category in cat_dic.keys():
-            cat_dic[category] = cat_dic[category] * 100 / number
+            # the genome without any category counted gets an empty bar
+            cat_dic[category] = cat_dic[category] * 100 / number if number > 0 else 0.0
             my_string = my_string + ";" + str(cat_dic[category])
 
         my_string = my_string + "\n"
@@ -71,9 +112,7 @@ def categories_barplot(path_to_data, names=None, draft=False, cog_palette=True,
     # plotting
     index = 1 if cog_palette else 3
     colors = []
-    file = pkg_resources.resource_filename(__name__, 'COGtools-data/fun-20.tab.txt')
-    features = (open(file, "r")).read()
-    features = features.split('\n')
+    features = read_data("fun-20.tab.txt").split('\n')
 
     for feature in features:
         feature = feature.split('\t')
@@ -92,3 +131,23 @@ def categories_barplot(path_to_data, names=None, draft=False, cog_palette=True,
     plt.yticks([0, 20, 40, 60, 80, 100], ["0%", "20%", "40%", "60%", "80%", "100%"], fontsize=20)
     plt.xticks([i for i in range(len(names))], names, fontstyle='italic', fontsize=18, rotation=0)
     plt.show()
+
+
+def read_category_stats(path_to_data):
+    """
+    Collect the statistics written by consensus next to the annotation files of the genomes
+    :param path_to_data: the path to directory with genomes
+    :return: one row per genome with the numbers of features, COGs unknown, pseudogenes, ncRNAs and the counts of
+    individual categories
+    """
+    rows = []
+    for file in sorted(listdir(path_to_data)):
+        if not file.endswith(".txt") or not isfile(join(path_to_data, splitext(file)[0] + ".json")):
+            continue
+        with open(join(path_to_data, splitext(file)[0] + ".json")) as handle:
+            stats = json.load(handle)
+        row = {"file": file, "organism": stats["organism"], "features": stats["features"],
+               "unknown": stats["unknown"], "pseudogenes": stats["pseudogenes"], "ncRNA": stats["ncRNA"]}
+        row.update(stats["categories"])
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+from hashlib import sha1
+try:
+    from COGtools.worker import Worker, parse_job, run_job
+except ImportError:
+    from worker import Worker, parse_job, run_job
+
+# input files of the organism read by the pipeline (optionally gzip-compressed), the indexes of fasta files are
+# staged as well so that they are not built again
+INPUT_SUFFIXES = (".fasta", ".gff3", "_cds.txt", "_eggnog.gff", "_orf_operon.txt", "_cogs_operon.txt", "_batch.txt",
+                  "_proteins.fsa_aa", "_proteins_operon.txt")
+# the memory (MB) of input files staged at once
+PREFETCH_MEMORY = 2048
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def input_files(organism_name, input_dir):
+    """
+    return the paths to the input files of the organism present in the input directory
+    """
+    names = [organism_name + suffix + extension for suffix in INPUT_SUFFIXES
+             for extension in ("", ".gz", ".fai", ".gz.fai")]
+    return [input_dir + "/" + name for name in names if os.path.isfile(input_dir + "/" + name)]
+
+
+def staging_name(organism_name, arguments):
+    """
+    the name of the staging directory of the job given by the organism and its input and output directories, so the
+    staged inputs have the same paths in every run of the job (the journal of the organism identifies the inputs by
+    their paths) and the jobs do not share the directory regardless of their ids or order
+    """
+    key = "\n".join([organism_name, os.path.abspath(arguments["input_dir"]), os.path.abspath(arguments["output_dir"])])
+    return "cogtools_" + organism_name + "_" + sha1(key.encode()).hexdigest()[:12]
+
+
+class ByteBudget:
+    """
+    Limit of the bytes of input files held in memory, the files are staged only when the genomes annotated before
+    them release enough memory. A genome larger than the limit is staged alone.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, size):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    async def release(self, size):
+        async with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+def read_file(path):
+    with open(path, "rb", buffering=0) as handle:
+        return b"".join(iter(lambda: handle.read(CHUNK_SIZE), b""))
+
+
+async def stage_inputs(files, stage_dir):
+    """
+    Read the input files into memory concurrently and write them into the staging directory, the modification
+    times are kept so the journal of the organism recognizes unchanged inputs
+    """
+    loop = asyncio.get_running_loop()
+    buffers = await asyncio.gather(*[loop.run_in_executor(None, read_file, file) for file in files])
+    # the files left by a killed run are removed
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    os.makedirs(stage_dir)
+    for file, buffer in zip(files, buffers):
+        staged = stage_dir + "/" + os.path.basename(file)
+        with open(staged, "wb") as handle:
+            handle.write(buffer)
+        stat = os.stat(file)
+        os.utime(staged, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+async def run_prefetched(run, lines, write, pool_size=1, prefetch=1, memory_limit=PREFETCH_MEMORY,
+                         staging_dir=None):
+    """
+    Run the jobs in the pool of processes, the input files of the next genomes are read while the processes annotate
+    the current ones
+    :param run: the pipeline run by the jobs
+    :param lines: the jobs (JSON lines), an asynchronous iterator
+    :param write: the function writing the records of the finished jobs
+    :param pool_size: the number of jobs run at once
+    :param prefetch: the number of genomes staged ahead of the running jobs
+    :param memory_limit: the memory (MB) of input files staged at once
+    :param staging_dir: the directory of the staged files, memory-backed /dev/shm if available
+    """
+    if staging_dir is None:
+        staging_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    loop = asyncio.get_running_loop()
+    worker = Worker(run, pool_size)
+    budget = ByteBudget(memory_limit * 1024 * 1024)
+    slots = asyncio.Semaphore(pool_size + prefetch)
+    # the jobs of the same organism, inputs and outputs share the staging directory, they are run one by one
+    staging_locks = {}
+
+    async def process(line, number):
+        try:
+            job_id, organism_name, arguments = parse_job(line, number)
+        except ValueError as e:
+            write({"id": number, "status": "failed", "error": repr(e)})
+            return
+        files = input_files(organism_name, arguments["input_dir"])
+        size = sum(os.path.getsize(file) for file in files)
+        stage_dir = staging_dir + "/" + staging_name(organism_name, arguments)
+        async with staging_locks.setdefault(stage_dir, asyncio.Lock()):
+            await budget.acquire(size)
+            try:
+                await stage_inputs(files, stage_dir)
+                record = await loop.run_in_executor(worker.pool, run_job, worker.run, job_id, organism_name,
+                                                    dict(arguments, input_dir=stage_dir))
+            except Exception as e:
+                record = {"id": job_id, "organism": organism_name, "status": "failed", "error": repr(e)}
+            finally:
+                shutil.rmtree(stage_dir, ignore_errors=True)
+                await budget.release(size)
+        write(record)
+
+    async def limited(line, number):
+        try:
+            await process(line, number)
+        finally:
+            slots.release()
+
+    tasks = []
+    try:
+        number = 0
+        async for line in lines:
+            if line.strip():
+                # the next job is read only when a slot is free, so the jobs are staged in their order
+                await slots.acquire()
+                tasks.append(asyncio.ensure_future(limited(line, number)))
+            number += 1
+        await asyncio.gather(*tasks)
+    finally:
+        await loop.run_in_executor(None, worker.close)
+
+
+def serve_prefetch(run, pool_size=1, prefetch=1, memory_limit=PREFETCH_MEMORY, staging_dir=None,
+                   input_stream=sys.stdin, output_stream=sys.stdout):
+    """
+    Read the jobs (JSON lines) from stdin until its end and write the records of the finished jobs into stdout, the
+    input files of the next genomes are prefetched while the current ones are annotated
+    :param run: the pipeline run by the jobs
+    :param pool_size: the number of jobs run at once
+    :param prefetch: the number of genomes staged ahead of the running jobs
+    :param memory_limit: the memory (MB) of input files staged at once
+    :param staging_dir: the directory of the staged files
+    """
+    def write(record):
+        output_stream.write(json.dumps(record) + "\n")
+        output_stream.flush()
+
+    async def lines():
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await loop.run_in_executor(None, input_stream.readline)
+            if not line:
+                break
+            yield line
+
+    asyncio.run(run_prefetched(run, lines(), write, pool_size, prefetch, memory_limit, staging_dir))
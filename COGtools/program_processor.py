@@ -1,13 +1,69 @@
-from re import search, split
+import io
+from re import search, escape
+import numpy as np
 import pandas as pd
 from Bio import SeqIO
 import os
-import pkg_resources
 from Bio import Align
 import warnings
+try:
+    from COGtools.file_manager import open_file, read_gff, read_cogs, encode_attributes, attribute_field, \
+        atomic_open, write_table, ColumnBuffer, OPERON_COG_DTYPES
+    from COGtools.fasta_index import FastaIndex
+    from COGtools.score_cache import ScoreCache
+    from COGtools import reference
+    from COGtools.reference import check_engine
+except ImportError:
+    from file_manager import open_file, read_gff, read_cogs, encode_attributes, attribute_field, atomic_open, \
+        write_table, ColumnBuffer, OPERON_COG_DTYPES
+    from fasta_index import FastaIndex
+    from score_cache import ScoreCache
+    import reference
+    from reference import check_engine
+
+# columns of Batch CD-Search output (hitdata.txt, concise results)
+HITDATA_COLUMNS = ("query", "hit_type", "pssm_id", "from", "to", "evalue", "bitscore", "accession", "short_name",
+                   "incomplete", "superfamily")
+HITDATA_DTYPES = {"query": "object", "hit_type": "category", "pssm_id": "Int64", "from": "Int32", "to": "Int32",
+                  "evalue": "float64", "bitscore": "float64", "accession": "object", "short_name": "object",
+                  "incomplete": "category", "superfamily": "category"}
+# COGs replaced in COG 2021
+COG_UPDATES = {"COG3512": "COG1343"}
+
+
+def em_assignments(attributes, cogs_only=False):
+    """
+    Get the assignments of eggNOG-mapper from the attributes of its output file (decorated.gff)
+    :param attributes: the attribute column
+    :param cogs_only: neglect other orthologous groups than COGs
+    :return: table with columns ID, COG, CAT and desc of the features assigned in the bacterial group
+    """
+    attributes = pd.Series(attributes, dtype="object")
+    fields = pd.DataFrame({"ID": attribute_field(attributes, "ID"), "COG": None,
+                           "CAT": attribute_field(attributes, "em_COG_cat"),
+                           "desc": attribute_field(attributes, "em_desc")})
+    cogs = []
+    for attribute, where in zip(attributes.tolist(), attributes.str.find("Bacteria").tolist()):
+        # the orthologous group precedes its taxonomic level, e.g. COG0001@2|Bacteria
+        COG = attribute[where - 10: where - 3] if where >= 0 else None
+        if COG is not None and "COG" not in COG:
+            COG = None if cogs_only else attribute[where - 8: where - 3]
+        cogs.append(COG)
+    fields["COG"] = cogs
+    fields = fields.dropna(subset=["ID", "COG", "CAT"])
+    fields.loc[fields["CAT"] == "None", "CAT"] = "S"
+    return fields
+
+
+def accession_numbers(data, all_accessions=True):
+    """
+    the accession numbers in the header of processed files: all replicons, or the first one
+    """
+    return ", ".join(data["seqname"].astype(str).unique()) if all_accessions else str(data["seqname"].iloc[0])
 
 
-def em_processor(organism_name, em_file, gff_file, cogs_only=False, output_dir=os.getcwd()):
+def em_processor(organism_name, em_file, gff_file, cogs_only=False, output_dir=os.getcwd(), engine="fast",
+                 replicon_seqnames=True, all_accessions=True, full_desc=True):
     """
     Process the output file (decorated.gff) from eggNOG-mapper tool into more structured COGtools-data.
     The outputs of this function is file in gff format that contains a suitable header with information about CDSs with
@@ -18,65 +74,39 @@ def em_processor(organism_name, em_file, gff_file, cogs_only=False, output_dir=o
     :param cogs_only: include only COGs, orthologous groups from eggNOG will be considered as unknown
     :param cds_file: the path to eggNOG-mapper input file
     :param output_dir: the output directory
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0, the following options are not used)
+    :param replicon_seqnames: the seqname of CDSs is their replicon (chromosome, plasmid), otherwise the id of the CDS
+    :param all_accessions: the header lists all replicons, otherwise only the first one
+    :param full_desc: keep the whole description, otherwise it is cut at the first comma
     :return: processed file
     """
-    em_data = pd.read_csv(em_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
-                                                                              "end", "score", "strand", "frame",
-                                                                              "attribute"))
-    
-    gff_data = pd.read_csv(gff_file,comment="#", sep="\t",header=None,names=("seqname", "source", "type", "start",
-                                                                              "end", "score", "strand", "frame",
-                                                                              "attribute"))
-    
-    
-    for ind in gff_data.index:
-        attribute = gff_data["attribute"][ind]
-        seq_id = attribute[attribute.index("ID=")+3:attribute.index(";")]
-        start = gff_data["start"][ind]
-        end = gff_data["end"][ind]
-        strand = gff_data["strand"][ind]
-        
-        em_data.loc[em_data.seqname == seq_id, ["seqname", "strand", "start", "end"]] = \
-            [seq_id,strand,start,end]
-
-    for row in em_data.index:
-        # get only useful information about each CDS: feature_id, name, COG, COG category
-        attribute = em_data["attribute"][row]
-        try:
-            where = search(r'Bacteria', attribute).span(0)[0]
-            dic = {'COG': attribute[where - 10: where - 3]}
-            if "COG" in dic['COG']:
-                attribute = split(r"[=,;]", attribute)
-                dic['seq_id'] = attribute[attribute.index("ID") + 1][4:]
-                dic['cat'] = attribute[attribute.index("em_COG_cat") + 1]
-                dic['desc']= attribute[attribute.index("em_desc") + 1]
-            else:
-                if cogs_only:
-                    em_data = em_data.drop(row)
-                    continue
-                else:
-                    dic['COG'] = attribute[where-8:where-3]
-                    attribute = split(r"[=,;]", attribute)
-                    dic['seq_id'] = attribute[attribute.index("ID") + 1][4:]
-                    dic['cat'] = attribute[attribute.index("em_COG_cat") + 1]
-                    dic['desc'] = attribute[attribute.index("em_desc") + 1]
-        except:
-            # no bacteria group in annotation
-            em_data = em_data.drop(row)
-            continue
-
-        dic['cat'] = 'S' if dic['cat'] == 'None' else dic['cat']
-
-        em_data.loc[row, "attribute"] = "".join(["ID=", dic['seq_id'], ";COG=", dic['COG'], ";CAT=", dic['cat'],
-                                                 ";desc=", dic['desc']])
-
-    f = open(output_dir + '/em_' + organism_name + '.gff', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: ' + gff_data["seqname"][0] + "\n# Processed data from eggNOG-mapper\n")
-    f.close()
-    return em_data.to_csv(output_dir + '/em_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
-
-
-def em_processor_draft(organism_name, em_file, cogs_only=False, output_dir=os.getcwd()):
+    check_engine(engine)
+    if engine == "reference":
+        return reference.em_processor(organism_name, em_file, gff_file, cogs_only, output_dir)
+    # the locations are replaced by the locations of CDSs in the genome
+    em_data = read_gff(em_file, dtype={"seqname": "object", "strand": "object"})
+    gff_data = read_gff(gff_file)
+
+    gff_data["seq_id"] = attribute_field(gff_data["attribute"], "ID")
+    location = gff_data.drop_duplicates("seq_id", keep="last").set_index("seq_id")
+    located = em_data["seqname"].isin(location.index)
+    seq_ids = em_data.loc[located, "seqname"]
+    for column in ["seqname", "strand", "start", "end"] if replicon_seqnames else ["strand", "start", "end"]:
+        em_data.loc[located, column] = location.loc[seq_ids, column].values
+
+    # get only useful information about each CDS: feature_id, COG, COG category, description
+    fields = em_assignments(em_data["attribute"], cogs_only).dropna(subset=["desc"])
+    fields["ID"] = fields["ID"].str[4:]
+    if not full_desc:
+        fields["desc"] = fields["desc"].str.split(r"[=,]", n=1, regex=True).str[0]
+    em_data = em_data.loc[fields.index].assign(attribute=encode_attributes(fields))
+
+    return write_table(output_dir + '/em_' + organism_name + '.gff', em_data,
+                       ['created with COGtools 1.0.0', 'AC number: ' + accession_numbers(gff_data, all_accessions),
+                        'Processed data from eggNOG-mapper'])
+
+
+def em_processor_draft(organism_name, em_file, cogs_only=False, chunksize=None, output_dir=os.getcwd()):
     """
       Process the output file (decorated.gff) from eggNOG-mapper tool into more structured COGtools-data.
       The output of this function is file in txt format that contains a suitable header with assigned cogs
@@ -85,57 +115,25 @@ def em_processor_draft(organism_name, em_file, cogs_only=False, output_dir=os.ge
       :type cogs_only: bool
       :param em_file: the path to eggNOG-mapper output file
       :param cogs_only: neglect other orhologous groups than COGs
+      :param chunksize: the number of lines of eggNOG-mapper output file processed at once, the whole file if not given
       :param output_dir: the output directory
       :return: processed file
       """
-    # data needed: annotated file by eggNOG-mapper
-    em_data = pd.read_csv(em_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
-                                                                              "end", "score", "strand", "frame",
-                                                                              "attribute"))
-    # table for processed data
-    em_table = pd.DataFrame(columns=["protein_id","source","cog","cat"])
-
-    # cog categories in COG database
-    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
-    cat_data = (open(cogs_file, "r")).readlines()
-
-    for row in em_data.index:
-        # get only useful information about each CDS: feature_id, COG, COG category
-        attribute = em_data["attribute"][row]
-
-        try:
-            where = search(r'Bacteria', attribute).span(0)[0]
-            COG = attribute[where-10: where-3]
-            if "COG" in COG:
-                attribute = split(r"[=,;]", attribute)
-                seq_id = attribute[attribute.index("ID") + 1]
-                CAT = attribute[attribute.index("em_COG_cat") + 1]
-            else:
-                if cogs_only:
-                    continue
-                else:
-                    COG = attribute[where-8:where-3]
-                    attribute = split(r"[=,;]", attribute)
-                    seq_id = attribute[attribute.index("ID") + 1]
-                    CAT = attribute[attribute.index("em_COG_cat") + 1]
-
-        except AttributeError:
-            continue
-
-        CAT = 'S' if CAT == 'None' else CAT
+    with atomic_open(output_dir + '/em_' + organism_name + '.txt') as f:
+        f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# Processed data from eggNOG-mapper\n')
+        f.write('protein_id\tsource\tcog\tcat\n')
 
-        # save this info into the table
-        new_row = pd.DataFrame(
-            {"protein_id": [seq_id], "source": ["eggnog_mapper"], "cog": [COG], "cat": [CAT]})
-        em_table = pd.concat([em_table, new_row], ignore_index=True)
+        # data needed: annotated file by eggNOG-mapper, read in chunks if chunksize is given
+        chunks = [read_gff(em_file)] if chunksize is None else read_gff(em_file, chunksize=chunksize)
+        for em_data in chunks:
+            # get only useful information about each CDS: feature_id, COG, COG category
+            fields = em_assignments(em_data["attribute"], cogs_only)
+            em_table = pd.DataFrame({"protein_id": fields["ID"], "source": "eggnog_mapper", "cog": fields["COG"],
+                                     "cat": fields["CAT"]})
+            em_table.to_csv(f, sep='\t', index=False, header=False)
 
-    f = open(output_dir + '/em_' + organism_name + '.txt', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# Processed data from eggNOG-mapper\n')
-    f.close()
-    return em_table.to_csv(output_dir + '/em_' + organism_name + '.txt', sep='\t', index=False, mode='a')
 
-
-def om_processor(organism_name, orf_file, cog_file, output_dir=os.getcwd()):
+def om_processor(organism_name, orf_file, cog_file, output_dir=os.getcwd(), engine="fast", all_accessions=True):
     """
     Process the outputs files (ORF_coordinates.txt and predicted_COGs.txt) from Operon-mapper into more structured COGtools-data.
     The outputs of this function is file in gff format that contains a suitable header with information about all
@@ -144,35 +142,38 @@ def om_processor(organism_name, orf_file, cog_file, output_dir=os.getcwd()):
     :param orf_file: the path to Operon-mapper outputs file ORFs_coordinates.txt
     :param cog_file: the path to Operon-mapper outputs file predicted_COGs.txt
     :param output_dir: the output directory
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0, all_accessions is not used)
+    :param all_accessions: the header lists all replicons, otherwise only the first one
     :return: processed file
     """
-    orf_data = pd.read_csv(orf_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
-                                                                                "end", "score", "strand", "frame",
-                                                                                "attribute"))
-    cog_data = pd.read_csv(cog_file, sep="\t", header=None, comment="#", names=("ID", "COG", "category"))
-
-    for row in orf_data.index:
-        # iterate through all features in ORF file and save the relevant information from the COG file
-        attribute = split(r"[=,;]", orf_data["attribute"][row])
-        feature_id = attribute[attribute.index("ID") + 1]
-        try:
-            cog = cog_data.loc[cog_data["ID"] == feature_id, "COG"].values[0]
-            CATS = cog_data.loc[cog_data["ID"] == feature_id, "category"].values[0]
-            CAT = search('\w+', CATS).group(0)
-            dic = {'cat': CAT, 'desc': cog_data.loc[cog_data["ID"] == feature_id, "category"].values[0].split("] ")[1]}
-
-            orf_data.loc[row, "attribute"] = "".join(
-                ["ID=", feature_id, ";COG=", cog, ";CAT=", dic['cat'], ";desc=", dic['desc']])
-
-        except:
-            orf_data.loc[row, "attribute"] = "".join(["ID=", feature_id, ";COG=", "-", ";CAT=", "-", ";desc=", "-"])
-
-    f = open(output_dir + '/om_' + organism_name + '.gff', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: ' + orf_data["seqname"][0] +
-            "\n# Processed data from Operon-mapper\n")
-    f.close()
-    return orf_data.to_csv(output_dir + '/om_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
-    # return orf_data.to_csv(output_dir + '/om_' + organism_name + '.gff', sep='\t', index=False)
+    check_engine(engine)
+    if engine == "reference":
+        return reference.om_processor(organism_name, orf_file, cog_file, output_dir)
+    orf_data = read_gff(orf_file)
+    cog_data = pd.read_csv(cog_file, sep="\t", header=None, comment="#", names=("ID", "COG", "category"),
+                           dtype=OPERON_COG_DTYPES)
+
+    # the first assignment of every feature in the COG file, features without it are unknown
+    assignments = {}
+    for feature_id, cog, CATS in zip(cog_data["ID"].tolist(), cog_data["COG"].tolist(),
+                                     cog_data["category"].tolist()):
+        if feature_id in assignments:
+            continue
+        CAT = search(r'\w+', CATS) if isinstance(CATS, str) else None
+        if isinstance(cog, str) and CAT is not None and "] " in CATS:
+            assignments[feature_id] = (cog, CAT.group(0), CATS.split("] ")[1])
+        else:
+            assignments[feature_id] = ("-", "-", "-")
+
+    feature_ids = attribute_field(orf_data["attribute"], "ID")
+    fields = pd.DataFrame([assignments.get(feature_id, ("-", "-", "-")) for feature_id in feature_ids],
+                          columns=["COG", "CAT", "desc"], index=orf_data.index)
+    fields.insert(0, "ID", feature_ids)
+    orf_data["attribute"] = encode_attributes(fields)
+
+    return write_table(output_dir + '/om_' + organism_name + '.gff', orf_data,
+                       ['created with COGtools 1.0.0', 'AC number: ' + accession_numbers(orf_data, all_accessions),
+                        'Processed data from Operon-mapper'])
 
 
 def batch_splitter(organism_name, gene_file, output_dir=os.getcwd()):
@@ -182,7 +183,8 @@ def batch_splitter(organism_name, gene_file, output_dir=os.getcwd()):
     :param output_dir: the output directory
     :return: two split files
     """
-    records = list(SeqIO.parse(gene_file, "fasta"))
+    with open_file(gene_file) as handle:
+        records = list(SeqIO.parse(handle, "fasta"))
     if len(records) > 1000:
         num_of_parts = int(len(records) / 1000) + (len(records) % 1000 > 0)
         start = 0
@@ -200,18 +202,88 @@ def batch_merger(organism_name, files, output_dir=os.getcwd()):
     :param output_dir: the output directory
     :return: a merged file
     """
-    data1 = open(files[0]).read()
-    data1 = data1[data1.index("Q#"):len(data1)]
-    for i in range(1, len(files)):
-        data = open(files[i]).read()
-        data = data[data.index("Q#"):len(data)]
-        data1 += data
+    with atomic_open(output_dir + "/" + organism_name + "_merged_hitdata.txt") as file:
+        for hitdata_file in files:
+            with open_file(hitdata_file) as handle:
+                data = handle.read()
+            file.write(data[data.index("Q#"):])
 
-    with open(output_dir + "/" + organism_name + "_merged_hitdata.txt", "w") as file:
-        file.write(data1)
 
+def read_hitdata(batch_file):
+    """
+    Read the output file (hitdata.txt) from Batch CD-Search into a typed table, files merged by batch_merger
+    are accepted as well
+    :param batch_file: the path to Batch CD-Search output file (optionally gzip-compressed)
+    :return: table of hits with columns of HITDATA_COLUMNS, protein (the id of the query protein) and run (number
+    of the query, consecutive hits of the same query share it)
+    """
+    with open_file(batch_file) as handle:
+        batch_data = handle.read()
+    hits = pd.read_csv(io.StringIO(batch_data[batch_data.index("Q#"):]), sep="\t", header=None,
+                       names=HITDATA_COLUMNS, dtype=HITDATA_DTYPES, usecols=range(len(HITDATA_COLUMNS)))
+    hits["protein"] = hits["query"].str.extract(r">(\S+)", expand=False)
+    # the parts of merged files are numbered from Q#1 again, so the queries are told apart by consecutive runs
+    hits["run"] = (hits["query"] != hits["query"].shift()).cumsum()
+    return hits
 
-def batch_processor(organism_name, batch_file, gff_file, output_dir=os.getcwd()):
+
+def best_hits(hits, hit_rule="best"):
+    """
+    Choose the COG assigned to every query with a specific hit
+    :param hits: table of hits from read_hitdata
+    :param hit_rule: "best" - the specific COG hit with the lowest E-value (the highest bitscore if E-values are
+    equal), "first" - the first specific hit, the query is not assigned if this hit is not a COG
+    :return: table with columns protein, COG (missing if not assigned) and CAT in the order of queries
+    """
+    if hit_rule not in ("best", "first"):
+        raise ValueError("Unknown rule of hit selection: " + str(hit_rule))
+    specific = hits.loc[hits["hit_type"] == "specific", ["run", "protein", "accession", "evalue", "bitscore"]]
+    specific = specific.assign(COG=specific["accession"].str.extract(r"(COG\d+)", expand=False).replace(COG_UPDATES))
+    queries = specific.drop_duplicates("run")[["run", "protein"]]
+    if hit_rule == "best":
+        chosen = specific.dropna(subset=["COG"]).sort_values(["run", "evalue", "bitscore"],
+                                                             ascending=[True, True, False],
+                                                             kind="mergesort").drop_duplicates("run")
+    else:
+        chosen = queries.merge(specific.drop_duplicates("run")[["run", "COG"]], on="run")
+    chosen = queries.merge(chosen[["run", "COG"]], on="run", how="left")
+    cogs_data = read_cogs()
+    chosen["CAT"] = [cogs_data.get(COG, "-") if isinstance(COG, str) else "-" for COG in chosen["COG"].tolist()]
+    return chosen[["protein", "COG", "CAT"]]
+
+
+def locate_proteins(gff_data, protein_ids):
+    """
+    Get the locations of proteins in the gff file, the protein is the first feature whose attribute contains
+    the id of the protein followed by semicolon, e.g. ID=cds-WP_000001.1;
+    :param gff_data: table of features
+    :param protein_ids: ids of the proteins
+    :return: positions of the features in the table in the order of protein_ids
+    """
+    attributes = gff_data["attribute"].tolist()
+    locations = {}
+    for position, attribute in enumerate(attributes):
+        for segment in attribute.split(";")[:-1]:
+            value = segment.split("=", 1)[-1]
+            # values with prefix of the feature type, e.g. cds-WP_000001.1
+            for key in (value, value.split("-", 1)[-1]):
+                locations.setdefault(key, position)
+
+    positions = []
+    for protein_id in protein_ids:
+        position = locations.get(protein_id)
+        if position is None:
+            matches = np.flatnonzero(gff_data["attribute"].str.contains(escape(protein_id) + ";").to_numpy())
+            if len(matches) == 0:
+                raise ValueError("The protein " + protein_id + " annotated by Batch CD-Search is missing in the gff "
+                                 "file.")
+            position = matches[0]
+        positions.append(position)
+    return positions
+
+
+def batch_processor(organism_name, batch_file, gff_file, output_dir=os.getcwd(), hit_rule="best", engine="fast",
+                    replicon_seqnames=True, all_accessions=True):
     """
     Process the outputs file (hitdata.txt) from Batch CD-Search tool into more structured COGtools-data.
     The outputs of this function is file in gff format that contains a suitable header with information about CDSs with
@@ -219,67 +291,38 @@ def batch_processor(organism_name, batch_file, gff_file, output_dir=os.getcwd())
     :type organism_name: str
     :param batch_file: the path to Batch CD-Search outputs file hitdata.txt
     :param output_dir: the output file
+    :param hit_rule: the choice of COG of every query, "best" (by E-value and bitscore) or "first" (the first
+    specific hit)
+    :param engine: "fast" or "reference" (the implementation of COGtools 1.0.0 taking the first hit, the following
+    options are not used)
+    :param replicon_seqnames: the seqname of CDSs is their replicon (chromosome, plasmid), otherwise the id of the
+    protein
+    :param all_accessions: the header lists all replicons, otherwise only the first one
     :return: processed file
     """
-
-    # create new DataFrame to store the necessary information
-    batch_gff = pd.DataFrame(
-        columns=["seqname", "source", "type", "start", "end", "score", "strand", "frame", "attribute"])
-    batch_data = (open(batch_file).read())
-    batch_data = (batch_data[batch_data.index("Q#"):len(batch_data) - 1]).split('\n')
-    query = ''
-    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
-    cogs_data = (open(cogs_file, "r")).readlines()
-
-    gff_data = pd.read_csv(gff_file,comment="#", sep="\t",header=None,names=("seqname", "source", "type", "start",
-                                                                              "end", "score", "strand", "frame",
-                                                                              "attribute"))
-    # iterate through queries
-    for row in batch_data:
-        new_query = search('Q#\d+', row).group(0)
-
-        # if COG is not assigned or new_line is duplicate, continue to next iteration
-        if not ('\tspecific\t' in row) or query == new_query:
-            continue
-
-        query = new_query
-        seq_id = row[row.index(">") + 1:row.index("\t")]
-        id = row[row.index(">") + 1:row.index("\t")]
-        id = "".join(["ID=", id])
-        correct_row = gff_data.loc[gff_data.attribute.str.contains("("  + seq_id + ");"), :]
-        start = correct_row["start"].values[0]
-        end = correct_row["end"].values[0]
-        strand = correct_row["strand"].values[0]
-        try:
-            COG = "".join(["COG=", search("(COG\d+)", row).group(1)])
-
-        except AttributeError:
-            continue
-        
-        # update in COG 2021
-        if COG == "COG=COG3512":
-            COG = "COG=COG1343"
-
-        # adding categories
-        index = [i for i, s in enumerate(cogs_data) if COG[4:] in s][0]
-        CAT = search('\t\w+', cogs_data[index]).group(0)[1:]
-        CAT = "".join(["CAT=", CAT])
-
-        attribute = id + ";" + COG + ";" + CAT + ";"
-        new_row = pd.DataFrame(
-            {"seqname": [seq_id], "source": ["batch-cd-search"], "type": ["CDS"], "start": [start], "end": [end],
-             "score": ["."], "strand": [strand], "frame": ["0"], "attribute": [attribute]})
-
-        batch_gff = pd.concat([batch_gff, new_row], ignore_index=True)
-
-    f = open(output_dir + '/batch_' + organism_name + '.gff', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: ' + gff_data["seqname"][0] +
-            "\n# Processed data from Batch CD-Search\n")
-    f.close()
-    return batch_gff.to_csv(output_dir + '/batch_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
-
-
-def om_processor_draft(organism_name, proteins, operon_proteins, operon_cogs, gff_included=True, output_dir=os.getcwd()):
+    check_engine(engine)
+    if engine == "reference":
+        return reference.batch_processor(organism_name, batch_file, gff_file, output_dir)
+    gff_data = read_gff(gff_file)
+    # only the queries with COG assigned
+    chosen = best_hits(read_hitdata(batch_file), hit_rule).dropna(subset=["COG"]).reset_index(drop=True)
+    location = gff_data.iloc[locate_proteins(gff_data, chosen["protein"].tolist())].reset_index(drop=True)
+
+    batch_gff = pd.DataFrame({"seqname": location["seqname"] if replicon_seqnames else chosen["protein"],
+                              "source": "batch-cd-search", "type": "CDS",
+                              "start": location["start"], "end": location["end"], "score": ".",
+                              "strand": location["strand"], "frame": "0",
+                              "attribute": encode_attributes(chosen.rename(columns={"protein": "ID"}))},
+                             columns=["seqname", "source", "type", "start", "end", "score", "strand", "frame",
+                                      "attribute"])
+
+    return write_table(output_dir + '/batch_' + organism_name + '.gff', batch_gff,
+                       ['created with COGtools 1.0.0', 'AC number: ' + accession_numbers(gff_data, all_accessions),
+                        'Processed data from Batch CD-Search'])
+
+
+def om_processor_draft(organism_name, proteins, operon_proteins, operon_cogs, gff_included=True, output_dir=os.getcwd(),
+                       score_cache=None):
     """
     Process the outputs files (predicted_protein_sequences.txt and predicted_COGs.txt) from Operon-mapper into more
     structured COGtools-data. The output of this function is a file in txt format that contains a suitable header with
@@ -291,80 +334,90 @@ def om_processor_draft(organism_name, proteins, operon_proteins, operon_cogs, gf
     :param operon_cogs: the path to Operon-mapper output file predicted_COGs.txt
     :param gff_included: a gff file was used in the Operon-mapper
     :param output_dir: the output directory
+    :param score_cache: the path to the cache of alignment scores kept between runs (SQLite), no cache if not given
     :return: processed file
     """
     # data needed: downloaded proteins, proteins predicted by Operon-mapper, COGs prediction by Operon-mapper
-    proteins = list(SeqIO.parse(proteins, "fasta"))
-    operon_proteins = list(SeqIO.parse(operon_proteins, "fasta"))
-    cog_data = pd.read_csv(operon_cogs, sep="\t", header=None, comment="#", names=("ID", "COG", "category"))
-    sequences = [i.seq for i in proteins]
+    # the sequences are read lazily using the index stored next to the fasta files
+    proteins = FastaIndex(proteins)
+    operon_proteins = FastaIndex(operon_proteins)
+    cog_data = pd.read_csv(operon_cogs, sep="\t", header=None, comment="#", names=("ID", "COG", "category"),
+                           dtype=OPERON_COG_DTYPES)
+    sequences = proteins
 
     # table for saving processed data
-    operon_table = pd.DataFrame(columns=["protein_id", "source", "cog", "cat"])
+    operon_table = ColumnBuffer(["protein_id", "source", "cog", "cat"])
 
+    scores = None
     if gff_included is False:
         #
         warnings.warn('The analyzed loci do not match and will be evaluated based on sequence alignment')
         aligner = Align.PairwiseAligner(mode='local')
-
-    last_index = -1
-    # iterate through all downloaded proteins
-    for i in range(len(sequences)):
-        found = False
-        my_protein = sequences[i]
-
-        # search for similar protein predicted by Operon-mapper
-        for j in range(1, 10):
-            if last_index+j < len(operon_proteins):
-                protein_operon = operon_proteins[last_index+j].seq[:-1]
-
-                if gff_included:
-                    if my_protein == protein_operon:
-                        found = True
-
-                else:
-                    # calculate alignment score
-                    score = aligner.score(my_protein, protein_operon)
-
-                    lengthDownloaded = len(my_protein)
-                    lengthOperon = len(protein_operon)
-
-                    # if proteins are almost identical
-                    if score/min(lengthDownloaded, lengthOperon) > 0.90:
-                        found = True
-
-                if found:
-                    # get necessary info - id, cog, category
-                    id_operon = operon_proteins[last_index+j].id
-                    id_downloaded = proteins[i].id
-
-                    # if cog was assigned
-                    try:
-                        cog = cog_data.loc[cog_data["ID"] == id_operon, "COG"].values[0]
-                        CATS = cog_data.loc[cog_data["ID"] == id_operon, "category"].values[0]
-                        CAT = search('\w+', CATS).group(0)
-                    # else assign "-"
-                    except:
-                        cog = "-"
-                        CAT = "-"
-
-                    # save this info into the table
-                    new_row = pd.DataFrame(
-                        {"protein_id": [id_downloaded], "source": ["operon_mapper"], "cog": [cog], "cat": [CAT]})
-                    operon_table = pd.concat([operon_table, new_row], ignore_index=True)
-                    break
-
-        # if similar protein was found, save his position to continue were we left off
-        if found:
-            last_index = last_index + j
-
-    f = open(output_dir + '/om_' + organism_name + '.txt', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# Processed data from Operon-mapper\n')
-    f.close()
-    return operon_table.to_csv(output_dir + '/om_' + organism_name + '.txt', sep='\t', index=False, mode = 'a')
-
-
-def batch_processor_draft(organism_name, batch_file, output_dir=os.getcwd()):
+        if score_cache is not None:
+            scores = ScoreCache(score_cache)
+
+    try:
+        last_index = -1
+        # iterate through all downloaded proteins
+        for i in range(len(sequences)):
+            found = False
+            my_protein = sequences[i]
+
+            # search for similar protein predicted by Operon-mapper
+            for j in range(1, 10):
+                if last_index+j < len(operon_proteins):
+                    protein_operon = operon_proteins[last_index+j][:-1]
+
+                    if gff_included:
+                        if my_protein == protein_operon:
+                            found = True
+
+                    else:
+                        # calculate alignment score
+                        score = aligner.score(my_protein, protein_operon) if scores is None else \
+                            scores.score(aligner, my_protein, protein_operon)
+
+                        lengthDownloaded = len(my_protein)
+                        lengthOperon = len(protein_operon)
+
+                        # if proteins are almost identical
+                        if score/min(lengthDownloaded, lengthOperon) > 0.90:
+                            found = True
+
+                    if found:
+                        # get necessary info - id, cog, category
+                        id_operon = operon_proteins.ids[last_index+j]
+                        id_downloaded = proteins.ids[i]
+
+                        # if cog was assigned
+                        try:
+                            cog = cog_data.loc[cog_data["ID"] == id_operon, "COG"].values[0]
+                            CATS = cog_data.loc[cog_data["ID"] == id_operon, "category"].values[0]
+                            CAT = search('\w+', CATS).group(0)
+                        # else assign "-"
+                        except:
+                            cog = "-"
+                            CAT = "-"
+
+                        # save this info into the table
+                        operon_table.append(id_downloaded, "operon_mapper", cog, CAT)
+                        break
+
+            # if similar protein was found, save his position to continue were we left off
+            if found:
+                last_index = last_index + j
+    finally:
+        proteins.close()
+        operon_proteins.close()
+        # the scores computed until an interruption are kept as well
+        if scores is not None:
+            scores.close()
+
+    return write_table(output_dir + '/om_' + organism_name + '.txt', operon_table,
+                       ['created with COGtools 1.0.0', 'AC number: unknown', 'Processed data from Operon-mapper'])
+
+
+def batch_processor_draft(organism_name, batch_file, output_dir=os.getcwd(), hit_rule="best"):
     """
     Processes the outputs file (hitdata.txt) from Batch CD-Search tool into more structured COGtools-data.
     The output of this function is file in txt format that contains a suitable header with assigned COGs and their
@@ -372,50 +425,14 @@ def batch_processor_draft(organism_name, batch_file, output_dir=os.getcwd()):
     :type organism_name: str
     :param batch_file: the path to Batch CD-Search outputs file hitdata.txt
     :param output_dir: the output file
+    :param hit_rule: the choice of COG of every query, "best" (by E-value and bitscore) or "first" (the first
+    specific hit, as COGtools 1.0.0 does)
     :return: processed file
     """
-    # table for processed data
-    batch_table = pd.DataFrame(columns=["protein_id", "source", "cog", "cat"])
-
-    # data needed: annotated file by Batch CD-Search
-    batch_data = (open(batch_file).read())
-    batch_data = (batch_data[batch_data.index("Q#"):len(batch_data) - 1]).split('\n')
-    query = ''
-
-    # cog categories in COG database
-    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
-    cogs_data = (open(cogs_file, "r")).readlines()
-
-    # iterate through queries
-    for row in batch_data:
-        new_query = search('Q#\d+', row).group(0)
-
-        # if COG is not assigned or new_line is duplicate, continue to next iteration
-        if not ('\tspecific\t' in row) or query == new_query:
-            continue
-
-        query = new_query
-        seq_id = row[row.index(">") + 1:row.index(".")+2]
-
-        try:
-            COG = search("(COG\d+)", row).group(1)
-
-        except AttributeError:
-            COG = "-"
-
-        # update in COG 2021
-        if COG == "COG3512":
-            COG = "COG1343"
-
-        index = [i for i, s in enumerate(cogs_data) if COG[4:] in s][0]
-        CAT = search('\t\w+', cogs_data[index]).group(0)[1:]
-
-        # save this info into the table
-        new_row = pd.DataFrame(
-            {"protein_id": [seq_id], "source": ["batch cd-search"], "cog": [COG], "cat": [CAT]})
-        batch_table = pd.concat([batch_table, new_row], ignore_index=True)
+    # data needed: annotated file by Batch CD-Search, the queries without COG are unknown
+    chosen = best_hits(read_hitdata(batch_file), hit_rule)
+    batch_table = pd.DataFrame({"protein_id": chosen["protein"], "source": "batch cd-search",
+                                "cog": chosen["COG"].fillna("-"), "cat": chosen["CAT"]})
 
-    f = open(output_dir + '/batch_' + organism_name + '.txt', 'w')
-    f.write('# created with COGtools 1.0.0\n# AC number: unknown\n# Processed data from Batch CD-Search\n')
-    f.close()
-    return batch_table.to_csv(output_dir + '/batch_' + organism_name + '.txt', sep='\t', index=False, mode='a')
+    return write_table(output_dir + '/batch_' + organism_name + '.txt', batch_table,
+                       ['created with COGtools 1.0.0', 'AC number: unknown', 'Processed data from Batch CD-Search'])
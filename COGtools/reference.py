@@ -0,0 +1,360 @@
+# the implementations of COGtools 1.0.0 kept as the reference for the optimized ones (engine="reference"), their
+# outputs are the golden outputs the optimized implementations are compared with
+from re import search, split
+from random import randint
+import os
+import pandas as pd
+import pkg_resources
+
+ENGINES = ("fast", "reference")
+
+
+def check_engine(engine):
+    """
+    raise ValueError if the engine is not known
+    """
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine: " + str(engine) + ", use one of " + ", ".join(ENGINES))
+
+
+def em_processor(organism_name, em_file, gff_file, cogs_only=False, output_dir=os.getcwd()):
+    """
+    Process the output file (decorated.gff) from eggNOG-mapper tool into more structured COGtools-data.
+    The outputs of this function is file in gff format that contains a suitable header with information about CDSs with
+    assigned COG by eggNOG-mapper
+    :type organism_name: str
+    :type cogs_only: bool
+    :param em_file: the path to eggNOG-mapper output file
+    :param cogs_only: include only COGs, orthologous groups from eggNOG will be considered as unknown
+    :param cds_file: the path to eggNOG-mapper input file
+    :param output_dir: the output directory
+    :return: processed file
+    """
+    em_data = pd.read_csv(em_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
+                                                                              "end", "score", "strand", "frame",
+                                                                              "attribute"))
+    
+    gff_data = pd.read_csv(gff_file,comment="#", sep="\t",header=None,names=("seqname", "source", "type", "start",
+                                                                              "end", "score", "strand", "frame",
+                                                                              "attribute"))
+    
+    
+    for ind in gff_data.index:
+        attribute = gff_data["attribute"][ind]
+        seq_id = attribute[attribute.index("ID=")+3:attribute.index(";")]
+        start = gff_data["start"][ind]
+        end = gff_data["end"][ind]
+        strand = gff_data["strand"][ind]
+        
+        em_data.loc[em_data.seqname == seq_id, ["seqname", "strand", "start", "end"]] = \
+            [seq_id,strand,start,end]
+
+    for row in em_data.index:
+        # get only useful information about each CDS: feature_id, name, COG, COG category
+        attribute = em_data["attribute"][row]
+        try:
+            where = search(r'Bacteria', attribute).span(0)[0]
+            dic = {'COG': attribute[where - 10: where - 3]}
+            if "COG" in dic['COG']:
+                attribute = split(r"[=,;]", attribute)
+                dic['seq_id'] = attribute[attribute.index("ID") + 1][4:]
+                dic['cat'] = attribute[attribute.index("em_COG_cat") + 1]
+                dic['desc']= attribute[attribute.index("em_desc") + 1]
+            else:
+                if cogs_only:
+                    em_data = em_data.drop(row)
+                    continue
+                else:
+                    dic['COG'] = attribute[where-8:where-3]
+                    attribute = split(r"[=,;]", attribute)
+                    dic['seq_id'] = attribute[attribute.index("ID") + 1][4:]
+                    dic['cat'] = attribute[attribute.index("em_COG_cat") + 1]
+                    dic['desc'] = attribute[attribute.index("em_desc") + 1]
+        except:
+            # no bacteria group in annotation
+            em_data = em_data.drop(row)
+            continue
+
+        dic['cat'] = 'S' if dic['cat'] == 'None' else dic['cat']
+
+        em_data.loc[row, "attribute"] = "".join(["ID=", dic['seq_id'], ";COG=", dic['COG'], ";CAT=", dic['cat'],
+                                                 ";desc=", dic['desc']])
+
+    f = open(output_dir + '/em_' + organism_name + '.gff', 'w')
+    f.write('# created with COGtools 1.0.0\n# AC number: ' + gff_data["seqname"][0] + "\n# Processed data from eggNOG-mapper\n")
+    f.close()
+    return em_data.to_csv(output_dir + '/em_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
+
+
+def om_processor(organism_name, orf_file, cog_file, output_dir=os.getcwd()):
+    """
+    Process the outputs files (ORF_coordinates.txt and predicted_COGs.txt) from Operon-mapper into more structured COGtools-data.
+    The outputs of this function is file in gff format that contains a suitable header with information about all
+    predicted features
+    :type organism_name: str
+    :param orf_file: the path to Operon-mapper outputs file ORFs_coordinates.txt
+    :param cog_file: the path to Operon-mapper outputs file predicted_COGs.txt
+    :param output_dir: the output directory
+    :return: processed file
+    """
+    orf_data = pd.read_csv(orf_file, sep="\t", header=None, comment="#", names=("seqname", "source", "type", "start",
+                                                                                "end", "score", "strand", "frame",
+                                                                                "attribute"))
+    cog_data = pd.read_csv(cog_file, sep="\t", header=None, comment="#", names=("ID", "COG", "category"))
+
+    for row in orf_data.index:
+        # iterate through all features in ORF file and save the relevant information from the COG file
+        attribute = split(r"[=,;]", orf_data["attribute"][row])
+        feature_id = attribute[attribute.index("ID") + 1]
+        try:
+            cog = cog_data.loc[cog_data["ID"] == feature_id, "COG"].values[0]
+            CATS = cog_data.loc[cog_data["ID"] == feature_id, "category"].values[0]
+            CAT = search('\w+', CATS).group(0)
+            dic = {'cat': CAT, 'desc': cog_data.loc[cog_data["ID"] == feature_id, "category"].values[0].split("] ")[1]}
+
+            orf_data.loc[row, "attribute"] = "".join(
+                ["ID=", feature_id, ";COG=", cog, ";CAT=", dic['cat'], ";desc=", dic['desc']])
+
+        except:
+            orf_data.loc[row, "attribute"] = "".join(["ID=", feature_id, ";COG=", "-", ";CAT=", "-", ";desc=", "-"])
+
+    f = open(output_dir + '/om_' + organism_name + '.gff', 'w')
+    f.write('# created with COGtools 1.0.0\n# AC number: ' + orf_data["seqname"][0] +
+            "\n# Processed data from Operon-mapper\n")
+    f.close()
+    return orf_data.to_csv(output_dir + '/om_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
+    # return orf_data.to_csv(output_dir + '/om_' + organism_name + '.gff', sep='\t', index=False)
+
+
+def batch_processor(organism_name, batch_file, gff_file, output_dir=os.getcwd()):
+    """
+    Process the outputs file (hitdata.txt) from Batch CD-Search tool into more structured COGtools-data.
+    The outputs of this function is file in gff format that contains a suitable header with information about CDSs with
+    assigned COG by Batch CD-Search
+    :type organism_name: str
+    :param batch_file: the path to Batch CD-Search outputs file hitdata.txt
+    :param output_dir: the output file
+    :return: processed file
+    """
+
+    # create new DataFrame to store the necessary information
+    batch_gff = pd.DataFrame(
+        columns=["seqname", "source", "type", "start", "end", "score", "strand", "frame", "attribute"])
+    batch_data = (open(batch_file).read())
+    batch_data = (batch_data[batch_data.index("Q#"):len(batch_data) - 1]).split('\n')
+    query = ''
+    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
+    cogs_data = (open(cogs_file, "r")).readlines()
+
+    gff_data = pd.read_csv(gff_file,comment="#", sep="\t",header=None,names=("seqname", "source", "type", "start",
+                                                                              "end", "score", "strand", "frame",
+                                                                              "attribute"))
+    # iterate through queries
+    for row in batch_data:
+        new_query = search('Q#\d+', row).group(0)
+
+        # if COG is not assigned or new_line is duplicate, continue to next iteration
+        if not ('\tspecific\t' in row) or query == new_query:
+            continue
+
+        query = new_query
+        seq_id = row[row.index(">") + 1:row.index("\t")]
+        id = row[row.index(">") + 1:row.index("\t")]
+        id = "".join(["ID=", id])
+        correct_row = gff_data.loc[gff_data.attribute.str.contains("("  + seq_id + ");"), :]
+        start = correct_row["start"].values[0]
+        end = correct_row["end"].values[0]
+        strand = correct_row["strand"].values[0]
+        try:
+            COG = "".join(["COG=", search("(COG\d+)", row).group(1)])
+
+        except AttributeError:
+            continue
+        
+        # update in COG 2021
+        if COG == "COG=COG3512":
+            COG = "COG=COG1343"
+
+        # adding categories
+        index = [i for i, s in enumerate(cogs_data) if COG[4:] in s][0]
+        CAT = search('\t\w+', cogs_data[index]).group(0)[1:]
+        CAT = "".join(["CAT=", CAT])
+
+        attribute = id + ";" + COG + ";" + CAT + ";"
+        new_row = pd.DataFrame(
+            {"seqname": [seq_id], "source": ["batch-cd-search"], "type": ["CDS"], "start": [start], "end": [end],
+             "score": ["."], "strand": [strand], "frame": ["0"], "attribute": [attribute]})
+
+        batch_gff = pd.concat([batch_gff, new_row], ignore_index=True)
+
+    f = open(output_dir + '/batch_' + organism_name + '.gff', 'w')
+    f.write('# created with COGtools 1.0.0\n# AC number: ' + gff_data["seqname"][0] +
+            "\n# Processed data from Batch CD-Search\n")
+    f.close()
+    return batch_gff.to_csv(output_dir + '/batch_' + organism_name + '.gff', sep='\t', index=False, mode = "a")
+
+
+def read_file(file):
+    """
+    read processed file and get only location of feature and assigned COG
+    """
+    data = pd.read_csv(file, sep='\t', comment='#')
+    new_data = data[["start", "end"]]
+    new_data.insert(2, "COG", [search('COG=(.*);CAT', og).group(1) for og in data["attribute"]], True)
+    new_data['start'] = new_data['start'].apply(str)
+    new_data['end'] = new_data['end'].apply(str) 
+    return [data, new_data]
+
+
+def categories_choice(df, cat_choice=1):
+    # categories choice
+    if cat_choice == 1:
+        df['attribute'] = df['attribute'].apply(
+            lambda x: x.replace(search('CAT=(.*);', x).group(0), "CAT=" + search('CAT=(.*);', x).group(0)[4] + ";")
+            if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+    elif cat_choice == 2:
+        df['attribute'] = df['attribute'].apply(
+            lambda x: x.replace(search('CAT=(.*);', x).group(0), "CAT=" + search('CAT=(.*);', x).group(0)
+                                [randint(0, len(search('CAT=(.*);', x).group(1)) - 1)] + ";")
+            if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+    else:
+        cat_dic = {"-": 0, "J": 0, "A": 0, "K": 0, "L": 0, "B": 0, "D": 0, "Y": 0, "V": 0, "T": 0, "M": 0, "N": 0,
+                   "Z": 0, "W": 0, "U": 0, "O": 0, "X": 0, "C": 0, "G": 0, "E": 0, "F": 0, "H": 0, "I": 0, "P": 0,
+                   "Q": 0, "R": 0, "S": 0}
+
+        for row in df.index:
+            # get only useful information about each CDS: feature_id, name, COG, COG category
+            type = df["type"][row]
+            if type == "CDS":
+                attribute = split(r"[=,;]", df["attribute"][row])
+                if len(attribute[5]) == 1:
+                    cat_dic[attribute[5]] = cat_dic[attribute[5]] + 1
+                else:
+                    for i in range(len(attribute[5])):
+                        cat_dic[attribute[5][i]] = cat_dic[attribute[5][i]] + 1
+
+        if cat_choice == 3:
+            df['attribute'] = df['attribute'].apply(
+                lambda x: x.replace(
+                    search('CAT=(.*);', x).group(0), "CAT=" + max(
+                        {search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
+                         for i in range(len(search('CAT=(.*);', x).group(1)))},
+                        key={search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
+                             for i in range(len(search('CAT=(.*);', x).group(1)))}.get) + ";")
+                if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+
+        elif cat_choice == 4:
+            df['attribute'] = df['attribute'].apply(
+                lambda x: x.replace(
+                    search('CAT=(.*);', x).group(0), "CAT=" + min(
+                        {search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
+                         for i in range(len(search('CAT=(.*);', x).group(1)))},
+                        key={search('CAT=(.*);', x).group(1)[i]: cat_dic[search('CAT=(.*);', x).group(1)[i]]
+                             for i in range(len(search('CAT=(.*);', x).group(1)))}.get) + ";")
+                if len(search('CAT=(.*);', x).group(1)) > 1 else x)
+    return df
+
+
+def create_consensus(em_file, om_file, batch_file):
+    # read eggnog_mapper file
+    [em_data, new_em_data] = read_file(em_file)
+    # read operon_mapper file
+    [om_data, new_om_data] = read_file(om_file)
+    # read batch cd search file
+    [batch_data, new_batch_data] = read_file(batch_file)
+
+    # merge the three dataframes to save all predicted features into one dataframe
+    # cog_x = eggnog-mapper #cog_y = operon-operon-mapper #cog = batch cd-search
+    new_df = pd.merge(new_em_data, new_om_data, on="start", how="outer")
+    #new_df = pd.concat([new_em_data, new_om_data], join="outer")
+    new_df = (pd.merge(new_df, new_batch_data, on="start", how="outer")).fillna("-")
+    #new_df = pd.concat([new_df, new_batch_data], join="outer").fillna("-")
+    new_df['start'] = new_df['start'].apply(int)
+    # create new DataFrame to store the necessary information
+    df = pd.DataFrame(columns=["seqname", "source", "type", "start", "end", "score", "strand", "frame", "attribute"])
+    
+    # data from COG database
+    cogs_file = pkg_resources.resource_filename(__name__, 'COGtools-data/cogs.txt')
+    cogs_data = (open(cogs_file, "r")).readlines()
+
+    # iterate through features
+    for row in new_df.index:
+        # get assigned COGs, number of NaN and start of the feature
+        cogs = [new_df["COG_x"][row], new_df["COG_y"][row], new_df["COG"][row]]
+        nan = cogs.count("-")
+        start = new_df["start"][row]
+        # find out which tools match in the COG assignment
+        idxs = [[cogs[:idx].index(item), idx] for idx, item in enumerate(cogs) if
+                item in cogs[:idx]]
+
+        # if all three tools have assigned the COG
+        if nan == 0:
+            # if all three tools match in assignment, add Batch CD-Search
+            if len(idxs) != 1:
+                df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
+
+            # two tools match in assignment
+            else:
+                #  if batch and eggnog or operon -> add batch, if operon and eggnog -> add eggnog
+                if idxs[0] == [1, 2] or idxs[0] == [0, 2]:
+                    df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
+                else:
+                    df = pd.concat([df, em_data.loc[em_data.start == start, :]], ignore_index=True)
+                    cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
+                    # if cog is from COG database
+                    try:
+                        index = [i for i, s in enumerate(cogs_data) if cog in s][0]
+                        cat = cogs_data[index][8:-1]
+                        df["attribute"][row] = df["attribute"][row].replace(
+                            search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
+
+                    # else - it is from eggNOG
+                    except IndexError:
+                        continue
+
+        # if only one tool has assigned the COG
+        elif nan == 2:
+            # find out which one was it and add it
+            which = [number for number in [0, 1, 2] if number not in idxs[0]][0]
+            programs = ['em_data', 'om_data', 'batch_data']
+            df = pd.concat([df, (locals()[programs[which]]).loc[(locals()[programs[which]]).start == start, :]],
+                           ignore_index=True)
+            if which == 0 or which == 1:
+                cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
+                # if cog is from COG database
+                try:
+                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
+                    cat = cogs_data[index][8:-1]
+                    df["attribute"][row] = df["attribute"][row].replace(
+                        search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
+
+                # else - it is from eggNOG or ROG
+                except IndexError:
+                    continue
+
+        # if two tools have assigned the COG
+        elif nan == 1:
+            nan_position = cogs.index("-")
+            # add batch
+            if nan_position == 0 or nan_position == 1:
+                df = pd.concat([df, batch_data.loc[batch_data.start == start, :]], ignore_index=True)
+            # add eggnog
+            else:
+                df = pd.concat([df, em_data.loc[em_data.start == start, :]], ignore_index=True)
+                cog = search('COG=(.*);CAT', df["attribute"][row]).group(1)
+                # if cog is from COG database
+                try:
+                    index = [i for i, s in enumerate(cogs_data) if cog in s][0]
+                    cat = cogs_data[index][8:-1]
+                    df["attribute"][row] = df["attribute"][row].replace(
+                        search('CAT=(.*);', df["attribute"][row]).group(0), "CAT=" + cat + ";")
+
+                # else - it is from eggNOG or ROG
+                except IndexError:
+                    continue
+
+        # no tool has assigned the COG, either it is not assigned or it is not a CDS -> add operon-mapper
+        else:
+            df = pd.concat([df, om_data.loc[om_data.start == start, :]], ignore_index=True)
+
+    return df
@@ -0,0 +1,92 @@
+import sqlite3
+import hashlib
+
+# the number of protein pairs kept in the cache
+MAX_SIZE = 1000000
+# the number of pairs scored or used before they are written into the database
+BATCH_SIZE = 1000
+
+
+def digest(sequence):
+    return hashlib.blake2b(sequence.encode(), digest_size=16).digest()
+
+
+class ScoreCache:
+    """
+    Persistent cache of alignment scores of protein pairs (SQLite database), the pairs are keyed by the digests of
+    both sequences and the scoring of the aligner. The least recently used pairs are evicted when the cache grows over
+    its size. The new scores and the times of use are written in batches of batch_size pairs, so the scores are kept
+    also if the run is interrupted, and the cache is trimmed to its size when it is closed.
+    """
+    def __init__(self, path, max_size=MAX_SIZE, batch_size=BATCH_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS scores (query BLOB, target BLOB, scoring BLOB, "
+                                "score REAL, used INTEGER, PRIMARY KEY (query, target, scoring)) WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores (used)")
+        self.clock = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM scores").fetchone()[0]
+        self.scores = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def score(self, aligner, query, target):
+        """
+        Get the alignment score of the pair, the proteins are aligned only if the pair is not in the cache
+        :param aligner: PairwiseAligner
+        :param query: the sequence of the first protein
+        :param target: the sequence of the second protein
+        :return: the score
+        """
+        # str(aligner) describes the mode and the scoring of the aligner
+        key = (digest(query), digest(target), digest(str(aligner)))
+        score = self.scores.get(key)
+        if score is None:
+            row = self.connection.execute("SELECT score FROM scores WHERE query = ? AND target = ? AND scoring = ?",
+                                          key).fetchone()
+            if row is None:
+                score = aligner.score(query, target)
+                self.misses += 1
+            else:
+                score = row[0]
+                self.hits += 1
+            self.scores[key] = score
+        else:
+            self.hits += 1
+        self.clock += 1
+        self.used[key] = self.clock
+        if len(self.used) >= self.batch_size:
+            self.flush()
+        return score
+
+    def flush(self):
+        """
+        Write the scores and the times of use of the pairs used since the last flush
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO scores VALUES (?, ?, ?, ?, ?) ON CONFLICT (query, target, scoring) "
+                "DO UPDATE SET used = excluded.used",
+                [key + (self.scores[key], used) for key, used in self.used.items()])
+        self.used = {}
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.flush()
+        with self.connection:
+            # evict the least recently used pairs
+            size = self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+            if size > self.max_size:
+                self.connection.execute("DELETE FROM scores WHERE used <= (SELECT used FROM scores ORDER BY used "
+                                        "LIMIT 1 OFFSET ?)", (size - self.max_size - 1,))
+        self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
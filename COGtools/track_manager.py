@@ -1,7 +1,11 @@
 import pkg_resources
 from PIL import Image, ImageDraw, ImageFont, ImageColor
 import os
-import pandas as pd
+from functools import lru_cache
+try:
+    from COGtools.file_manager import read_data, write_table, ColumnBuffer
+except ImportError:
+    from file_manager import read_data, write_table, ColumnBuffer
 
 
 def get_track_template(pos_track=(0.95, 0.90, 0.85, 0.80), size=10.0, cog_palette=True, output_dir=os.getcwd()):
@@ -15,10 +19,8 @@ def get_track_template(pos_track=(0.95, 0.90, 0.85, 0.80), size=10.0, cog_palett
     :return: track template file
     """
     # table for new data
-    track_template = pd.DataFrame(columns=["#pos", "size", "for", "rev", "not", "any", "key", "qual", "val", "col"])
-    file = pkg_resources.resource_filename(__name__, 'COGtools-data/fun-20.tab.txt')
-    features = (open(file, "r")).read()
-    features = features.split('\n')
+    track_template = ColumnBuffer(["#pos", "size", "for", "rev", "not", "any", "key", "qual", "val", "col"])
+    features = read_data("fun-20.tab.txt").split('\n')
     index = 1 if cog_palette else 3
     for feature in features:
         feature = feature.split('\t')
@@ -28,39 +30,33 @@ def get_track_template(pos_track=(0.95, 0.90, 0.85, 0.80), size=10.0, cog_palett
             else:
                 color = ImageColor.getcolor('#' + feature[index], "RGB")
             color = str(color[0]) + ":" + str(color[1]) + ":" + str(color[2])
-            new_row = pd.DataFrame(
-                {"#pos": [pos_track[0],pos_track[1],pos_track[2]],
-                 "size": [str(size)] * 3,
-                 "for": ["true","false","true"],
-                 "rev": ["false","true","true"],
-                 "not": ["false"]*3,
-                 "any": ["false"]*3,
-                 "key": ["CDS","CDS", "pseudogene"],
-                 "qual": ["CAT"]*3,
-                 "val": [feature[0]]*3,
-                 "col": [color]*3})
-            track_template = pd.concat([track_template, new_row], ignore_index=True)
+            track_template.extend(
+                **{"#pos": [pos_track[0],pos_track[1],pos_track[2]],
+                   "size": [str(size)] * 3,
+                   "for": ["true","false","true"],
+                   "rev": ["false","true","true"],
+                   "not": ["false"]*3,
+                   "any": ["false"]*3,
+                   "key": ["CDS","CDS", "pseudogene"],
+                   "qual": ["CAT"]*3,
+                   "val": [feature[0]]*3,
+                   "col": [color]*3})
         else:
             color = ImageColor.getcolor('#' + feature[1], "RGB")
             color = str(color[0]) + ":" + str(color[1]) + ":" + str(color[2])
-            new_row = pd.DataFrame(
-                {"#pos": [pos_track[3]],
-                 "size": [str(size)],
-                 "for": ["true"],
-                 "rev": ["true"],
-                 "not": ["false"],
-                 "any": ["false"],
-                 "key": [feature[0]],
-                 "qual": ["null"],
-                 "val": ["null"],
-                 "col": [color]})
-            track_template = pd.concat([track_template, new_row], ignore_index=True)
+            track_template.append(pos_track[3], str(size), "true", "true", "false", "false", feature[0], "null",
+                                  "null", color)
 
-    f = open(output_dir + '/track_template', 'w')
-    f.write('# created with COGtools 1.0.0\n'
-            '# Track template for DNAPlotter\n')
-    f.close()
-    return track_template.to_csv(output_dir + '/track_template', sep='\t', index=False, mode='a')
+    return write_table(output_dir + '/track_template', track_template,
+                       ['created with COGtools 1.0.0', 'Track template for DNAPlotter'])
+
+
+@lru_cache(maxsize=None)
+def load_font(font, size):
+    """
+    Load the font from COGtools-data, loaded fonts are cached
+    """
+    return ImageFont.truetype(pkg_resources.resource_filename(__name__, 'COGtools-data/' + font), size)
 
 
 def get_legend(font='arial.ttf', output_dir=os.getcwd(), cog_palette=True):
@@ -68,14 +64,12 @@ def get_legend(font='arial.ttf', output_dir=os.getcwd(), cog_palette=True):
     Create a legend for the genome map
     """
     # import description for the legend
-    file = pkg_resources.resource_filename(__name__, 'COGtools-data/fun-20.tab.txt')
-    features = (open(file, "r")).read()
-    features = features.split('\n')
+    features = read_data("fun-20.tab.txt").split('\n')
 
     # create a white image
     img = Image.new('RGB', (1700, 2500), 'white')
     image_edit = ImageDraw.Draw(img)
-    myFont = ImageFont.truetype(pkg_resources.resource_filename(__name__, 'COGtools-data/' + font), 50)
+    myFont = load_font(font, 50)
     start = 50
 
     # add individual objects to the legend
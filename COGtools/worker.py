@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+try:
+    from COGtools.file_manager import read_data
+    from COGtools.track_manager import load_font
+except ImportError:
+    from file_manager import read_data
+    from track_manager import load_font
+
+# options of a job and their default values, the same as in the command line
+JOB_OPTIONS = {"input_dir": None, "output_dir": None, "cogs_only": False, "cat_choice": 1, "track_manager": False,
+               "cogs_palette": False, "draft": False, "gff_included": False, "min_overlap": 0.9, "n_jobs": 1,
+               "memory_budget": None, "report": False, "profile": False, "resume": False,
+               "incremental": False, "indexed": False, "hit_rule": "best"}
+
+
+def warm_caches():
+    """
+    Load the reference files of COGtools-data into the caches of the process
+    """
+    read_data("cogs.txt")
+    read_data("fun-20.tab.txt")
+    load_font("arial.ttf", 50)
+
+
+def parse_job(line, number):
+    """
+    Parse the job description, e.g.
+    {"id": "job1", "organism": "E_coli", "input_dir": "data", "output_dir": "results", "draft": true}
+    :param line: JSON object with the organism name, input and output directory and options of the command line
+    :param number: the line number used as the id of the job if it is not given
+    :return: the id of the job and arguments of the pipeline
+    """
+    job = json.loads(line)
+    if not isinstance(job, dict):
+        raise ValueError("The job has to be a JSON object.")
+    job_id = job.pop("id", number)
+    organism_name = job.pop("organism", None)
+    if organism_name is None:
+        raise ValueError("The organism name is missing.")
+    unknown = [option for option in job if option not in JOB_OPTIONS]
+    if unknown:
+        raise ValueError("Unknown options: " + ", ".join(unknown))
+
+    arguments = dict(JOB_OPTIONS, **job)
+    for directory in ["input_dir", "output_dir"]:
+        if arguments[directory] is None:
+            arguments[directory] = os.getcwd()
+    return job_id, organism_name, arguments
+
+
+def run_job(run, job_id, organism_name, arguments):
+    """
+    Run the job in a process of the pool, the messages printed by the pipeline are redirected to stderr so that
+    they do not mix with the records of the jobs
+    :return: the record of the finished job
+    """
+    record = {"id": job_id, "organism": organism_name, "output_dir": arguments["output_dir"]}
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(sys.stderr):
+            run(organism_name, arguments["input_dir"], arguments["output_dir"], arguments["cogs_only"],
+                arguments["cat_choice"], arguments["track_manager"], arguments["cogs_palette"], arguments["draft"],
+                arguments["gff_included"], arguments["min_overlap"], arguments["n_jobs"],
+                arguments["memory_budget"], arguments["report"], arguments["profile"], arguments["resume"],
+                arguments["incremental"], arguments["indexed"], arguments["hit_rule"])
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = type(e).__name__ + ": " + str(e)
+    record["wall_time"] = time.perf_counter() - start
+    return record
+
+
+class Worker:
+    """
+    Pool of processes running the jobs, the processes are kept alive between the jobs so the imported modules and
+    the reference files stay loaded
+    """
+    def __init__(self, run, pool_size=1):
+        self.run = run
+        self.pool = ProcessPoolExecutor(max_workers=pool_size, initializer=warm_caches)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class Session:
+    """
+    Jobs read from one input stream, the record of every job is written into the output stream as soon as the job
+    is finished
+    """
+    def __init__(self, worker, write):
+        self.worker = worker
+        self.write = write
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+
+    def emit(self, record):
+        with self.lock:
+            try:
+                self.write(json.dumps(record) + "\n")
+            except OSError:
+                # the client is not listening anymore
+                pass
+            self.pending -= 1
+            self.finished.notify_all()
+
+    def submit(self, line, number):
+        with self.lock:
+            self.pending += 1
+        try:
+            job_id, organism_name, arguments = parse_job(line, number)
+        except ValueError as e:
+            self.emit({"id": number, "status": "failed", "error": repr(e)})
+            return
+        future = self.worker.pool.submit(run_job, self.worker.run, job_id, organism_name, arguments)
+        future.add_done_callback(
+            lambda f: self.emit(f.result() if f.exception() is None else
+                                {"id": job_id, "organism": organism_name, "status": "failed",
+                                 "error": repr(f.exception())}))
+
+    def read(self, lines):
+        for number, line in enumerate(lines):
+            if line.strip():
+                self.submit(line, number)
+
+    def wait(self):
+        with self.lock:
+            self.finished.wait_for(lambda: self.pending == 0)
+
+
+def serve_stdin(run, pool_size=1, input_stream=sys.stdin, output_stream=sys.stdout):
+    """
+    Read the jobs (JSON lines) from stdin until its end and write the records of the finished jobs into stdout
+    :param run: the pipeline run by the jobs
+    :param pool_size: the number of jobs run at once
+    """
+    def write(text):
+        output_stream.write(text)
+        output_stream.flush()
+
+    worker = Worker(run, pool_size)
+    try:
+        session = Session(worker, write)
+        session.read(input_stream)
+        session.wait()
+    finally:
+        worker.close()
+
+
+def serve_socket(run, path, pool_size=1):
+    """
+    Accept the jobs (JSON lines) on the local UNIX socket, the records of the jobs are written back into the
+    connection they came from
+    :param run: the pipeline run by the jobs
+    :param path: the path to the socket
+    :param pool_size: the number of jobs run at once
+    """
+    worker = Worker(run, pool_size)
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(text):
+                self.wfile.write(text.encode())
+                self.wfile.flush()
+
+            session = Session(worker, write)
+            session.read(line.decode() for line in self.rfile)
+            session.wait()
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = socketserver.ThreadingUnixStreamServer(path, JobHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+        worker.close()
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from COGtools import program_processor
+from COGtools import consensus
+from COGtools.file_manager import GFF_COLUMNS
+from generators import generate_genome
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+NAME = "corpus"
+# input files of the compared functions
+INPUTS = ["_eggnog.gff", "_cds.txt", "_orf_operon.txt", "_cogs_operon.txt", "_batch.txt"]
+CAT_CHOICES = [1, 3, 4]
+# options of the fast engine writing the outputs of COGtools 1.0.0, the reference engine does not use them
+PROCESSOR_OPTIONS = {"replicon_seqnames": False, "all_accessions": False}
+EM_OPTIONS = dict(PROCESSOR_OPTIONS, full_desc=False)
+CONSENSUS_OPTIONS = {"matching": "start"}
+
+
+def table_text(df):
+    return df[list(GFF_COLUMNS)].to_csv(sep="\t", index=False)
+
+
+def run_engine(engine, input_dir, work_dir, processed_dir=None):
+    """
+    Run the compared functions with the engine
+    :param engine: "fast" or "reference", the fast engine runs with the options writing the outputs of COGtools 1.0.0
+    :param input_dir: the directory with the inputs of the organism
+    :param work_dir: the directory for the processed files
+    :param processed_dir: the processed files used by the consensus, the files processed by the engine if not given,
+    so that the consensus of both engines starts from the same files
+    :return: the outputs {name: text} and the times {function: seconds}
+    """
+    prefix = input_dir + "/" + NAME
+    os.makedirs(work_dir, exist_ok=True)
+    times = {}
+
+    def timed(function_name, function):
+        start = time.perf_counter()
+        result = function()
+        times[function_name] = times.get(function_name, 0) + time.perf_counter() - start
+        return result
+
+    timed("em_processor", lambda: program_processor.em_processor(
+        NAME, prefix + "_eggnog.gff", prefix + "_cds.txt", False, work_dir, engine=engine, **EM_OPTIONS))
+    timed("om_processor", lambda: program_processor.om_processor(
+        NAME, prefix + "_orf_operon.txt", prefix + "_cogs_operon.txt", work_dir, engine=engine, all_accessions=False))
+    # COGtools 1.0.0 assigns the first specific hit of every query
+    timed("batch_processor", lambda: program_processor.batch_processor(
+        NAME, prefix + "_batch.txt", prefix + "_cds.txt", work_dir, hit_rule="first", engine=engine,
+        **PROCESSOR_OPTIONS))
+
+    outputs = {}
+    for file in ["em_" + NAME + ".gff", "om_" + NAME + ".gff", "batch_" + NAME + ".gff"]:
+        with open(work_dir + "/" + file) as handle:
+            outputs[file] = handle.read()
+
+    processed_dir = work_dir if processed_dir is None else processed_dir
+    processed = [processed_dir + "/" + tool + "_" + NAME + ".gff" for tool in ["em", "om", "batch"]]
+    df = timed("create_consensus", lambda: consensus.create_consensus(*processed, engine=engine,
+                                                                            **CONSENSUS_OPTIONS))
+    outputs["create_consensus.tsv"] = table_text(df)
+    for cat_choice in CAT_CHOICES:
+        chosen = timed("categories_choice", lambda: consensus.categories_choice(df.copy(), cat_choice, engine=engine))
+        outputs["categories_choice_" + str(cat_choice) + ".tsv"] = table_text(chosen)
+    return outputs, times
+
+
+def divergence(expected, actual):
+    """
+    the number of differing lines and the first difference, None if the texts are identical
+    """
+    if expected == actual:
+        return None
+    expected, actual = expected.splitlines(), actual.splitlines()
+    differing = [i for i in range(max(len(expected), len(actual)))
+                 if i >= len(expected) or i >= len(actual) or expected[i] != actual[i]]
+    first = differing[0]
+    return {"lines": len(differing), "line": first + 1,
+            "expected": expected[first] if first < len(expected) else "<end of file>",
+            "actual": actual[first] if first < len(actual) else "<end of file>"}
+
+
+def report(title, expected, actual, reference_times=None, fast_times=None):
+    """
+    print the divergences of outputs and the speedup of the fast engine
+    :return: the number of diverged outputs
+    """
+    print(title)
+    diverged = 0
+    for name in expected:
+        difference = divergence(expected[name], actual.get(name, ""))
+        if difference is None:
+            print("  %-26s identical" % name)
+            continue
+        diverged += 1
+        print("  %-26s DIVERGED in %d lines, first at line %d" % (name, difference["lines"], difference["line"]))
+        print("    expected: " + difference["expected"][:150])
+        print("    actual:   " + difference["actual"][:150])
+    if reference_times is not None and fast_times is not None:
+        for function, reference_time in reference_times.items():
+            print("  %-26s reference %.3f s, fast %.3f s, speedup %.1fx" % (
+                function, reference_time, fast_times[function], reference_time / max(fast_times[function], 1e-9)))
+    return diverged
+
+
+def read_golden(golden_dir):
+    return {name: open(golden_dir + "/" + name).read() for name in sorted(os.listdir(golden_dir))}
+
+
+def check_corpus(corpus=CORPUS):
+    """
+    Compare the outputs of both engines on the bundled corpus with the golden outputs
+    :return: the number of diverged outputs
+    """
+    golden = read_golden(corpus + "/golden")
+    with tempfile.TemporaryDirectory() as work_dir:
+        reference_outputs, reference_times = run_engine("reference", corpus + "/input", work_dir + "/reference")
+        fast_outputs, fast_times = run_engine("fast", corpus + "/input", work_dir + "/fast", corpus + "/golden")
+    diverged = report("reference engine x golden outputs", golden, reference_outputs)
+    return diverged + report("fast engine x golden outputs", golden, fast_outputs, reference_times, fast_times)
+
+
+def update_golden(corpus=CORPUS, n_features=300, seed=0):
+    """
+    Generate the inputs of the corpus and write the outputs of the reference engine as the golden outputs
+    """
+    shutil.rmtree(corpus, ignore_errors=True)
+    with tempfile.TemporaryDirectory() as work_dir:
+        generate_genome(work_dir, NAME, n_features=n_features, seed=seed)
+        os.makedirs(corpus + "/input")
+        for suffix in INPUTS:
+            shutil.copy(work_dir + "/" + NAME + suffix, corpus + "/input")
+    outputs, times = run_engine("reference", corpus + "/input", corpus + "/golden")
+    for name, text in outputs.items():
+        with open(corpus + "/golden/" + name, "w") as handle:
+            handle.write(text)
+
+
+def check_generated(sizes, seed=0):
+    """
+    Run both engines on generated inputs of given sizes
+    :return: the number of diverged outputs
+    """
+    diverged = 0
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            generate_genome(work_dir + "/input", NAME, n_features=size, seed=seed)
+            reference_outputs, reference_times = run_engine("reference", work_dir + "/input",
+                                                            work_dir + "/reference")
+            fast_outputs, fast_times = run_engine("fast", work_dir + "/input", work_dir + "/fast",
+                                                  work_dir + "/reference")
+        diverged += report("generated genome, %d features" % size, reference_outputs, fast_outputs, reference_times,
+                           fast_times)
+    return diverged
+
+
+if __name__ == '__main__':
+    warnings.simplefilter("ignore")
+    parser = argparse.ArgumentParser(description='Differential test of the fast and reference engines of COGtools')
+    parser.add_argument("-s", "--sizes", nargs="+", type=int, default=None, dest="sizes")
+    parser.add_argument("--seed", type=int, default=0, dest="seed")
+    parser.add_argument("--update-golden", action="store_true", dest="update_golden")
+    arguments = parser.parse_args()
+
+    if arguments.update_golden:
+        update_golden(seed=arguments.seed)
+        sys.exit(0)
+    diverged = check_corpus() if arguments.sizes is None else check_generated(arguments.sizes, arguments.seed)
+    sys.exit(1 if diverged else 0)
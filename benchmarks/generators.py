@@ -0,0 +1,197 @@
+import os
+import random
+import pkg_resources
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def read_cogs():
+    """
+    read the COGs and their categories from the COG database
+    """
+    cogs_file = pkg_resources.resource_filename("COGtools", 'COGtools-data/cogs.txt')
+    with open(cogs_file) as cogs_data:
+        return [line.rstrip("\n").split("\t") for line in cogs_data if line.strip()]
+
+
+def generate_features(n_features=1000, n_replicons=2, seed=0):
+    """
+    Generate CDSs of a synthetic genome, 80 % of them are located on the first replicon, the rest is evenly
+    distributed among the other replicons (plasmids)
+    :param n_features: the number of CDSs
+    :param n_replicons: the number of replicons
+    :param seed: seed of the random generator
+    :return: list of CDSs and lengths of replicons
+    """
+    rnd = random.Random(seed)
+    cogs = read_cogs()
+    replicons = ["NZ_CP%06d.1" % (seed * 100 + i) for i in range(n_replicons)]
+    positions = {replicon: 100 for replicon in replicons}
+    features = []
+    for i in range(n_features):
+        if n_replicons == 1 or i < n_features * 0.8:
+            replicon = replicons[0]
+        else:
+            replicon = replicons[1 + i % (n_replicons - 1)]
+        length = rnd.randint(100, 600) * 3
+        start = positions[replicon]
+        end = start + length - 1
+        positions[replicon] = end + rnd.randint(10, 200)
+        cog, cat = rnd.choice(cogs)
+        features.append({"id": "WP_%09d.1" % i, "number": i, "seqname": replicon, "start": start, "end": end,
+                         "strand": rnd.choice("+-"), "cog": cog, "cat": cat,
+                         "protein": "M" + "".join(rnd.choices(AMINO_ACIDS, k=length // 3 - 2))})
+    return features, {replicon: position + 100 for replicon, position in positions.items()}
+
+
+def write_genome(path, lengths, seed=0):
+    """
+    Write the genomic sequence of replicons with given lengths (fasta), the sequence is built from a random block
+    """
+    rnd = random.Random(seed)
+    block = "".join(rnd.choices("ACGT", k=70 * 1000))
+    lines = [block[i:i + 70] for i in range(0, len(block), 70)]
+    with open(path, "w") as fasta:
+        for replicon, length in lengths.items():
+            fasta.write(">" + replicon + "\n")
+            full, rest = divmod(length, 70)
+            for i in range(full):
+                fasta.write(lines[i % len(lines)] + "\n")
+            if rest:
+                fasta.write(lines[full % len(lines)][:rest] + "\n")
+
+
+def write_reference_gff(path, features, cds_only=False):
+    """
+    Write the reference annotation (gff3), every 50th CDS is a pseudogene and an ncRNA is added to each replicon
+    """
+    with open(path, "w") as gff:
+        gff.write("##gff-version 3\n")
+        for feature in features:
+            feature_type = "pseudogene" if feature["number"] % 50 == 7 and not cds_only else "CDS"
+            gff.write("\t".join([feature["seqname"], "RefSeq", feature_type, str(feature["start"]),
+                                 str(feature["end"]), ".", feature["strand"], "0",
+                                 "ID=cds-" + feature["id"] + ";Name=" + feature["id"]]) + "\n")
+        if not cds_only:
+            for replicon in sorted({feature["seqname"] for feature in features}):
+                gff.write(replicon + "\tRefSeq\tncRNA\t5\t80\t.\t+\t.\tID=rna-" + replicon + ";product=ncRNA\n")
+
+
+def write_eggnog(path, features, draft=False, seed=0):
+    """
+    Write eggNOG-mapper output (decorated.gff), 10 % of CDSs are not annotated, 20 % of annotated CDSs have
+    a different COG and 10 % have only an eggNOG orthologous group
+    """
+    rnd = random.Random(seed + 1)
+    cogs = read_cogs()
+    with open(path, "w") as eggnog:
+        eggnog.write("##gff-version 3\n")
+        for feature in features:
+            if rnd.random() < 0.1:
+                continue
+            cog, cat = (feature["cog"], feature["cat"]) if rnd.random() < 0.8 else rnd.choice(cogs)
+            group = cog if rnd.random() < 0.9 else "1V%03X" % (feature["number"] % 4096)
+            seq_id = feature["id"] if draft else "cds-" + feature["id"]
+            eggnog.write("\t".join([seq_id, "Prodigal_v2.6.3", "CDS", "1", str(len(feature["protein"])), "100.0",
+                                    "+", "0",
+                                    "ID=" + seq_id + ";em_target=1." + feature["id"] + ";em_score=100.0;"
+                                    "em_evalue=1e-50;em_tcov=100.0;em_OGs=" + group + "@1|root," + group +
+                                    "@2|Bacteria,4NE3M@976|Bacteroidetes;em_COG_cat=" + cat +
+                                    ";em_desc=Synthetic protein, putative;em_Preferred_name=-"]) + "\n")
+
+
+def write_operon_mapper(orf_path, cog_path, proteins_path, features, seed=0):
+    """
+    Write Operon-mapper outputs (ORFs_coordinates.txt, predicted_COGs.txt, predicted_protein_sequences.txt),
+    starts of ORFs are shifted by a few codons in 40 % of CDSs and 15 % of ORFs have no COG, the ORFs or proteins
+    are not written if their path is None
+    """
+    rnd = random.Random(seed + 2)
+    cogs = read_cogs()
+    orf_file = open(orf_path, "w") if orf_path is not None else None
+    proteins = open(proteins_path, "w") if proteins_path is not None else None
+    with open(cog_path, "w") as cog_file:
+        for feature in features:
+            shift = rnd.choice([0, 0, 0, 3, 9])
+            start = feature["start"] + (shift if feature["strand"] == "+" else 0)
+            end = feature["end"] - (shift if feature["strand"] == "-" else 0)
+            orf_id = "ORF_" + str(feature["number"])
+            if orf_file is not None:
+                orf_file.write("\t".join([feature["seqname"], "Operon-mapper", "CDS", str(start), str(end), ".",
+                                          feature["strand"], "0", "ID=" + orf_id + ";"]) + "\n")
+            if rnd.random() < 0.85:
+                cog = feature["cog"] if rnd.random() < 0.85 else rnd.choice(cogs)[0]
+                cog_file.write(orf_id + "\t" + cog + "\t[" + feature["cat"] + "] Synthetic function\n")
+            if proteins is not None:
+                proteins.write(">" + orf_id + "\n" + feature["protein"] + "*\n")
+    for handle in (orf_file, proteins):
+        if handle is not None:
+            handle.close()
+
+
+def write_batch(path, features, seed=0):
+    """
+    Write Batch CD-Search output (hitdata.txt), 20 % of proteins have no hit, some proteins have superfamily,
+    non-COG and several COG hits
+    """
+    rnd = random.Random(seed + 3)
+    cogs = read_cogs()
+    with open(path, "w") as batch:
+        batch.write("#Batch CD-search tool\tNIH/NLM/NCBI\n#datatype\thitsConcise\tConcise Results\n\n"
+                    "Query\tHit type\tPSSM-ID\tFrom\tTo\tE-Value\tBitscore\tAccession\tShort name\tIncomplete\t"
+                    "Superfamily\n")
+        for query, feature in enumerate(features):
+            if rnd.random() < 0.2:
+                continue
+            hits = []
+            if rnd.random() < 0.3:
+                hits.append(("superfamily", "cl00001", "1.2e-05", "50.1"))
+            cog = feature["cog"] if rnd.random() < 0.9 else rnd.choice(cogs)[0]
+            hits.append(("specific", cog, "3.4e-40", "150.3"))
+            if rnd.random() < 0.3:
+                hits.append(("specific", "pfam00001", "5.6e-60", "200.2"))
+            if rnd.random() < 0.2:
+                hits.append(("specific", rnd.choice(cogs)[0], "7.8e-80", "260.7"))
+            for hit_type, accession, evalue, bitscore in hits:
+                batch.write("Q#" + str(query + 1) + " - >" + feature["id"] + "\t" + hit_type + "\t" +
+                            str(100000 + query) + "\t1\t300\t" + evalue + "\t" + bitscore + "\t" + accession +
+                            "\tSynthetic\t-\tcl00001\n")
+
+
+def write_proteins(path, features):
+    """
+    Write downloaded proteins of the genome (fasta with 60 residues per line)
+    """
+    with open(path, "w") as proteins:
+        for feature in features:
+            sequence = feature["protein"]
+            proteins.write(">" + feature["id"] + " synthetic protein\n" +
+                           "\n".join(sequence[i:i + 60] for i in range(0, len(sequence), 60)) + "\n")
+
+
+def generate_genome(output_dir, organism_name="synthetic", n_features=1000, n_replicons=2, draft=False, seed=0):
+    """
+    Generate deterministic synthetic inputs of COGtools named as expected by the command line
+    :param output_dir: the output directory
+    :param organism_name: organism name
+    :param n_features: the number of CDSs
+    :param n_replicons: the number of replicons
+    :param draft: generate inputs of a draft genome (proteins instead of genome and its annotation)
+    :param seed: seed of the random generator
+    :return: the output directory
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = output_dir + "/" + organism_name
+    features, lengths = generate_features(n_features, n_replicons, seed)
+
+    write_eggnog(prefix + "_eggnog.gff", features, draft=draft, seed=seed)
+    write_operon_mapper(None if draft else prefix + "_orf_operon.txt", prefix + "_cogs_operon.txt",
+                        prefix + "_proteins_operon.txt" if draft else None, features, seed=seed)
+    write_batch(prefix + "_batch.txt", features, seed=seed)
+    if draft:
+        write_proteins(prefix + "_proteins.fsa_aa", features)
+    else:
+        write_reference_gff(prefix + ".gff3", features)
+        write_reference_gff(prefix + "_cds.txt", features, cds_only=True)
+        write_genome(prefix + ".fasta", lengths, seed=seed)
+    return output_dir
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import warnings
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from COGtools import program_processor
+from COGtools import consensus
+from COGtools import plots
+from generators import generate_genome
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+NAME = "synthetic"
+# numbers of features of the genomes in the stored baseline
+SIZES = [10000, 100000]
+# timed runs of every stage, the best time is compared
+REPEAT = 3
+
+
+def complete_stages(input_dir, output_dir, plot_dir):
+    """
+    stages of the complete genome annotation in the order of the pipeline
+    """
+    prefix = input_dir + "/" + NAME
+    processed = [output_dir + "/em_" + NAME + ".gff", output_dir + "/om_" + NAME + ".gff",
+                 output_dir + "/batch_" + NAME + ".gff"]
+    tables = {}
+    # the engine and the options of the command line
+    return [
+        ("em_processor", lambda: program_processor.em_processor(NAME, prefix + "_eggnog.gff", prefix + "_cds.txt",
+                                                                False, output_dir, engine="fast",
+                                                                replicon_seqnames=True, all_accessions=True,
+                                                                full_desc=True)),
+        ("om_processor", lambda: program_processor.om_processor(NAME, prefix + "_orf_operon.txt",
+                                                                prefix + "_cogs_operon.txt", output_dir,
+                                                                engine="fast", all_accessions=True)),
+        ("batch_processor", lambda: program_processor.batch_processor(NAME, prefix + "_batch.txt",
+                                                                      prefix + "_cds.txt", output_dir, hit_rule="best",
+                                                                      engine="fast", replicon_seqnames=True,
+                                                                      all_accessions=True)),
+        ("create_consensus", lambda: tables.update(consensus=consensus.create_consensus(*processed, engine="fast",
+                                                                                        matching="location"))),
+        ("categories_choice", lambda: consensus.categories_choice(tables["consensus"].copy(), cat_choice=3,
+                                                                  engine="fast")),
+        ("consensus", lambda: consensus.consensus(NAME, *processed, fasta_file=prefix + ".fasta", get_pseudo=True,
+                                                  get_ncrna=True, gff_file=prefix + ".gff3", engine="fast",
+                                                  matching="location", all_accessions=True, output_dir=plot_dir)),
+        ("categories_barplot", lambda: plots.categories_barplot(plot_dir)),
+    ]
+
+
+def draft_stages(input_dir, output_dir, plot_dir):
+    """
+    stages of the draft genome annotation in the order of the pipeline
+    """
+    prefix = input_dir + "/" + NAME
+    processed = [output_dir + "/em_" + NAME + ".txt", output_dir + "/om_" + NAME + ".txt",
+                 output_dir + "/batch_" + NAME + ".txt"]
+    return [
+        ("em_processor_draft", lambda: program_processor.em_processor_draft(NAME, prefix + "_eggnog.gff",
+                                                                            output_dir=output_dir)),
+        ("om_processor_draft", lambda: program_processor.om_processor_draft(NAME, prefix + "_proteins.fsa_aa",
+                                                                            prefix + "_proteins_operon.txt",
+                                                                            prefix + "_cogs_operon.txt",
+                                                                            output_dir=output_dir)),
+        ("batch_processor_draft", lambda: program_processor.batch_processor_draft(NAME, prefix + "_batch.txt",
+                                                                                  output_dir=output_dir)),
+        ("create_consensus_draft", lambda: consensus.create_consensus_draft(prefix + "_proteins.fsa_aa", *processed)),
+        ("consensus_draft", lambda: consensus.consensus_draft(NAME, prefix + "_proteins.fsa_aa", *processed,
+                                                              output_dir=plot_dir)),
+        ("categories_barplot_draft", lambda: plots.categories_barplot(plot_dir)),
+    ]
+
+
+def measure(function, repeat=REPEAT, memory=True):
+    """
+    measure the best wall time of repeated runs and the peak memory allocated during one more run
+    :return: time in seconds and peak memory in MB (None if not measured)
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+        plt.close("all")
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        plt.close("all")
+    return min(times), peak
+
+
+def run(sizes, stages=None, repeat=REPEAT, memory=True, seed=0):
+    """
+    Run the pipeline stages on synthetic genomes of given sizes
+    :param sizes: numbers of features of generated genomes
+    :param stages: names of measured stages, all stages if not given
+    :param repeat: the number of timed runs of each stage
+    :param memory: measure the peak memory of each stage
+    :param seed: seed of the generators
+    :return: results {size: {stage: {"time": seconds, "peak_memory": MB}}}
+    """
+    results = {}
+    for size in sizes:
+        results[str(size)] = {}
+        for draft, get_stages in [(False, complete_stages), (True, draft_stages)]:
+            with tempfile.TemporaryDirectory() as work_dir:
+                input_dir = generate_genome(work_dir + "/input", NAME, n_features=size, draft=draft, seed=seed)
+                os.makedirs(work_dir + "/output")
+                os.makedirs(work_dir + "/plot")
+                for stage, function in get_stages(input_dir, work_dir + "/output", work_dir + "/plot"):
+                    # not measured stages are run once to prepare inputs of the following stages
+                    if stages is not None and stage not in stages:
+                        function()
+                        continue
+                    try:
+                        elapsed, peak = measure(function, repeat=repeat, memory=memory)
+                    except Exception as e:
+                        # failed stage is reported, the following stages may fail as well
+                        results[str(size)][stage] = {"time": None, "peak_memory": None, "error": repr(e)}
+                        print(size, stage, "failed:", repr(e), flush=True)
+                        continue
+                    results[str(size)][stage] = {"time": elapsed, "peak_memory": peak}
+                    print(size, stage, "%.3f s" % elapsed, "" if peak is None else "%.1f MB" % peak, flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance=0.5):
+    """
+    Compare the results with the baseline
+    :param tolerance: relative increase of time or peak memory reported as a regression
+    :return: list of regressions (size, stage, measure, baseline value, new value)
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, values in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None:
+                continue
+            for measure_name in ["time", "peak_memory"]:
+                if values.get(measure_name) is None or reference.get(measure_name) is None:
+                    continue
+                if values[measure_name] > reference[measure_name] * (1 + tolerance):
+                    regressions.append((size, stage, measure_name, reference[measure_name], values[measure_name]))
+    return regressions
+
+
+if __name__ == '__main__':
+    warnings.simplefilter("ignore")
+    parser = argparse.ArgumentParser(description='COGtools benchmarks')
+    parser.add_argument("-s", "--sizes", nargs="+", type=int, default=SIZES, dest="sizes")
+    parser.add_argument("--stages", nargs="+", default=None, dest="stages")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT, dest="repeat")
+    parser.add_argument("--no-memory", action="store_false", dest="memory")
+    parser.add_argument("--baseline", default=BASELINE, dest="baseline")
+    parser.add_argument("--save-baseline", action="store_true", dest="save_baseline")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.5, dest="tolerance")
+    parser.add_argument("-o", "--output", default=None, dest="output")
+    arguments = parser.parse_args()
+
+    results = run(arguments.sizes, arguments.stages, arguments.repeat, arguments.memory)
+
+    if arguments.output is not None:
+        with open(arguments.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if arguments.save_baseline:
+        baseline = {}
+        if os.path.exists(arguments.baseline):
+            with open(arguments.baseline) as handle:
+                baseline = json.load(handle)
+        for size, stages in results.items():
+            baseline.setdefault(size, {}).update(stages)
+        with open(arguments.baseline, "w") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+    elif os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as handle:
+            baseline = json.load(handle)
+        for size in results:
+            if size not in baseline:
+                print("no baseline of", size, "features")
+        regressions = compare(results, baseline, arguments.tolerance)
+        for size, stage, measure_name, reference, value in regressions:
+            print("REGRESSION", size, stage, measure_name, "%.3f -> %.3f" % (reference, value))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,50 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "benchmarks"))
+# the command line imports the modules of COGtools directly (import consensus)
+sys.path.append(os.path.join(ROOT, "COGtools"))
+
+from COGtools import program_processor
+from COGtools.file_manager import GFF_COLUMNS
+from generators import generate_genome
+
+NAME = "synthetic"
+
+
+def table_text(df):
+    """
+    the features as written into the outputs, used to compare tables
+    """
+    return df[list(GFF_COLUMNS)].to_csv(sep="\t", index=False)
+
+
+def process(input_dir, output_dir):
+    """
+    process the outputs of the three tools with the options of the command line
+    :return: the paths to the processed files of eggNOG-mapper, Operon-mapper and Batch CD-Search
+    """
+    prefix = input_dir + "/" + NAME
+    program_processor.em_processor(NAME, prefix + "_eggnog.gff", prefix + "_cds.txt", False, output_dir,
+                                   replicon_seqnames=True, all_accessions=True, full_desc=True)
+    program_processor.om_processor(NAME, prefix + "_orf_operon.txt", prefix + "_cogs_operon.txt", output_dir,
+                                   all_accessions=True)
+    program_processor.batch_processor(NAME, prefix + "_batch.txt", prefix + "_cds.txt", output_dir,
+                                      hit_rule="best", replicon_seqnames=True, all_accessions=True)
+    return [output_dir + "/" + tool + "_" + NAME + ".gff" for tool in ["em", "om", "batch"]]
+
+
+@pytest.fixture(scope="session")
+def genome(tmp_path_factory):
+    """
+    the inputs of a small complete genome with two replicons
+    """
+    return generate_genome(str(tmp_path_factory.mktemp("genome")), NAME, n_features=300, seed=1)
+
+
+@pytest.fixture(scope="session")
+def processed(genome, tmp_path_factory):
+    return process(genome, str(tmp_path_factory.mktemp("processed")))
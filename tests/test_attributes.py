@@ -0,0 +1,30 @@
+import pandas as pd
+from COGtools.file_manager import decode_attributes, encode_attributes, ATTRIBUTE_FIELDS
+
+# attributes written by the processors of eggNOG-mapper, Operon-mapper and Batch CD-Search
+ATTRIBUTES = ["ID=WP_000001.1;COG=COG0001;CAT=H;desc=Glutamate-1-semialdehyde aminotransferase, subunit A=B; putative",
+              "ID=WP_000002.1;COG=COG0002;CAT=E;desc=",
+              # Batch CD-Search gives no description
+              "ID=WP_000003.1;COG=COG0003;CAT=P;",
+              "ID=WP_000004.1;COG=-;CAT=-;desc=-"]
+
+
+def test_attributes_round_trip():
+    fields = decode_attributes(ATTRIBUTES)
+    assert fields.loc[0, "desc"] == "Glutamate-1-semialdehyde aminotransferase, subunit A=B; putative"
+    assert fields.loc[1, "desc"] == "" and pd.isna(fields.loc[2, "desc"])
+    assert fields["COG"].astype(str).tolist() == ["COG0001", "COG0002", "COG0003", "-"]
+    assert encode_attributes(fields).tolist() == ATTRIBUTES
+    # the table without descriptions
+    assert encode_attributes(fields[["ID", "COG", "CAT"]]).tolist() == [attribute[:attribute.index(";desc=") + 1]
+                                                                         if ";desc=" in attribute else attribute
+                                                                         for attribute in ATTRIBUTES]
+
+
+def test_other_attributes():
+    # features not processed by COGtools, e.g. ncRNA of the gff file, and the fields in other order
+    attributes = ["ID=rna-1;Parent=gene-1;gbkey=ncRNA;product=RNase P RNA component", "COG=COG0001;ID=WP_1;CAT=H;",
+                  "ID=WP_1;COG=COG0001;CAT=H"]
+    fields = decode_attributes(attributes)
+    assert list(fields.columns) == ATTRIBUTE_FIELDS
+    assert fields.isna().all().all()
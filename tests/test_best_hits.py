@@ -0,0 +1,64 @@
+import pytest
+from COGtools.program_processor import read_hitdata, best_hits, batch_processor_draft
+from COGtools.file_manager import read_processed
+
+HEADER = "#Batch CD-search tool\tNIH/NLM/NCBI\n#datatype\thitsConcise\tConcise Results\n\n" \
+         "Query\tHit type\tPSSM-ID\tFrom\tTo\tE-Value\tBitscore\tAccession\tShort name\tIncomplete\tSuperfamily\n"
+# query, hit type, accession, E-value and bitscore of the hits
+HITS = [
+    ("Q#1 - >P1", "superfamily", "cl00001", "1.2e-90", "300.0"),
+    ("Q#1 - >P1", "specific", "COG0001", "3.4e-40", "150.3"),
+    ("Q#1 - >P1", "specific", "pfam00001", "5.6e-60", "200.2"),
+    ("Q#1 - >P1", "specific", "COG1001", "7.8e-80", "260.7"),
+    # the first specific hit is not a COG
+    ("Q#2 - >P2", "specific", "pfam00002", "1.0e-60", "200.0"),
+    ("Q#2 - >P2", "specific", "COG0002", "1.0e-40", "150.0"),
+    # equal E-values are decided by bitscore, equal hits by their order
+    ("Q#3 - >P3", "specific", "COG0003", "1.0e-50", "100.0"),
+    ("Q#3 - >P3", "specific", "COG0004", "1.0e-50", "120.0"),
+    ("Q#4 - >P4", "specific", "COG0005", "1.0e-50", "120.0"),
+    ("Q#4 - >P4", "specific", "COG0006", "1.0e-50", "120.0"),
+    # COG updated in COG 2021
+    ("Q#5 - >P5", "specific", "COG3512", "1.0e-50", "120.0"),
+    ("Q#6 - >P6", "superfamily", "cl00002", "1.0e-50", "120.0"),
+    # the part of merged file numbered from Q#1 again
+    ("Q#1 - >P7", "specific", "COG0007", "1.0e-50", "120.0"),
+]
+# the COG and category chosen for every protein with a specific hit
+CHOSEN = {
+    "best": [("P1", "COG1001", "F"), ("P2", "COG0002", "E"), ("P3", "COG0004", "P"), ("P4", "COG0005", "F"),
+             ("P5", "COG1343", "V"), ("P7", "COG0007", "H")],
+    "first": [("P1", "COG0001", "H"), ("P2", "-", "-"), ("P3", "COG0003", "P"), ("P4", "COG0005", "F"),
+              ("P5", "COG1343", "V"), ("P7", "COG0007", "H")],
+}
+
+
+@pytest.fixture
+def hitdata(tmp_path):
+    path = str(tmp_path / "hitdata.txt")
+    with open(path, "w") as handle:
+        handle.write(HEADER)
+        for query, hit_type, accession, evalue, bitscore in HITS:
+            handle.write("\t".join([query, hit_type, "100000", "1", "300", evalue, bitscore, accession, "Synthetic",
+                                    "-", "cl00001"]) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("hit_rule", ["best", "first"])
+def test_best_hits(hitdata, hit_rule):
+    chosen = best_hits(read_hitdata(hitdata), hit_rule)
+    assert list(zip(chosen["protein"], chosen["COG"].fillna("-"), chosen["CAT"])) == CHOSEN[hit_rule]
+
+
+def test_unknown_hit_rule(hitdata):
+    with pytest.raises(ValueError):
+        best_hits(read_hitdata(hitdata), "last")
+
+
+@pytest.mark.parametrize("hit_rule", ["best", "first"])
+def test_draft_categories(hitdata, tmp_path, hit_rule):
+    batch_processor_draft("synthetic", hitdata, output_dir=str(tmp_path), hit_rule=hit_rule)
+    processed = read_processed(str(tmp_path / "batch_synthetic.txt"), draft=True)
+    # the category is looked up by the exact COG, COGtools 1.0.0 looked up COG[4:] (COG1001 got H of COG0001)
+    # and gave the category of the first COG to the proteins without COG
+    assert list(zip(processed["protein_id"], processed["cog"], processed["cat"])) == CHOSEN[hit_rule]
@@ -0,0 +1,70 @@
+import os
+import json
+import shutil
+import pytest
+import cogtools
+from conftest import NAME
+
+PROCESSORS = ["em_processor", "om_processor", "batch_processor"]
+STAGES = PROCESSORS + ["consensus"]
+
+
+def run(input_dir, output_dir, resume=False):
+    cogtools.run_cogtools(NAME, input_dir, output_dir, False, 1, False, False, False, False, report=True,
+                          resume=resume)
+
+
+def read(path):
+    with open(path) as handle:
+        return handle.read()
+
+
+def statuses(output_dir):
+    with open(output_dir + "/" + NAME + "_run_report.json") as handle:
+        # the steps of consensus are reported as well
+        return {stage["stage"]: stage["status"] for stage in json.load(handle)["stages"] if stage["stage"] in STAGES}
+
+
+def test_resume_interrupted_consensus(genome, tmp_path, monkeypatch):
+    clean_dir = str(tmp_path / "clean")
+    output_dir = str(tmp_path / "resumed")
+    os.makedirs(clean_dir)
+    os.makedirs(output_dir)
+    run(genome, clean_dir)
+
+    def interrupted(*args, **kwargs):
+        raise RuntimeError("interrupted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(cogtools.consensus, "consensus", interrupted)
+        with pytest.raises(RuntimeError):
+            run(genome, output_dir)
+    assert statuses(output_dir)["consensus"] == "failed"
+    # only the outputs of the completed stages are left
+    with open(output_dir + "/" + NAME + "_journal.json") as handle:
+        assert sorted(json.load(handle)["stages"]) == sorted(PROCESSORS)
+    assert not os.path.exists(output_dir + "/" + NAME + "_file_to_plot.txt")
+    assert not [file for file in os.listdir(output_dir) if file.endswith(".partial")]
+
+    run(genome, output_dir, resume=True)
+    assert statuses(output_dir) == dict(dict.fromkeys(PROCESSORS, "skipped"), consensus="ok")
+    for file in [NAME + "_file_to_plot.txt", NAME + "_file_to_plot.json"]:
+        assert read(output_dir + "/" + file) == read(clean_dir + "/" + file)
+
+
+def test_resume_changed_input(genome, tmp_path):
+    input_dir = str(tmp_path / "input")
+    output_dir = str(tmp_path / "output")
+    shutil.copytree(genome, input_dir)
+    os.makedirs(output_dir)
+    genome = input_dir
+    run(genome, output_dir)
+    run(genome, output_dir, resume=True)
+    assert set(statuses(output_dir).values()) == {"skipped"}
+
+    # the stage reading the changed input and the following consensus are run again
+    modified = os.path.getmtime(genome + "/" + NAME + "_batch.txt") + 10
+    os.utime(genome + "/" + NAME + "_batch.txt", (modified, modified))
+    run(genome, output_dir, resume=True)
+    assert statuses(output_dir) == {"em_processor": "skipped", "om_processor": "skipped",
+                                    "batch_processor": "ok", "consensus": "ok"}
@@ -0,0 +1,68 @@
+import numpy as np
+import matplotlib
+import pytest
+import cogtools
+from collections import Counter
+from COGtools.cohort import Cohort, build_cohort
+from COGtools.file_manager import read_annotation, read_cogs
+from conftest import NAME
+
+matplotlib.use("Agg")
+
+# proteins of draft genomes: protein_id, source, cog, cat
+DRAFTS = {"draft_a.txt": [("WP_1", "em", "COG0001", "H"), ("WP_2", "batch", "COG0028", "EH"),
+                          ("WP_3", "om", "COG0001", "H"), ("WP_4", "em", "ENOG4105C", "S"), ("WP_5", "-", "-", "-")],
+          "draft_b.txt": [("WP_1", "-", "-", "-"), ("WP_2", "-", "-", "-")]}
+
+
+@pytest.fixture(scope="module")
+def annotations(genome, tmp_path_factory):
+    output_dir = str(tmp_path_factory.mktemp("cohort"))
+    cogtools.run_cogtools(NAME, genome, output_dir, False, 1, False, False, False, False)
+    files = [output_dir + "/" + NAME + "_file_to_plot.txt"]
+    for file, proteins in DRAFTS.items():
+        files.append(output_dir + "/" + file)
+        with open(files[-1], "w") as handle:
+            handle.write("protein_id\tsource\tcog\tcat\n" + "".join("\t".join(protein) + "\n" for protein in proteins))
+    return files
+
+
+def test_build_cohort(annotations):
+    cohort = build_cohort(annotations)
+    assert cohort.genomes == [file.split("/")[-1] for file in annotations]
+    cogs = read_cogs()
+    for row, file in enumerate(annotations):
+        counts = Counter(read_annotation(file)["COG"])
+        assert cohort.to_frame().iloc[row].to_dict() == {cog: counts.get(cog, 0) for cog in cogs}
+        assert cohort.unknown[row] == counts["-"]
+    assert (build_cohort(annotations, n_jobs=2).matrix != cohort.matrix).nnz == 0
+
+
+def test_save_load(annotations, tmp_path):
+    for cohort in [build_cohort(annotations, names=["complete", "a", "b"]), build_cohort(annotations).category("EJ")]:
+        cohort.save(str(tmp_path / "cohort.npz"))
+        loaded = Cohort.load(str(tmp_path / "cohort.npz"))
+        assert (loaded.matrix != cohort.matrix).nnz == 0 and loaded.matrix.shape == cohort.matrix.shape
+        assert loaded.genomes == cohort.genomes and list(loaded.cogs) == list(cohort.cogs)
+        assert loaded.categories == cohort.categories
+        assert np.array_equal(loaded.unknown, cohort.unknown)
+
+
+def test_category(annotations):
+    cohort = build_cohort(annotations)
+    sliced = cohort.category("J")
+    cogs = read_cogs()
+    assert list(sliced.cogs) == [cog for cog, cats in cogs.items() if "J" in cats]
+    assert sliced.to_frame().equals(cohort.to_frame()[list(sliced.cogs)])
+    # slicing again keeps the COGs of both categories
+    assert list(cohort.category("EH").category("H").cogs) == [cog for cog, cats in cogs.items()
+                                                             if "H" in cats]
+    assert cohort.category_counts().loc["draft_a.txt", ["H", "E", "S", "-"]].tolist() == [3, 1, 0, 1]
+
+
+def test_barplot_without_categories(annotations, tmp_path):
+    # the genome with COGs unknown only has no categories counted
+    build_cohort(annotations).to_barplot(str(tmp_path), include_unknown=False)
+    with open(str(tmp_path / "categories_barplot.csv")) as handle:
+        row = handle.readlines()[3].rstrip("\n").split(";")
+    assert row[0] == "draft_b.txt" and set(row[1:]) == {"0.0"}
@@ -0,0 +1,82 @@
+import os
+import pytest
+import differential
+from COGtools import consensus
+from generators import generate_genome
+from conftest import table_text
+
+# the files processed by COGtools 1.0.0
+PROCESSED = [differential.CORPUS + "/golden/" + tool + "_" + differential.NAME + ".gff"
+             for tool in ["em", "om", "batch"]]
+
+
+def assert_identical(expected, actual):
+    assert sorted(actual) == sorted(expected)
+    for name in expected:
+        assert differential.divergence(expected[name], actual[name]) is None, name
+
+
+@pytest.mark.parametrize("engine", ["reference", "fast"])
+def test_corpus(engine, tmp_path):
+    # the consensus of both engines is created from the processed files of COGtools 1.0.0
+    golden_dir = differential.CORPUS + "/golden"
+    outputs, times = differential.run_engine(engine, differential.CORPUS + "/input", str(tmp_path), golden_dir)
+    assert_identical(differential.read_golden(golden_dir), outputs)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_generated(seed, tmp_path):
+    input_dir = generate_genome(str(tmp_path / "input"), differential.NAME, n_features=300, seed=seed)
+    reference_dir = str(tmp_path / "reference")
+    reference_outputs, reference_times = differential.run_engine("reference", input_dir, reference_dir)
+    fast_outputs, fast_times = differential.run_engine("fast", input_dir, str(tmp_path / "fast"), reference_dir)
+    assert_identical(reference_outputs, fast_outputs)
+
+
+@pytest.mark.parametrize("cat_choice", differential.CAT_CHOICES)
+def test_consensus_output(cat_choice, tmp_path):
+    outputs = {}
+    for engine in ["reference", "fast"]:
+        output_dir = str(tmp_path / engine)
+        os.makedirs(output_dir)
+        consensus.consensus(differential.NAME, *PROCESSED, cat_choice=cat_choice, engine=engine,
+                            all_accessions=False, output_dir=output_dir, **differential.CONSENSUS_OPTIONS)
+        with open(output_dir + "/" + differential.NAME + "_file_to_plot.txt") as handle:
+            outputs[engine] = {"file_to_plot": handle.read()}
+    assert_identical(outputs["reference"], outputs["fast"])
+
+
+def test_random_category():
+    df = consensus.create_consensus(*PROCESSED, **differential.CONSENSUS_OPTIONS)
+    chosen = consensus.categories_choice(df.copy(), 2)
+    cats = consensus.decode_attributes(df["attribute"])["CAT"]
+    chosen_cats = consensus.decode_attributes(chosen["attribute"])["CAT"]
+    # one of the categories of the feature is chosen
+    assert (cats.str.len() > 1).any()
+    assert all(chosen_cat in cat and len(chosen_cat) == 1 or chosen_cat == cat
+               for cat, chosen_cat in zip(cats.tolist(), chosen_cats.tolist()))
+    assert table_text(chosen.assign(attribute=df["attribute"])) == table_text(df)
+
+
+@pytest.mark.parametrize("options", [{"state_dir": "state"}, {"n_jobs": 2}, {"min_overlap": 0.5}])
+@pytest.mark.parametrize("engine, matching", [("fast", "start"), ("reference", "location")])
+def test_options_of_location_matching(tmp_path, options, engine, matching):
+    # the options are never ignored silently
+    with pytest.raises(ValueError):
+        consensus.create_consensus(*PROCESSED, engine=engine, matching=matching, **options)
+    with pytest.raises(ValueError):
+        consensus.consensus(differential.NAME, *PROCESSED, engine=engine, matching=matching,
+                            output_dir=str(tmp_path), **options)
+    assert not os.listdir(str(tmp_path))
+
+
+def test_unknown_matching():
+    with pytest.raises(ValueError):
+        consensus.create_consensus(*PROCESSED, matching="stop")
+
+
+def test_location_matching_by_default(tmp_path):
+    state_dir = str(tmp_path / "state")
+    df = consensus.create_consensus(*PROCESSED, min_overlap=1, n_jobs=2, state_dir=state_dir)
+    assert os.path.exists(state_dir + "/votes.txt")
+    assert table_text(df) == table_text(consensus.create_consensus(*PROCESSED, min_overlap=1, matching="location"))
@@ -0,0 +1,49 @@
+import gzip
+from Bio import SeqIO
+from COGtools.fasta_index import FastaIndex, fasta_ids, build_index
+
+# lines of different length, blank lines and an empty sequence
+RAGGED = ">a first protein\nMKVLA\nAG\n>b\nMK\nMKVLAG\nM\n>c\n\n>d\nMKVL\n\nMKVL\n>e\nMKVL\nMKVL\nMK\n\n"
+
+
+def parsed(path):
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as handle:
+        return [(record.id, str(record.seq)) for record in SeqIO.parse(handle, "fasta")]
+
+
+def test_ragged_fasta(tmp_path):
+    path = str(tmp_path / "ragged.fa")
+    with open(path, "w") as handle:
+        handle.write(RAGGED)
+    expected = parsed(path)
+
+    assert fasta_ids(path) == [seq_id for seq_id, sequence in expected]
+    with FastaIndex(path) as index:
+        assert [(seq_id, index[seq_id]) for seq_id in index.ids] == expected
+    # samtools faidx format cannot describe the ragged sequences
+    assert not (tmp_path / "ragged.fa.fai").exists()
+
+
+def test_uniform_fasta_index(tmp_path):
+    path = str(tmp_path / "uniform.fa")
+    with open(path, "w", newline="") as handle:
+        handle.write(">x\r\nMKVL\r\nMK\r\n>y\r\nAGAG\r\n")
+
+    assert build_index(path) == [["x", 6, 4, 4, 6], ["y", 4, 18, 4, 6]]
+    with FastaIndex(path) as index:
+        assert index["x"] == "MKVLMK" and index[1] == "AGAG"
+    assert (tmp_path / "uniform.fa.fai").exists()
+    # the stored index is used by the next reader
+    with FastaIndex(path) as index:
+        assert [index[seq_id] for seq_id in index.ids] == ["MKVLMK", "AGAG"]
+
+
+def test_gzip_fasta(tmp_path):
+    path = str(tmp_path / "ragged.fa.gz")
+    with gzip.open(path, "wt") as handle:
+        handle.write(RAGGED)
+    expected = parsed(path)
+
+    assert fasta_ids(path) == [seq_id for seq_id, sequence in expected]
+    with FastaIndex(path) as index:
+        assert [(seq_id, index[seq_id]) for seq_id in index.ids] == expected
@@ -0,0 +1,43 @@
+import random
+import pandas as pd
+import pytest
+from COGtools import consensus
+from COGtools.feature_index import write_indexed, FeatureIndex
+from conftest import table_text
+
+
+def features_in(df, seqname, start, end):
+    """
+    the features overlapping the region found by scanning all of them
+    """
+    df = df.iloc[df.sort_values(["seqname", "start", "end"], kind="mergesort").index]
+    return df[(df["seqname"] == seqname) & (df["end"] >= start) & (df["start"] <= end)]
+
+
+@pytest.fixture(scope="module")
+def features(processed):
+    df = consensus.create_consensus(*processed)
+    # a long feature spanning many windows
+    long = df.iloc[[0]].assign(start=50, end=60000, strand="+")
+    return pd.concat([df, long], ignore_index=True)
+
+
+@pytest.mark.parametrize("window", [500, 16384])
+def test_region_queries(features, tmp_path, window):
+    indexed_file = str(tmp_path / "features.gff.gz")
+    write_indexed(features, indexed_file, window=window)
+    seqnames = features["seqname"].unique().tolist()
+    last = int(features["end"].max())
+    regions = [(seqname, 1, last + 1000) for seqname in seqnames] + \
+              [(seqnames[0], last + 1, last + 1000), ("unknown", 1, last), (seqnames[-1], 100, 99)]
+    generator = random.Random(0)
+    for size in [1, 200, 2000, 30000]:
+        for _ in range(20):
+            start = generator.randint(1, last)
+            regions.append((generator.choice(seqnames), start, start + size - 1))
+
+    with FeatureIndex(indexed_file) as index:
+        assert sorted(index.seqnames()) == sorted(seqnames)
+        for seqname, start, end in regions:
+            assert table_text(index.features_in(seqname, start, end)) == \
+                table_text(features_in(features, seqname, start, end)), (seqname, start, end)
@@ -0,0 +1,42 @@
+import os
+import threading
+import pytest
+from COGtools.file_manager import atomic_open, UMASK
+
+
+def test_atomic_open_concurrent_writers(tmp_path):
+    path = str(tmp_path / "output.txt")
+    barrier = threading.Barrier(2)
+    contents = ["first writer\n" * 1000, "second writer\n" * 1000]
+
+    def write(text):
+        with atomic_open(path) as handle:
+            handle.write(text[:100])
+            # both temporary files are open at once
+            barrier.wait()
+            handle.write(text[100:])
+
+    writers = [threading.Thread(target=write, args=(text,)) for text in contents]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    with open(path) as handle:
+        assert handle.read() in contents
+    assert os.listdir(str(tmp_path)) == ["output.txt"]
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~UMASK
+
+
+def test_atomic_open_failure(tmp_path):
+    path = str(tmp_path / "output.txt")
+    with open(path, "w") as handle:
+        handle.write("previous\n")
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as handle:
+            handle.write("partial")
+            raise RuntimeError("interrupted")
+    # the previous output is kept and the temporary file is removed
+    with open(path) as handle:
+        assert handle.read() == "previous\n"
+    assert os.listdir(str(tmp_path)) == ["output.txt"]
+
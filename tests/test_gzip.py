@@ -0,0 +1,32 @@
+import gzip
+import shutil
+from COGtools import consensus
+from conftest import NAME
+
+
+def compress(path, directory):
+    """
+    gzip-compressed copy of the file in the directory
+    """
+    compressed = str(directory / (path.split("/")[-1] + ".gz"))
+    with open(path, "rb") as source, gzip.open(compressed, "wb") as target:
+        shutil.copyfileobj(source, target)
+    return compressed
+
+
+def test_gzip_inputs(genome, processed, tmp_path):
+    prefix = genome + "/" + NAME
+    inputs = processed + [prefix + ".fasta", prefix + ".gff3"]
+    (tmp_path / "gz").mkdir()
+    outputs = []
+    for name, files in [("plain", inputs), ("gz", [compress(path, tmp_path / "gz") for path in inputs])]:
+        output_dir = tmp_path / name / "output"
+        output_dir.mkdir(parents=True)
+        em_file, om_file, batch_file, fasta_file, gff_file = files
+        consensus.consensus(NAME, em_file, om_file, batch_file, fasta_file=fasta_file, get_pseudo=True,
+                            get_ncrna=True, gff_file=gff_file, output_dir=str(output_dir))
+        with open(str(output_dir / (NAME + "_file_to_plot.txt"))) as handle:
+            outputs.append(handle.read())
+    # the features and the genomic sequence are written in the same way
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count("\n") > len(processed)
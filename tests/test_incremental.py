@@ -0,0 +1,49 @@
+import shutil
+import pytest
+from COGtools import consensus
+from conftest import table_text
+
+
+def modify(path):
+    """
+    reassign, remove and move some features of the processed file
+    """
+    with open(path) as handle:
+        lines = handle.readlines()
+    header = [line for line in lines if line.startswith("#") or line.startswith("seqname")]
+    rows = [line.split("\t") for line in lines[len(header):]]
+    modified = []
+    for number, row in enumerate(rows):
+        if number % 11 == 5:
+            continue
+        if number % 7 == 3:
+            row[8] = "ID=" + row[8].split(";")[0][3:] + ";COG=COG0001;CAT=H;\n"
+        if number % 13 == 8:
+            row[4] = str(int(row[4]) + 30)
+        modified.append("\t".join(row))
+    with open(path, "w") as handle:
+        handle.writelines(header + modified)
+
+
+@pytest.mark.parametrize("tool", [0, 1, 2])
+def test_incremental_equals_full(processed, tmp_path, monkeypatch, tool):
+    files = []
+    for file in processed:
+        files.append(str(tmp_path / file.split("/")[-1]))
+        shutil.copyfile(file, files[-1])
+    state_dir = str(tmp_path / "state")
+    previous = consensus.create_consensus(*files, state_dir=state_dir)
+
+    updated = []
+    update_votes = consensus.update_votes
+    monkeypatch.setattr(consensus, "update_votes", lambda *args, **kwargs: updated.append(
+        update_votes(*args, **kwargs)) or updated[-1])
+    modify(files[tool])
+    incremental = consensus.create_consensus(*files, state_dir=state_dir)
+    # only the changed features were voted again
+    assert updated[0] is not None
+
+    full = consensus.create_consensus(*files)
+    assert table_text(incremental) == table_text(full) != table_text(previous)
+    # the state saved by the update is used by the next run
+    assert table_text(consensus.create_consensus(*files, state_dir=state_dir)) == table_text(full)
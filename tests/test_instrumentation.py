@@ -0,0 +1,20 @@
+import json
+import cogtools
+from COGtools.instrumentation import count_rows
+from conftest import NAME
+
+
+def test_consensus_stage_rows(genome, tmp_path):
+    output_dir = str(tmp_path)
+    cogtools.run_cogtools(NAME, genome, output_dir, False, 1, False, False, False, False, report=True)
+    with open(output_dir + "/" + NAME + "_run_report.json") as handle:
+        stages = {stage["stage"]: stage for stage in json.load(handle)["stages"]}
+
+    processed = [output_dir + "/" + tool + "_" + NAME + ".gff" for tool in ["em", "om", "batch"]]
+    assert stages["consensus"]["rows_in"] == sum(count_rows(file, header=True) for file in processed) > 0
+    output_file = output_dir + "/" + NAME + "_file_to_plot.txt"
+    # the genomic sequence after the features is not counted
+    assert stages["consensus"]["rows_out"] == count_rows(output_file) == stages["write_output"]["rows_in"]
+    with open(output_file) as handle:
+        assert count_rows(output_file) < len(handle.readlines())
+    assert all(stage["peak_rss_mb"] > 0 for stage in stages.values())
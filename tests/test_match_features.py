@@ -0,0 +1,68 @@
+import pandas as pd
+from COGtools.consensus import match_features, KEYS
+
+
+def table(*features):
+    """
+    features predicted by one tool given as (start, end, strand, COG) on one replicon
+    """
+    return pd.DataFrame([("chr", start, end, strand, cog) for start, end, strand, cog in features],
+                        columns=KEYS + ["COG"])
+
+
+def groups(matched):
+    """
+    location and the COG assigned by every tool of the matched features
+    """
+    return [tuple(row) for row in matched[["start", "end", "strand", "COG_x", "COG_y", "COG"]].itertuples(index=False)]
+
+
+def test_shifted_starts_share_stop():
+    em = table((1, 1000, "+", "COG0001"), (2001, 3000, "-", "COG0003"))
+    om = table((51, 1000, "+", "COG0002"), (2001, 2960, "-", "COG0004"))
+    matched = match_features([em, om, table()])
+    # the stop of the features on the minus strand is their start
+    assert groups(matched) == [(1, 1000, "+", "COG0001", "COG0002", "-"),
+                               (2001, 3000, "-", "COG0003", "COG0004", "-")]
+    assert matched[["row_x", "row_y", "row"]].values.tolist() == [[0, 0, -1], [1, 1, -1]]
+
+
+def test_longest_feature_is_anchor():
+    em = table((101, 1000, "+", "COG0001"))
+    om = table((1, 1000, "+", "COG0002"))
+    batch = table((51, 1000, "+", "COG0003"))
+    # the overlap is measured against the longest feature with the stop, not against the first tool
+    assert groups(match_features([em, om, batch])) == [(1, 1000, "+", "COG0001", "COG0002", "COG0003")]
+
+    # the feature overlapping the shorter features but not the anchor starts its own group
+    em = table((201, 1000, "+", "COG0001"))
+    matched = match_features([em, om, batch])
+    assert groups(matched) == [(1, 1000, "+", "-", "COG0002", "COG0003"),
+                               (201, 1000, "+", "COG0001", "-", "-")]
+
+
+def test_one_feature_of_every_tool_in_group():
+    em = table((1, 1000, "+", "COG0001"), (11, 1000, "+", "COG0002"))
+    matched = match_features([em, table((1, 1000, "+", "COG0003")), table()])
+    assert groups(matched) == [(1, 1000, "+", "COG0001", "COG0003", "-"), (11, 1000, "+", "COG0002", "-", "-")]
+
+
+def test_min_overlap():
+    em = table((1, 1000, "+", "COG0001"))
+    om = table((201, 1000, "+", "COG0002"))
+    # 800 of 1000 bases overlap
+    assert len(match_features([em, om, table()])) == 2
+    assert len(match_features([em, om, table()], min_overlap=0.8)) == 1
+    # only identical locations are matched
+    batch = table((2, 1000, "+", "COG0003"))
+    assert groups(match_features([em, table((1, 1000, "+", "COG0002")), batch], min_overlap=1)) == \
+        [(1, 1000, "+", "COG0001", "COG0002", "-"), (2, 1000, "+", "-", "-", "COG0003")]
+
+
+def test_opposite_strands():
+    em = table((1, 1000, "+", "COG0001"))
+    om = table((1, 1000, "-", "COG0002"))
+    batch = table((1, 1000, "+", "COG0003"))
+    matched = match_features([em, om, batch])
+    assert sorted(groups(matched)) == [(1, 1000, "+", "COG0001", "-", "COG0003"),
+                                       (1, 1000, "-", "-", "COG0002", "-")]
@@ -0,0 +1,60 @@
+import warnings
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+import pytest
+from COGtools.plots import tally_categories, categories_barplot
+
+# categories of the proteins of a draft genome, one protein with two categories
+CATS = ["K", "KL", "-", "J"]
+# relative abundance of the categories by the policy for multiple categories
+ABUNDANCE = {"all": {"K": 40.0, "L": 20.0, "J": 20.0, "unknown": 20.0},
+             "split": {"K": 37.5, "L": 12.5, "J": 25.0, "unknown": 25.0},
+             "first": {"K": 50.0, "L": 0.0, "J": 25.0, "unknown": 25.0}}
+
+
+@pytest.mark.parametrize("multi", ["all", "split", "first"])
+def test_tally_categories(multi):
+    # missing categories and letters of no category are not counted
+    cat_dic = tally_categories(CATS + [None, "?"], multi)
+    counted = {category: count for category, count in cat_dic.items() if count != 0}
+    total = sum(counted.values())
+    assert {category: count * 100 / total for category, count in counted.items()} == \
+        {("-" if category == "unknown" else category): value
+         for category, value in ABUNDANCE[multi].items() if value != 0}
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        tally_categories(CATS, "last")
+
+
+@pytest.fixture
+def draft_genome(tmp_path):
+    with open(str(tmp_path / "consensus_synthetic.txt"), "w") as handle:
+        handle.write("# created with COGtools 1.0.0\n# AC number: unknown\n# COG annotation\n"
+                     "protein_id\tsource\tcog\tcat\n")
+        for number, cat in enumerate(CATS):
+            cog = "-" if cat == "-" else "COG000" + str(number)
+            handle.write("WP_00000" + str(number) + ".1\teggnog-mapper\t" + cog + "\t" + cat + "\n")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("multi", ["all", "split", "first"])
+def test_categories_barplot(draft_genome, multi):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        categories_barplot(draft_genome, ["synthetic"], multi=multi)
+    plt.close("all")
+    row = pd.read_csv(draft_genome + "/categories_barplot.csv", sep=";").iloc[0]
+    assert row["bacterium"] == "synthetic"
+    assert {category: row[category] for category in ABUNDANCE[multi]} == ABUNDANCE[multi]
+    assert row.drop("bacterium").sum() == pytest.approx(100)
+
+
+def test_draft_deprecated(draft_genome):
+    with pytest.warns(DeprecationWarning):
+        categories_barplot(draft_genome, draft=True)
+    plt.close("all")
@@ -0,0 +1,19 @@
+from COGtools.prefetch import staging_name
+
+
+def test_staging_name(tmp_path):
+    job = {"input_dir": str(tmp_path / "input"), "output_dir": str(tmp_path / "output")}
+    name = staging_name("ecoli", job)
+    # the same job is staged into the same directory in every run
+    assert staging_name("ecoli", dict(job, id=7)) == name
+    assert name.startswith("cogtools_ecoli_")
+    # different jobs never share the directory
+    assert len({name, staging_name("bsub", job), staging_name("ecoli", dict(job, input_dir=str(tmp_path))),
+                staging_name("ecoli", dict(job, output_dir=str(tmp_path)))}) == 4
+
+
+def test_staging_name_relative(tmp_path, monkeypatch):
+    job = {"input_dir": str(tmp_path / "input"), "output_dir": str(tmp_path / "output")}
+    # relative paths of the same directories
+    monkeypatch.chdir(tmp_path)
+    assert staging_name("ecoli", {"input_dir": "input", "output_dir": "./output"}) == staging_name("ecoli", job)
@@ -0,0 +1,74 @@
+import sqlite3
+from Bio.Align import PairwiseAligner
+from COGtools.score_cache import ScoreCache
+
+PROTEINS = ["MKVLAAGIV", "MKVLAGIV", "MSTNPKPQRK", "MSTNPKQRK", "MAHHHHHHG", "MAHHHHG"]
+PAIRS = list(zip(PROTEINS, PROTEINS[1:]))
+
+
+class CountingAligner:
+    """
+    the aligner counting the aligned pairs
+    """
+    def __init__(self, mode="global"):
+        self.aligner = PairwiseAligner(mode=mode)
+        self.aligned = 0
+
+    def score(self, query, target):
+        self.aligned += 1
+        return self.aligner.score(query, target)
+
+    def __str__(self):
+        return str(self.aligner)
+
+
+def stored(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_scores_are_reused(tmp_path):
+    path = str(tmp_path / "scores.sqlite")
+    aligner = CountingAligner()
+    with ScoreCache(path) as cache:
+        scores = [cache.score(aligner, query, target) for query, target in PAIRS + PAIRS]
+    assert scores == [aligner.aligner.score(query, target) for query, target in PAIRS + PAIRS]
+    assert aligner.aligned == len(PAIRS)
+
+    with ScoreCache(path) as cache:
+        assert [cache.score(aligner, query, target) for query, target in PAIRS] == scores[:len(PAIRS)]
+        assert cache.hits == len(PAIRS) and cache.misses == 0
+    # the pairs scored by another aligner are aligned again
+    local = CountingAligner("local")
+    with ScoreCache(path) as cache:
+        cache.score(local, *PAIRS[0])
+    assert local.aligned == 1 and stored(path) == len(PAIRS) + 1
+
+
+def test_scores_written_in_batches(tmp_path):
+    path = str(tmp_path / "scores.sqlite")
+    cache = ScoreCache(path, batch_size=2)
+    for query, target in PAIRS:
+        cache.score(CountingAligner(), query, target)
+    # the scores of complete batches are kept if the run is interrupted
+    assert stored(path) == len(PAIRS) // 2 * 2
+    cache.close()
+    assert stored(path) == len(PAIRS)
+
+
+def test_least_recently_used_evicted(tmp_path):
+    path = str(tmp_path / "scores.sqlite")
+    aligner = CountingAligner()
+    with ScoreCache(path, max_size=3, batch_size=2) as cache:
+        for query, target in PAIRS + PAIRS[:1]:
+            cache.score(aligner, query, target)
+    assert stored(path) == 3
+
+    aligner = CountingAligner()
+    with ScoreCache(path, max_size=3) as cache:
+        for query, target in PAIRS[:1] + PAIRS[-2:]:
+            cache.score(aligner, query, target)
+    assert aligner.aligned == 0
@@ -0,0 +1,32 @@
+import pytest
+from COGtools import program_processor
+from COGtools import consensus
+from generators import generate_genome
+from conftest import NAME
+
+
+@pytest.mark.parametrize("cat_choice", [1, 3])
+def test_sharded_draft_consensus(tmp_path, monkeypatch, cat_choice):
+    input_dir = generate_genome(str(tmp_path / "input"), NAME, n_features=300, draft=True, seed=3)
+    prefix = input_dir + "/" + NAME
+    processed_dir = str(tmp_path)
+    program_processor.em_processor_draft(NAME, prefix + "_eggnog.gff", output_dir=processed_dir)
+    program_processor.om_processor_draft(NAME, prefix + "_proteins.fsa_aa", prefix + "_proteins_operon.txt",
+                                         prefix + "_cogs_operon.txt", output_dir=processed_dir)
+    program_processor.batch_processor_draft(NAME, prefix + "_batch.txt", output_dir=processed_dir)
+    processed = [processed_dir + "/" + tool + "_" + NAME + ".txt" for tool in ["em", "om", "batch"]]
+
+    outputs = []
+    for memory_budget in [None, 0.01]:
+        output_dir = tmp_path / str(memory_budget)
+        output_dir.mkdir()
+        if memory_budget is not None:
+            # the ids of the proteins are streamed into the shards, not loaded at once
+            monkeypatch.setattr(consensus, "fasta_ids", None)
+        consensus.consensus_draft(NAME, prefix + "_proteins.fsa_aa", *processed, cat_choice=cat_choice,
+                                  memory_budget=memory_budget, chunksize=50, output_dir=str(output_dir))
+        with open(str(output_dir / ("consensus_" + NAME + ".txt"))) as handle:
+            outputs.append(handle.readlines())
+    # the shards are written one after another, the header is kept on top
+    assert outputs[1][:4] == outputs[0][:4]
+    assert sorted(outputs[1]) == sorted(outputs[0])
@@ -0,0 +1,41 @@
+import json
+import pytest
+import cogtools
+from COGtools.file_manager import read_annotation
+from COGtools.plots import tally_categories, read_category_stats
+from generators import generate_genome
+from conftest import NAME
+
+
+def check_stats(output_file):
+    """
+    the statistics written next to the output agree with the annotation in the output
+    """
+    with open(output_file[:-len(".txt")] + ".json") as handle:
+        stats = json.load(handle)
+    cats = read_annotation(output_file)["CAT"]
+    assert stats["organism"] == NAME
+    assert stats["categories"] == tally_categories(cats, "all")
+    assert stats["unknown"] == (cats == "-").sum()
+    return stats
+
+
+def test_complete_stats(genome, tmp_path):
+    output_dir = str(tmp_path)
+    cogtools.run_cogtools(NAME, genome, output_dir, False, 1, False, False, False, False)
+    stats = check_stats(output_dir + "/" + NAME + "_file_to_plot.txt")
+    assert sum(stats["sources"].values()) == stats["features"]
+
+    row = read_category_stats(output_dir).iloc[0]
+    assert row["file"] == NAME + "_file_to_plot.txt" and row["unknown"] == stats["unknown"]
+    assert row["J"] == stats["categories"]["J"]
+
+
+@pytest.mark.parametrize("memory_budget", [None, 0.01])
+def test_draft_stats(tmp_path, memory_budget):
+    input_dir = generate_genome(str(tmp_path / "input"), NAME, n_features=300, draft=True, seed=2)
+    output_dir = str(tmp_path)
+    cogtools.run_cogtools(NAME, input_dir, output_dir, False, 1, False, False, True, False,
+                          memory_budget=memory_budget)
+    stats = check_stats(output_dir + "/consensus_" + NAME + ".txt")
+    assert stats["draft"] and stats["features"] == len(read_annotation(output_dir + "/consensus_" + NAME + ".txt"))
@@ -0,0 +1,28 @@
+import io
+import os
+import json
+import cogtools
+from COGtools.worker import serve_stdin
+from conftest import NAME
+
+
+def test_serve_stdin(genome, tmp_path):
+    jobs = [{"id": "complete", "organism": NAME, "input_dir": genome, "output_dir": str(tmp_path / "complete")},
+            {"id": "missing", "organism": NAME, "input_dir": str(tmp_path / "missing"),
+             "output_dir": str(tmp_path / "missing")},
+            {"id": "unknown", "organism": NAME, "colors": True}]
+    for job in jobs:
+        os.makedirs(job.get("output_dir", str(tmp_path)), exist_ok=True)
+    lines = [json.dumps(job) + "\n" for job in jobs] + ["\n", "[1, 2]\n", "{not json\n"]
+    output = io.StringIO()
+    serve_stdin(cogtools.run_cogtools, pool_size=2, input_stream=io.StringIO("".join(lines)), output_stream=output)
+
+    # one record of every job in the order of completion, the jobs rejected when parsed are numbered by their lines
+    records = {record["id"]: record for record in map(json.loads, output.getvalue().splitlines())}
+    assert sorted(records, key=str) == sorted(["complete", "missing", 2, 4, 5], key=str)
+    assert records["complete"]["status"] == "ok" and records["complete"]["wall_time"] > 0
+    assert os.path.exists(str(tmp_path / "complete" / (NAME + "_file_to_plot.txt")))
+    # the failed jobs do not stop the other jobs
+    for job_id in ["missing", 2, 4, 5]:
+        assert records[job_id]["status"] == "failed" and "error" in records[job_id]
+    assert "colors" in records[2]["error"]